@@ -25,6 +25,8 @@ from flask_redoc import Redoc
 
 from . import config as _config
 from .controller import db
+from .database import SEARCH_BIND, engine_options
+from .json_provider import STACJSONProvider
 from .version import __version__
 
 __all__ = ("__version__", "create_app")
@@ -36,11 +38,32 @@ def create_app():
 
     app.config["SQLALCHEMY_DATABASE_URI"] = _config.SQLALCHEMY_DATABASE_URI
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = _config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        _config.SQLALCHEMY_ENGINE_OPTIONS, statement_timeout=_config.BDC_STAC_STATEMENT_TIMEOUT
+    )
+
+    if _config.BDC_STAC_SEARCH_POOL_SIZE > 0:
+        app.config["SQLALCHEMY_BINDS"] = {SEARCH_BIND: _config.SQLALCHEMY_DATABASE_URI}
+        app.config["BDC_STAC_BINDS_ENGINE_OPTIONS"] = {
+            SEARCH_BIND: engine_options(
+                dict(
+                    pool_size=_config.BDC_STAC_SEARCH_POOL_SIZE, max_overflow=_config.BDC_STAC_SEARCH_POOL_MAX_OVERFLOW
+                ),
+                statement_timeout=_config.BDC_STAC_SEARCH_STATEMENT_TIMEOUT,
+            )
+        }
+
+    app.config["BDC_STAC_READ_REPLICAS"] = _config.BDC_STAC_READ_REPLICAS
+    app.config["BDC_STAC_READ_REPLICAS_POLICY"] = _config.BDC_STAC_READ_REPLICAS_POLICY
+    app.config["BDC_STAC_REPLICA_MAX_LAG"] = _config.BDC_STAC_REPLICA_MAX_LAG
+    app.config["BDC_STAC_REPLICA_HEALTH_TTL"] = _config.BDC_STAC_REPLICA_HEALTH_TTL
+    app.config["BDC_STAC_REPLICA_CONNECT_TIMEOUT"] = _config.BDC_STAC_REPLICA_CONNECT_TIMEOUT
 
     app.config["BDC_AUTH_CLIENT_SECRET"] = _config.BDC_AUTH_CLIENT_SECRET
     app.config["BDC_AUTH_CLIENT_ID"] = _config.BDC_AUTH_CLIENT_ID
     app.config["BDC_AUTH_ACCESS_TOKEN_URL"] = _config.BDC_AUTH_ACCESS_TOKEN_URL
 
+    app.json = STACJSONProvider(app, encoder=_config.BDC_STAC_JSON_ENCODER)
     # Disable JSON pretty serialization.
     app.json.compact = True
     app.json.sort_keys = False
@@ -0,0 +1,219 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""In-process caches used by BDC-STAC.
+
+The caches are registered by name with :func:`register_cache`, which allows
+to inspect them with :func:`cache_stats` and to discard all the cached values
+with :func:`reload_caches`, e.g. after publishing new data into the catalog.
+
+.. versionadded:: 1.1
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+_PRIMITIVE_TYPES = (str, int, float, bool, type(None))
+
+
+class TTLCache:
+    """Thread-safe LRU cache with time-to-live expiration.
+
+    The least recently used entry is evicted when the cache reaches ``maxsize``
+    and entries older than ``ttl`` seconds are discarded on access.
+    A cache with ``maxsize`` or ``ttl`` equal to ``0`` never stores values.
+
+    Example:
+        >>> cache = TTLCache(maxsize=2, ttl=60)
+        >>> cache.set("S2-16D-2", {"id": "S2-16D-2"})
+        >>> cache.get("S2-16D-2")
+        {'id': 'S2-16D-2'}
+        >>> cache.get("unknown") is None
+        True
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 300, timer: Callable[[], float] = time.monotonic):
+        """Create a new cache.
+
+        :param maxsize: The maximum number of entries.
+        :param ttl: The time-to-live of each entry in seconds.
+        :param timer: Function which returns the current time in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self._stamp = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Check if the cache stores values."""
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retrieve the value for the given key or ``default`` when missing or expired."""
+        value = self._get(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def _get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+
+            expires_at, value = entry
+            if expires_at <= self.timer():
+                del self._data[key]
+                return _MISSING
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries when full."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._data[key] = (self.timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove the entry for the given key."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def validate(self, stamp: Optional[Hashable]) -> bool:
+        """Check the cache against a version stamp of the cached data.
+
+        When the given stamp differs from the previous one, all the entries are
+        discarded. Use it with a cheap aggregation (e.g. ``max(updated)``) to
+        invalidate the cache when the source data changes.
+
+        :return: ``True`` when the cache is still valid for the given stamp.
+        """
+        with self._lock:
+            if stamp == self._stamp:
+                return True
+
+            self._data.clear()
+            self._stamp = stamp
+            return False
+
+    def stats(self) -> dict:
+        """Retrieve the cache usage statistics."""
+        return dict(size=len(self), maxsize=self.maxsize, ttl=self.ttl, hits=self.hits, misses=self.misses)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check if a non-expired entry exists for the given key."""
+        return self._get(key) is not _MISSING
+
+    def __len__(self) -> int:
+        """Retrieve the number of entries, including the expired ones not discarded yet."""
+        return len(self._data)
+
+
+_caches: Dict[str, TTLCache] = {}
+_reload_hooks: List[Callable[[], None]] = []
+
+
+def register_cache(name: str, maxsize: int = 128, ttl: float = 300) -> TTLCache:
+    """Create a named cache. The same instance is returned when the name is already registered."""
+    if name not in _caches:
+        _caches[name] = TTLCache(maxsize=maxsize, ttl=ttl)
+    return _caches[name]
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Retrieve the usage statistics of the registered caches."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def add_reload_hook(hook: Callable[[], None]):
+    """Register a function to be called by :func:`reload_caches`."""
+    _reload_hooks.append(hook)
+
+
+def reload_caches():
+    """Discard the values of all the registered caches and call the reload hooks."""
+    for cache in _caches.values():
+        cache.clear()
+
+    for hook in _reload_hooks:
+        hook()
+
+
+def cached(cache: TTLCache):
+    """Memoize a function in the given cache.
+
+    The function arguments must be positional and primitive values (``str``, ``int``,
+    ``float``, ``bool`` or ``None``), which avoids keeping ORM objects alive in cache.
+    The cache entries are prefixed by the function name, so one cache may be shared
+    by several functions.
+
+    Example:
+        >>> metadata = TTLCache(maxsize=16, ttl=60)
+        >>> @cached(metadata)
+        ... def get_band_names(collection_id):
+        ...     return ["red", "green", "blue"]
+        >>> get_band_names(1)
+        ['red', 'green', 'blue']
+        >>> get_band_names.cache.hits, get_band_names.cache.misses
+        (0, 1)
+    """
+
+    def _decorator(fn):
+        prefix = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def _wrapper(*args):
+            for arg in args:
+                if not isinstance(arg, _PRIMITIVE_TYPES):
+                    raise TypeError(f"{prefix}: cache key must be a primitive value, got {type(arg).__name__}")
+
+            key = (prefix, *args)
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(*args)
+                cache.set(key, value)
+            return value
+
+        _wrapper.cache = cache
+        _wrapper.cache_clear = cache.clear
+        return _wrapper
+
+    return _decorator
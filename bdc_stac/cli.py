@@ -0,0 +1,65 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Command line interface for BDC-STAC.
+
+.. versionadded:: 1.1
+"""
+import click
+from flask.cli import FlaskGroup, with_appcontext
+
+from . import config, create_app
+from .controller import db
+from .indexes import INDEXES, create_indexes, index_statements
+from .search_cache import create_search_cache
+
+
+@click.group(cls=FlaskGroup, create_app=create_app)
+def cli():
+    """Command line for BDC-STAC."""
+
+
+@cli.command("invalidate-search-cache")
+@click.option("-c", "--collection", "collections", multiple=True, help="Collection identifier (Name-Version).")
+@with_appcontext
+def invalidate_search_cache(collections):
+    """Invalidate the cached /search responses of the given collections or the whole cache.
+
+    Only the shared backend (Redis) can be invalidated from the command line.
+    """
+    if not config.BDC_STAC_SEARCH_CACHE.startswith(("redis", "unix")):
+        raise click.ClickException("The search cache is not shared. Set BDC_STAC_SEARCH_CACHE with a Redis URL.")
+
+    cache = create_search_cache(config.BDC_STAC_SEARCH_CACHE, ttl=config.BDC_STAC_SEARCH_CACHE_TTL)
+    if not cache.invalidate(collections or None):
+        raise click.ClickException("Could not invalidate the search cache. See the logs for details.")
+    click.secho(f"Search cache invalidated for {', '.join(collections) or 'all collections'}.", fg="green")
+
+
+@cli.command("create-indexes")
+@click.argument("names", nargs=-1, type=click.Choice(list(INDEXES)))
+@click.option("--dry-run", is_flag=True, default=False, help="Only show the SQL statements.")
+@with_appcontext
+def create_indexes_command(names, dry_run):
+    """Create the database indexes used by BDC-STAC queries (all by default)."""
+    if dry_run:
+        for statement in index_statements(names):
+            click.echo(f"{statement};")
+        return
+
+    for statement in create_indexes(db.engine, names):
+        click.secho(statement, fg="green")
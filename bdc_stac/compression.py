@@ -0,0 +1,179 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""HTTP response compression for BDC-STAC.
+
+The content coding is negotiated from the ``Accept-Encoding`` request header
+among ``br`` (`Brotli <https://pypi.org/project/Brotli/>`_), ``zstd``
+(`zstandard <https://pypi.org/project/zstandard/>`_) and ``gzip``.
+Brotli and Zstandard are optional (``pip install bdc-stac[compression]``).
+
+The compression level depends on the payload size: small payloads use the
+best ratio while large ones use faster levels, since the compression time grows
+with the payload. The compressed bodies may be cached and reused for identical responses.
+
+.. versionadded:: 1.1
+"""
+import gzip
+import hashlib
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+from .cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+ENCODINGS = ("br", "zstd", "gzip")
+"""The supported content codings, ordered by server preference."""
+
+COMPRESSION_LEVELS: Dict[str, Sequence] = {
+    "gzip": ((64 * 1024, 6), (1024 * 1024, 4), (None, 1)),
+    "br": ((64 * 1024, 6), (1024 * 1024, 4), (None, 2)),
+    "zstd": ((64 * 1024, 6), (1024 * 1024, 3), (None, 1)),
+}
+"""The compression level of each content coding by payload size: ``(maximum size in bytes, level)``.
+The last level (``None``) applies to larger payloads and streamed bodies."""
+
+
+def available_encodings(encodings: Optional[Iterable[str]] = None) -> list:
+    """List the content codings which can be used, according to the installed libraries.
+
+    :param encodings: The enabled content codings, ordered by preference. Defaults to :data:`ENCODINGS`.
+    """
+    encodings = ENCODINGS if encodings is None else encodings
+    installed = dict(br=brotli is not None, zstd=zstandard is not None, gzip=True)
+    return [encoding for encoding in encodings if installed.get(encoding)]
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Sequence[str]) -> Optional[str]:
+    """Select the content coding for a response.
+
+    Example:
+        >>> negotiate_encoding("gzip, deflate, br", ["br", "zstd", "gzip"])
+        'br'
+        >>> negotiate_encoding("gzip;q=1.0, br;q=0.5", ["br", "zstd", "gzip"])
+        'gzip'
+        >>> negotiate_encoding("identity", ["br", "zstd", "gzip"]) is None
+        True
+
+    :param accept_encoding: The value of the ``Accept-Encoding`` request header.
+    :param encodings: The available content codings, ordered by server preference.
+    :return: The content coding with the highest quality value or ``None`` to not compress.
+    """
+    qualities = {}
+    for value in accept_encoding.lower().split(","):
+        coding, _, params = value.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = [(qualities.get(encoding, wildcard), encoding) for encoding in encodings]
+    candidates = [(quality, -index, encoding) for index, (quality, encoding) in enumerate(candidates) if quality > 0]
+    if not candidates:
+        return None
+
+    return max(candidates)[2]
+
+
+def compression_level(encoding: str, size: Optional[int] = None) -> int:
+    """Retrieve the compression level for a payload size. See :data:`COMPRESSION_LEVELS`.
+
+    :param encoding: The content coding.
+    :param size: The payload size in bytes. Use ``None`` when the size is unknown (streamed bodies).
+    """
+    for max_size, level in COMPRESSION_LEVELS[encoding]:
+        if max_size is None or (size is not None and size <= max_size):
+            return level
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Compress a payload.
+
+    :param data: The payload.
+    :param encoding: The content coding. See :data:`ENCODINGS`.
+    :param level: The compression level. Defaults to the level by payload size.
+    """
+    if level is None:
+        level = compression_level(encoding, len(data))
+
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level)
+
+
+def compress_cached(data: bytes, encoding: str, cache: TTLCache) -> bytes:
+    """Compress a payload, reusing the compressed bodies of identical payloads in the given cache.
+
+    The cache key is the payload digest, which is much cheaper to compute than the compression.
+    """
+    if not cache.enabled:
+        return compress(data, encoding)
+
+    key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        cache.set(key, compressed)
+    return compressed
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str, level: Optional[int] = None) -> Iterator[bytes]:
+    """Compress a stream of bytes chunk by chunk.
+
+    :param chunks: The payload chunks.
+    :param encoding: The content coding. See :data:`ENCODINGS`.
+    :param level: The compression level. Defaults to the level of large payloads.
+    """
+    if level is None:
+        level = compression_level(encoding)
+
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        compress_chunk, flush = compressor.process, compressor.finish
+    elif encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        compress_chunk, flush = compressor.compress, compressor.flush
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_chunk, flush = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        data = compress_chunk(chunk)
+        if data:
+            yield data
+
+    yield flush()
@@ -0,0 +1,72 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Conditional requests (RFC 7232) for BDC-STAC resources.
+
+The validators of a resource (``ETag`` and ``Last-Modified``) are built from a
+version stamp of the underlying catalog rows, such as ``Collection.updated`` and
+``Item.updated``, which is retrieved with a cheap query before building the document.
+The ``ETag`` also depends on the request values used to render the document
+(user roles, ``X-Stac-Url``, ``X-Script-Name`` and the assets query string).
+
+Compressed responses use the ``ETag`` suffixed by the content coding (``"<tag>-gzip"``),
+since each representation must have its own strong validator.
+
+.. versionadded:: 1.1
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from .compression import ENCODINGS
+
+
+def make_etag(*values) -> str:
+    """Build a strong entity tag (unquoted) from the given values."""
+    return hashlib.blake2b(repr(values).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Build the entity tag of a compressed representation."""
+    return f"{etag}-{encoding}"
+
+
+def last_modified(*dates: Optional[datetime]) -> Optional[datetime]:
+    """Retrieve the latest of the given dates in UTC. Naive dates are considered UTC."""
+    dates = [date if date.tzinfo else date.replace(tzinfo=timezone.utc) for date in dates if date is not None]
+    if not dates:
+        return None
+    return max(dates).astimezone(timezone.utc)
+
+
+def is_not_modified(request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """Check if the client representation is fresh according to ``If-None-Match`` and ``If-Modified-Since``.
+
+    The header ``If-Modified-Since`` is ignored when ``If-None-Match`` is given.
+
+    :param request: The HTTP request.
+    :param etag: The current entity tag (unquoted).
+    :param modified: The current modification date.
+    """
+    if request.if_none_match:
+        candidates = [etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS)]
+        return any(request.if_none_match.contains_weak(candidate) for candidate in candidates)
+
+    if request.if_modified_since is not None and modified is not None:
+        return modified.replace(microsecond=0) <= request.if_modified_since
+
+    return False
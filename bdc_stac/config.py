@@ -36,20 +36,32 @@ SQLALCHEMY_ENGINE_OPTIONS = {
     "max_overflow": int(os.getenv("SQLALCHEMY_ENGINE_MAX_OVERFLOW", 10)),
     "poolclass": os.getenv("SQLALCHEMY_ENGINE_POOL_CLASS"),
     "pool_recycle": int(os.getenv("SQLALCHEMY_ENGINE_POOL_RECYCLE", -1)),
+    "pool_pre_ping": bool(strtobool(os.getenv("SQLALCHEMY_ENGINE_POOL_PRE_PING", "0"))),
+    "pool_timeout": int(os.getenv("SQLALCHEMY_ENGINE_POOL_TIMEOUT", 30)),
 }
 """Set SQLAlchemy engine options for pooling.
 You may set the following environment variables to customize pooling:
 
 - ``SQLALCHEMY_ENGINE_POOL_SIZE``: The pool size. Defaults to ``5``.
 - ``SQLALCHEMY_ENGINE_MAX_OVERFLOW``: Max pool overflow. Defaults to ``10``.
-- ``SQLALCHEMY_ENGINE_POOL_CLASS``: The pool type for management. Defaults to ``10``.
+- ``SQLALCHEMY_ENGINE_POOL_CLASS``: The pool type for management (e.g. ``NullPool``). Defaults to a ``QueuePool``
+  which measures the connection checkout time.
 - ``SQLALCHEMY_ENGINE_POOL_RECYCLE``: Define the given number of seconds to recycle pool. Defaults to ``-1``, or no timeout.
+- ``SQLALCHEMY_ENGINE_POOL_PRE_PING``: Test the connections for liveness on checkout. Defaults to ``0``.
+- ``SQLALCHEMY_ENGINE_POOL_TIMEOUT``: The number of seconds to wait for a pool connection. Defaults to ``30``.
 """
 
 BDC_STAC_API_VERSION = os.getenv("BDC_STAC_API_VERSION", "1.0.0")
 BDC_STAC_BASE_URL = os.getenv("BDC_STAC_BASE_URL", "http://localhost:5000")
 BDC_STAC_FILE_ROOT = os.getenv("BDC_STAC_FILE_ROOT", "http://localhost:5001")
 BDC_STAC_MAX_LIMIT = int(os.getenv("BDC_STAC_MAX_LIMIT", "1000"))
+BDC_STAC_COUNT_MODE = os.getenv("BDC_STAC_COUNT_MODE", "exact")
+"""Strategy used to compute the number of matched items (``context.matched``) in item searches.
+Use one of ``exact``, ``estimated`` (planner estimation), ``capped`` (exact up to ``BDC_STAC_COUNT_LIMIT``)
+or ``none`` (skip count). The client may override it with the parameter ``count``.
+Defaults to ``exact``."""
+BDC_STAC_COUNT_LIMIT = int(os.getenv("BDC_STAC_COUNT_LIMIT", "10000"))
+"""The maximum number of items to count when using ``capped`` count. Defaults to ``10000``."""
 BDC_STAC_TITLE = os.getenv("BDC_STAC_TITLE", "Brazil Data Cube Catalog")
 BDC_STAC_ID = os.getenv("BDC_STAC_ID", "bdc")
 BDC_STAC_ASSETS_ARGS = os.getenv("BDC_STAC_ASSETS_ARGS", "access_token")
@@ -59,6 +71,102 @@ BDC_AUTH_ACCESS_TOKEN_URL = os.getenv("BDC_AUTH_ACCESS_TOKEN_URL", None)
 BDC_STAC_USE_FOOTPRINT = strtobool(os.getenv("BDC_STAC_USE_FOOTPRINT", "0"))
 """Flag to set if Item intersection should use ``Item.footprint``.
 Defaults to ``0``, which means to use ``Item.bbox``."""
+BDC_STAC_STREAM_ITEMS = strtobool(os.getenv("BDC_STAC_STREAM_ITEMS", "0"))
+"""Flag to stream the FeatureCollection responses of item searches.
+When enabled, items are read from a server-side cursor and each feature is serialized
+and compressed incrementally. Defaults to ``0``, which means to build the whole response in memory."""
+BDC_STAC_STREAM_CHUNK_SIZE = int(os.getenv("BDC_STAC_STREAM_CHUNK_SIZE", "100"))
+"""Number of items fetched from the server-side cursor at once when streaming responses. Defaults to ``100``."""
+BDC_STAC_COLLECTIONS_CACHE_TTL = int(os.getenv("BDC_STAC_COLLECTIONS_CACHE_TTL", "300"))
+"""Time in seconds to keep the collection documents in cache. Use ``0`` to disable the cache.
+Defaults to ``300``."""
+BDC_STAC_COLLECTIONS_CACHE_SIZE = int(os.getenv("BDC_STAC_COLLECTIONS_CACHE_SIZE", "128"))
+"""Maximum number of cached collection listings, one for each collection and role set. Defaults to ``128``."""
+BDC_STAC_CATALOG_CACHE_TTL = int(os.getenv("BDC_STAC_CATALOG_CACHE_TTL", "60"))
+"""Time-to-live in seconds of the catalog (landing page links) cached for each role set. Use ``0`` to disable.
+Defaults to ``60``."""
+BDC_STAC_CATALOG_CACHE_SIZE = int(os.getenv("BDC_STAC_CATALOG_CACHE_SIZE", "128"))
+"""Maximum number of cached catalogs, one for each role set. Defaults to ``128``."""
+BDC_STAC_METADATA_CACHE_TTL = int(os.getenv("BDC_STAC_METADATA_CACHE_TTL", "600"))
+"""Time in seconds to keep the collection metadata (EO bands, quicklook and CRS) in cache.
+Use ``0`` to disable the cache. Defaults to ``600``."""
+BDC_STAC_METADATA_CACHE_SIZE = int(os.getenv("BDC_STAC_METADATA_CACHE_SIZE", "1024"))
+"""Maximum number of entries in the collection metadata cache. Defaults to ``1024``."""
+BDC_STAC_GEOMETRY_FROM_DB = strtobool(os.getenv("BDC_STAC_GEOMETRY_FROM_DB", "0"))
+"""Flag to serialize the item geometry (``ST_AsGeoJSON``) and to compute the item bounds in PostGIS,
+instead of loading the geometries with shapely. Defaults to ``0``."""
+BDC_STAC_ITEM_CACHE_SIZE = int(os.getenv("BDC_STAC_ITEM_CACHE_SIZE", "0"))
+"""Maximum number of serialized items kept in memory, which are served without building the items again.
+Defaults to ``0`` (disabled)."""
+BDC_STAC_ITEM_CACHE_TTL = int(os.getenv("BDC_STAC_ITEM_CACHE_TTL", "3600"))
+"""Time-to-live in seconds of the serialized items in cache. Defaults to ``3600``."""
+BDC_STAC_JSON_ENCODER = os.getenv("BDC_STAC_JSON_ENCODER", "auto")
+"""JSON encoder used to serialize the responses: ``orjson``, ``stdlib`` or ``auto``,
+which uses ``orjson`` when installed. Defaults to ``auto``."""
+BDC_STAC_COMPRESSION_ENCODINGS = os.getenv("BDC_STAC_COMPRESSION_ENCODINGS", "br,zstd,gzip")
+"""Comma-separated list of the content codings used to compress the responses, ordered by preference.
+Defaults to ``br,zstd,gzip``."""
+BDC_STAC_COMPRESSION_MIN_SIZE = int(os.getenv("BDC_STAC_COMPRESSION_MIN_SIZE", "500"))
+"""Minimum size in bytes of the responses to be compressed. Defaults to ``500``."""
+BDC_STAC_COMPRESSION_CACHE_SIZE = int(os.getenv("BDC_STAC_COMPRESSION_CACHE_SIZE", "64"))
+"""Maximum number of compressed bodies kept in memory to reuse for identical responses. Defaults to ``64``."""
+BDC_STAC_COMPRESSION_CACHE_TTL = int(os.getenv("BDC_STAC_COMPRESSION_CACHE_TTL", "300"))
+"""Time-to-live in seconds of the compressed bodies in cache. Defaults to ``300``."""
+BDC_STAC_SEARCH_CACHE = os.getenv("BDC_STAC_SEARCH_CACHE", "")
+"""Backend of the ``/search`` response cache: ``memory`` (in-process) or a Redis URL, e.g. ``redis://localhost:6379/0``.
+Defaults to ``""`` (disabled)."""
+BDC_STAC_SEARCH_CACHE_TTL = int(os.getenv("BDC_STAC_SEARCH_CACHE_TTL", "60"))
+"""Time-to-live in seconds of the cached ``/search`` responses. Defaults to ``60``."""
+BDC_STAC_SEARCH_CACHE_SIZE = int(os.getenv("BDC_STAC_SEARCH_CACHE_SIZE", "256"))
+"""Maximum number of ``/search`` responses in the in-process cache (``memory``). Defaults to ``256``."""
+BDC_STAC_QUERYABLES = os.getenv("BDC_STAC_QUERYABLES", "")
+"""Additional typed properties of ``Item.metadata_`` for the ``query`` filter, as a comma-separated list
+of ``name=type``, e.g. ``"s2:water_percentage=number,s2:mgrs_tile=string"``. The supported types are ``string``,
+``number``, ``integer``, ``boolean`` and ``array``. Defaults to ``""``."""
+BDC_STAC_TILE_PREFILTER = strtobool(os.getenv("BDC_STAC_TILE_PREFILTER", "1"))
+"""Flag to restrict the spatial searches to the grid tiles which intersect the search geometry, before the
+intersection with ``Item.footprint``. Only used with ``BDC_STAC_USE_FOOTPRINT``. Defaults to ``1``."""
+BDC_STAC_GEOMETRY_SIMPLIFY = float(os.getenv("BDC_STAC_GEOMETRY_SIMPLIFY", "0"))
+"""Default tolerance (in degrees) to simplify the item geometries with ``ST_SimplifyPreserveTopology``.
+It may be overridden by the request parameter ``simplify``. Defaults to ``0``, which keeps the full geometry."""
+BDC_STAC_GEOMETRY_PRECISION = int(os.getenv("BDC_STAC_GEOMETRY_PRECISION", "-1"))
+"""Default maximum number of decimal digits of the item geometry coordinates (``ST_AsGeoJSON``).
+It may be overridden by the request parameter ``precision``. Defaults to ``-1``, which keeps the full precision."""
+BDC_STAC_ASYNC_POOL_SIZE = int(os.getenv("BDC_STAC_ASYNC_POOL_SIZE", "20"))
+"""Number of database connections of the asynchronous engine used by the ASGI application (:mod:`bdc_stac.asgi`).
+Each item search takes up to two connections at the same time (page and count). Defaults to ``20``."""
+BDC_STAC_COUNT_WORKERS = int(os.getenv("BDC_STAC_COUNT_WORKERS", "4"))
+"""Number of threads to run the count of matched items concurrently with the page query, on a distinct connection.
+Use ``0`` to run the count after the page query. Defaults to ``4``."""
+BDC_STAC_STATEMENT_TIMEOUT = int(os.getenv("BDC_STAC_STATEMENT_TIMEOUT", "0"))
+"""Maximum time of each SQL statement in milliseconds (PostgreSQL ``statement_timeout``).
+Defaults to ``0``, which disables the timeout."""
+BDC_STAC_SEARCH_POOL_SIZE = int(os.getenv("BDC_STAC_SEARCH_POOL_SIZE", "0"))
+"""Size of a distinct connection pool for the item searches, which keeps the other endpoints responsive
+while the searches are slow. Defaults to ``0``, which runs the searches with the default pool."""
+BDC_STAC_SEARCH_POOL_MAX_OVERFLOW = int(os.getenv("BDC_STAC_SEARCH_POOL_MAX_OVERFLOW", "0"))
+"""Max overflow of the item search pool. Defaults to ``0``."""
+BDC_STAC_SEARCH_STATEMENT_TIMEOUT = int(os.getenv("BDC_STAC_SEARCH_STATEMENT_TIMEOUT", "0"))
+"""Maximum time of each SQL statement of the item search pool, in milliseconds.
+Defaults to ``0``, which uses ``BDC_STAC_STATEMENT_TIMEOUT``."""
+BDC_STAC_SERVER_TIMING = strtobool(os.getenv("BDC_STAC_SERVER_TIMING", "0"))
+"""Add the header ``Server-Timing`` with the time waiting for database connections (``db-checkout``).
+Defaults to ``0``."""
+BDC_STAC_STATEMENT_CACHE_SIZE = int(os.getenv("BDC_STAC_STATEMENT_CACHE_SIZE", "256"))
+"""Maximum number of item search statements cached by search shape (collections, bbox and datetime).
+Use ``0`` to build the statement of each search. Defaults to ``256``."""
+BDC_STAC_READ_REPLICAS = [uri.strip() for uri in os.getenv("BDC_STAC_READ_REPLICAS", "").split(",") if uri.strip()]
+"""Database URIs of the read replicas, as a comma-separated list. The read-only endpoints run on the replicas
+instead of ``SQLALCHEMY_DATABASE_URI``. Defaults to ``""``, which disables the replicas."""
+BDC_STAC_READ_REPLICAS_POLICY = os.getenv("BDC_STAC_READ_REPLICAS_POLICY", "round-robin")
+"""Policy to select the read replica of each request.
+Use one of ``round-robin``, ``least-connections`` or ``lag-aware``. Defaults to ``round-robin``."""
+BDC_STAC_REPLICA_MAX_LAG = float(os.getenv("BDC_STAC_REPLICA_MAX_LAG", "30"))
+"""Maximum replication lag, in seconds, of the replicas selected by the ``lag-aware`` policy. Defaults to ``30``."""
+BDC_STAC_REPLICA_HEALTH_TTL = float(os.getenv("BDC_STAC_REPLICA_HEALTH_TTL", "5"))
+"""Number of seconds to keep the health (replication lag) of each replica. Defaults to ``5``."""
+BDC_STAC_REPLICA_CONNECT_TIMEOUT = int(os.getenv("BDC_STAC_REPLICA_CONNECT_TIMEOUT", "2"))
+"""Maximum time in seconds to connect to a replica to check its health. Use ``0`` to disable. Defaults to ``2``."""
 
 STAC_GEO_MEDIA_TYPE = "application/geo+json"
 
@@ -25,38 +25,103 @@ collections items and artifacts from BDC-Catalog.
 
     Integrate with BDC-Catalog v1.0+ and role system support.
 """
+import json
 import warnings
 from datetime import datetime as dt
-from functools import lru_cache
-from typing import List, Optional
-from urllib.parse import urljoin
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
 import shapely.geometry
-from bdc_catalog.models import Band, Collection, CompositeFunction, GridRefSys, Item, ItemsProcessors, Tile, Timeline
+from bdc_catalog.models import (
+    Band,
+    Collection,
+    CompositeFunction,
+    GridRefSys,
+    Item,
+    ItemsProcessors,
+    Processor,
+    Quicklook,
+    Tile,
+    Timeline,
+)
 from flask import abort, current_app, request
-from flask_sqlalchemy import Pagination, SQLAlchemy
 from geoalchemy2.shape import to_shape
-from sqlalchemy import Float, and_, cast, exc, func, or_
+from sqlalchemy import Float, bindparam, cast, exc, func, literal, or_, select, union_all
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import Query
 
+from .cache import cached, register_cache, reload_caches
 from .config import (
     BDC_STAC_API_VERSION,
     BDC_STAC_BASE_URL,
+    BDC_STAC_CATALOG_CACHE_SIZE,
+    BDC_STAC_CATALOG_CACHE_TTL,
+    BDC_STAC_COLLECTIONS_CACHE_SIZE,
+    BDC_STAC_COLLECTIONS_CACHE_TTL,
+    BDC_STAC_COUNT_LIMIT,
+    BDC_STAC_COUNT_MODE,
+    BDC_STAC_COUNT_WORKERS,
     BDC_STAC_FILE_ROOT,
+    BDC_STAC_GEOMETRY_FROM_DB,
+    BDC_STAC_GEOMETRY_PRECISION,
+    BDC_STAC_GEOMETRY_SIMPLIFY,
+    BDC_STAC_ITEM_CACHE_SIZE,
+    BDC_STAC_ITEM_CACHE_TTL,
     BDC_STAC_MAX_LIMIT,
+    BDC_STAC_METADATA_CACHE_SIZE,
+    BDC_STAC_METADATA_CACHE_TTL,
+    BDC_STAC_STATEMENT_CACHE_SIZE,
+    BDC_STAC_STREAM_CHUNK_SIZE,
+    BDC_STAC_TILE_PREFILTER,
     BDC_STAC_USE_FOOTPRINT,
     get_stac_extensions,
 )
+from .cql2 import compile_filter, parse_datetime, parse_filter
+from .database import SEARCH_BIND, STACSQLAlchemy
+from .pagination import (
+    COUNT_MODES,
+    ItemPagination,
+    ItemSearch,
+    SearchStatement,
+    count_executor,
+    decode_token,
+    decode_token_count,
+)
+from .queryables import get_queryable
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", category=exc.SAWarning)
 
 
-db = SQLAlchemy()
+db = STACSQLAlchemy(session_options={"replicas": True})
+
+session = db.create_scoped_session({"autocommit": True, "replicas": True})
+"""Session of the catalog reads. It uses the read replicas when ``BDC_STAC_READ_REPLICAS`` is set."""
 
-session = db.create_scoped_session({"autocommit": True})
+search_session = db.create_scoped_session({"autocommit": True, "bind_key": SEARCH_BIND, "replicas": True})
+"""Session of the item searches. It uses the search pool when ``BDC_STAC_SEARCH_POOL_SIZE`` is set,
+on the read replicas when ``BDC_STAC_READ_REPLICAS`` is set (one search pool for each replica)."""
+
+_collections_cache = register_cache(
+    "collections", maxsize=BDC_STAC_COLLECTIONS_CACHE_SIZE, ttl=BDC_STAC_COLLECTIONS_CACHE_TTL
+)
+_metadata_cache = register_cache("metadata", maxsize=BDC_STAC_METADATA_CACHE_SIZE, ttl=BDC_STAC_METADATA_CACHE_TTL)
+_catalog_cache = register_cache("catalog", maxsize=BDC_STAC_CATALOG_CACHE_SIZE, ttl=BDC_STAC_CATALOG_CACHE_TTL)
+_item_fragments_cache = register_cache("items", maxsize=BDC_STAC_ITEM_CACHE_SIZE, ttl=BDC_STAC_ITEM_CACHE_TTL)
+# The search statements only depend on the search shape, not on the catalog data
+_statements_cache = register_cache("statements", maxsize=BDC_STAC_STATEMENT_CACHE_SIZE, ttl=24 * 60 * 60)
 
 DATETIME_RFC339 = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+_COLLECTION_INDEX_KEY = ("identifier-index",)
+"""Key of the collection identifier index in the collections cache. See :func:`get_collection_ids`."""
+
+_COLLECTION_MISSES_KEY = ("identifier-misses",)
+"""Key of the identifiers not found in the collection identifier index. See :func:`get_collection_ids`."""
+
+_COLLECTION_MISSES_MAX = 1024
+"""Maximum number of identifiers kept in the collection identifier misses."""
+
 
 def get_collection_items(
     collection_id=None,
@@ -70,8 +135,14 @@ def get_collection_items(
     page=1,
     limit=10,
     query=None,
+    token=None,
+    count=None,
+    stream=False,
+    simplify=None,
+    precision=None,
+    prepare=False,
     **kwargs,
-) -> Pagination:
+) -> Union[ItemPagination, ItemSearch]:
     """Retrieve a list of collection items based on filters.
 
     :param collection_id: Single Collection ID to include in the search for items.
@@ -101,36 +172,47 @@ def get_collection_items(
     :type limit: int, optional
     :param query: The STAC extra query internal properties
     :type query: dict, optional
-    :return: list of collectio items
-    :rtype: list
+    :param token: The pagination token of the next page. When given, ``page`` is ignored, defaults to None
+    :type token: str, optional
+    :param count: The strategy to count the matched items. One of ``exact``, ``estimated``, ``capped`` or ``none``.
+                  Defaults to ``BDC_STAC_COUNT_MODE``.
+    :type count: str, optional
+    :param stream: Read the items lazily from a server-side cursor, defaults to False.
+                   When enabled, it returns a :class:`bdc_stac.pagination.ItemStream`.
+    :type stream: bool, optional
+    :param simplify: The tolerance (in degrees) to simplify the item geometries with ``ST_SimplifyPreserveTopology``.
+                     Use ``0`` to keep the full geometry. Defaults to ``BDC_STAC_GEOMETRY_SIMPLIFY``.
+    :type simplify: float, optional
+    :param precision: The maximum number of decimal digits of the geometry coordinates.
+                      Defaults to ``BDC_STAC_GEOMETRY_PRECISION``.
+    :type precision: int, optional
+    :param prepare: Return the :class:`bdc_stac.pagination.ItemSearch` without running its queries, defaults to False.
+    :type prepare: bool, optional
+    :param kwargs: The extra parameters. It includes ``filter``, ``filter-lang`` and ``filter-crs``
+                   of the STAC API Filter extension. See :mod:`bdc_stac.cql2`.
+    :return: The page of collection items
+    :rtype: ItemPagination
     """
     exclude = kwargs.get("exclude", [])
-
-    columns = [
-        Collection.identifier.label("collection"),
-        Collection.collection_type,
-        Collection.category,
-        Item.metadata_.label("item_meta"),
-        Item.name.label("item"),
-        Item.id,
-        Item.collection_id,
-        Item.start_date.label("start"),
-        Item.end_date.label("end"),
-        Item.created,
-        Item.updated,
-        cast(Item.cloud_cover, Float).label("cloud_cover"),
-        Item.footprint,
-        Item.bbox,
-        Tile.name.label("tile"),
-    ]
-
-    # For performance, only retrieve assets when required
-    if "assets" not in exclude:
-        columns.append(Item.assets)
+    simplify, precision = _geometry_options(simplify, precision)
 
     if roles is None:
         roles = []
 
+    if ids is None and item_id is None and not query and not kwargs.get("filter") and intersects is None:
+        search_statement = _get_search_statement_params(
+            collection_id, collections, bbox, datetime, roles, "assets" not in exclude, simplify, precision
+        )
+        if search_statement is not None:
+            statement, params = search_statement
+            query = statement.query.with_session(search_session()).params(**params)
+            return _paginate_search(query, page, limit, token, count, stream, prepare, statement, params)
+
+    columns = _search_columns("assets" not in exclude, simplify, precision, BDC_STAC_GEOMETRY_FROM_DB)
+    if item_id is not None:
+        # The version stamp of the item document. See item_stamp
+        columns += _item_stamp_columns()
+
     where = [
         Collection.id == Item.collection_id,
         Collection.is_available.is_(True),
@@ -138,6 +220,7 @@ def get_collection_items(
         _add_roles_constraint(roles),
     ]
     geom_field = Item.footprint if BDC_STAC_USE_FOOTPRINT else Item.bbox
+    collection_ids = None
 
     if ids is not None:
         if isinstance(ids, str):
@@ -153,75 +236,316 @@ def get_collection_items(
         if collections:
             collections = collections.split(",") if isinstance(collections, str) else collections
 
-            rows = db.session.query(Collection.id).filter(Collection.identifier.in_(collections)).all()
-            where += [Collection.id.in_(c.id for c in rows)]
+            collection_ids = get_collection_ids(collections)
+            if collection_ids is None:
+                where += [Collection.identifier.in_(collections)]
+            else:
+                where += [Item.collection_id.in_(collection_ids)]
 
         if item_id is not None:
             where += [Item.name.like(item_id)]
 
         if query:
-            filters = create_query_filter(query)
+            try:
+                filters = create_query_filter(query)
+            except ValueError as e:
+                abort(400, str(e))
             where += filters
 
+        if kwargs.get("filter"):
+            where += _create_cql2_filter(
+                kwargs["filter"], kwargs.get("filter-lang"), kwargs.get("filter-crs"), geom_field
+            )
+
+        search_geometry = None
         if intersects is not None:
-            where += [func.ST_Intersects(func.ST_GeomFromGeoJSON(str(intersects)), geom_field)]
+            search_geometry = func.ST_GeomFromGeoJSON(str(intersects))
         elif bbox is not None:
-            try:
-                if isinstance(bbox, str):
-                    bbox = bbox.split(",")
-
-                bbox = [float(x) for x in bbox]
-
-                if bbox[0] == bbox[2] or bbox[1] == bbox[3]:
-                    raise InvalidBoundingBoxError("")
+            bbox = _parse_bbox(bbox)
+            search_geometry = func.ST_MakeEnvelope(bbox[0], bbox[1], bbox[2], bbox[3], 4326)
 
-                where += [
-                    func.ST_Intersects(
-                        func.ST_MakeEnvelope(bbox[0], bbox[1], bbox[2], bbox[3], 4326),
-                        # TODO: Use footprint to intersect or bbox?
-                        geom_field,
-                    )
-                ]
-            except (ValueError, InvalidBoundingBoxError) as e:
-                abort(400, f"{bbox} is not a valid bbox.")
+        if search_geometry is not None:
+            # Resolve the candidate tiles first, so the exact intersection only runs for the items of these tiles
+            where += _create_tile_filter(collection_ids, search_geometry)
+            # TODO: Use footprint to intersect or bbox?
+            where += [func.ST_Intersects(search_geometry, geom_field)]
 
         if datetime is not None:
-            if "/" in datetime:
-                matches_open = ("..", "")
-                time_start, time_end = datetime.split("/")
-                if time_start in matches_open:  # open start
-                    date_filter = [or_(Item.start_date <= time_end, Item.end_date <= time_end)]
-                elif time_end in matches_open:  # open end
-                    date_filter = [or_(Item.start_date >= time_start, Item.end_date >= time_start)]
-                else:  # closed range
-                    date_filter = [
-                        or_(
-                            # TODO: Review this legacy date interval comparison
-                            and_(Item.start_date >= time_start, Item.start_date <= time_end),
-                            and_(Item.end_date >= time_start, Item.end_date <= time_end),
-                            and_(Item.start_date < time_start, Item.end_date > time_end),
-                        )
-                    ]
-            else:
-                date_filter = [and_(Item.start_date <= datetime, Item.end_date >= datetime)]
-            where += date_filter
+            time_start, time_end = _datetime_range(datetime)
+            where += _datetime_filter(time_start, time_end)
     outer = [Item.tile_id == Tile.id]
-    query = session.query(*columns).outerjoin(Tile, *outer).filter(*where).order_by(Item.start_date.desc(), Item.id)
+    query = (
+        search_session.query(*columns).outerjoin(Tile, *outer).filter(*where).order_by(Item.start_date.desc(), Item.id)
+    )
+
+    return _paginate_search(query, page, limit, token, count, stream, prepare)
+
+
+def _paginate_search(
+    query, page, limit, token, count, stream, prepare, statement=None, params=None
+) -> Union[ItemPagination, ItemSearch]:
+    """Paginate the items query of :func:`get_collection_items`."""
+    cursor, counted = None, None
+    if token:
+        try:
+            cursor, counted = decode_token(token), decode_token_count(token)
+        except ValueError:
+            abort(400, f"{token} is not a valid pagination token.")
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        abort(400, f"Invalid limit '{limit}'.")
+    if limit < 0:
+        abort(400, f"Invalid limit '{limit}'. It must be greater than or equal to 0.")
+
+    count = count or BDC_STAC_COUNT_MODE
+    if count not in COUNT_MODES:
+        abort(400, f"Invalid count '{count}'. Use one of {', '.join(COUNT_MODES)}.")
+
+    search = ItemSearch(
+        query,
+        page=page,
+        limit=limit,
+        max_limit=BDC_STAC_MAX_LIMIT,
+        cursor=cursor,
+        count=count,
+        count_limit=BDC_STAC_COUNT_LIMIT,
+        statement=statement,
+        params=params,
+        counted=counted,
+    )
+    if prepare:
+        return search
+
+    return search.paginate(
+        stream=stream, chunk_size=BDC_STAC_STREAM_CHUNK_SIZE, executor=count_executor(BDC_STAC_COUNT_WORKERS)
+    )
+
+
+def _search_columns(with_assets: bool, simplify: float, precision: Optional[int], geometry_from_db: bool) -> list:
+    """Build the columns of the items query of :func:`get_collection_items`."""
+    columns = [
+        Collection.identifier.label("collection"),
+        Collection.collection_type,
+        Collection.category,
+        Item.metadata_.label("item_meta"),
+        Item.name.label("item"),
+        Item.id,
+        Item.collection_id,
+        Item.start_date.label("start"),
+        Item.end_date.label("end"),
+        Item.created,
+        Item.updated,
+        cast(Item.cloud_cover, Float).label("cloud_cover"),
+        Tile.name.label("tile"),
+    ]
+
+    if geometry_from_db or simplify or precision is not None:
+        # Serialize the geometry and compute the bounds with PostGIS instead of shapely
+        geometry = func.coalesce(Item.footprint, Item.bbox)
+        if simplify:
+            geometry = func.ST_SimplifyPreserveTopology(geometry, simplify)
+        columns += [
+            func.ST_AsGeoJSON(geometry, *([precision] if precision is not None else [])).label("geometry"),
+            array(
+                [func.ST_XMin(Item.bbox), func.ST_YMin(Item.bbox), func.ST_XMax(Item.bbox), func.ST_YMax(Item.bbox)]
+            ).label("bbox_bounds"),
+        ]
+    else:
+        columns += [Item.footprint, Item.bbox]
+
+    if simplify or precision is not None:
+        # Identify the geometry level of the rows, which is part of the item cache key
+        columns.append(literal(f"{simplify}:{precision}").label("geometry_level"))
+
+    # For performance, only retrieve assets when required
+    if with_assets:
+        columns.append(Item.assets)
+
+    return columns
+
+
+def _get_search_statement_params(
+    collection_id, collections, bbox, datetime, roles: List[str], with_assets: bool, simplify, precision
+) -> Optional[Tuple[SearchStatement, dict]]:
+    """Retrieve the cached statement of the common searches (collections, bbox and datetime) and its parameters.
+
+    The statement is built once for each search shape (see :func:`_get_search_statement`) with bound
+    parameters, so the requests only bind their values. It skips the construction of the query and the
+    compilation of the page and count statements, which are not cached by SQLAlchemy due to the geometry
+    columns. The SQL of a shape is also the same for all the requests, which allows ``asyncpg`` to prepare
+    it once per connection (see :mod:`bdc_stac.asgi`).
+
+    :return: The search statement and the parameters or ``None`` when the statement cache is disabled.
+        See ``BDC_STAC_STATEMENT_CACHE_SIZE``.
+    """
+    if not _statements_cache.enabled:
+        return None
+
+    if collection_id and collections:
+        abort(400, "Invalid parameter. Use collection_id or collections.")
 
-    result: Pagination = query.paginate(
-        page=int(page), per_page=int(limit), error_out=False, max_per_page=BDC_STAC_MAX_LIMIT
+    if collection_id:
+        collections = [collection_id]
+
+    params = {}
+    collections_key = collection_ids = None
+    if collections:
+        collections = collections.split(",") if isinstance(collections, str) else collections
+
+        collection_ids = get_collection_ids(collections)
+        if collection_ids is None:
+            collections_key, params["bdc_collections"] = "identifier", list(collections)
+        else:
+            collections_key, params["bdc_collections"] = "id", collection_ids
+
+    tiles = False
+    if bbox is not None:
+        bbox = _parse_bbox(bbox)
+        params.update(bdc_xmin=bbox[0], bdc_ymin=bbox[1], bdc_xmax=bbox[2], bdc_ymax=bbox[3])
+
+        tile_ids = _resolve_tile_ids(collection_ids, func.ST_MakeEnvelope(bbox[0], bbox[1], bbox[2], bbox[3], 4326))
+        if tile_ids is not None:
+            tiles, params["bdc_tile_ids"] = True, tile_ids
+
+    time_start = time_end = None
+    if datetime is not None:
+        time_start, time_end = _datetime_range(datetime)
+        if time_start is not None:
+            params["bdc_time_start"] = time_start
+        if time_end is not None:
+            params["bdc_time_end"] = time_end
+
+    roles_shape = "*" if "*" in roles else ("list" if roles else None)
+    if roles_shape == "list":
+        params["bdc_roles"] = list(roles)
+
+    statement = _get_search_statement(
+        with_assets,
+        simplify,
+        precision,
+        BDC_STAC_GEOMETRY_FROM_DB,
+        BDC_STAC_USE_FOOTPRINT,
+        roles_shape,
+        collections_key,
+        bbox is not None,
+        tiles,
+        time_start is not None,
+        time_end is not None,
     )
+    return statement, params
+
+
+@cached(_statements_cache)
+def _get_search_statement(
+    with_assets, simplify, precision, geometry_from_db, use_footprint, roles, collections, bbox, tiles, start, end
+) -> SearchStatement:
+    """Build the statement of a search shape, with bound parameters for the search values.
+
+    The parameters are ``bdc_roles``, ``bdc_collections``, ``bdc_xmin``, ``bdc_ymin``, ``bdc_xmax``,
+    ``bdc_ymax``, ``bdc_tile_ids``, ``bdc_time_start`` and ``bdc_time_end``. See :func:`_get_search_statement_params`.
+    """
+    if roles == "list":
+        roles_filter = or_(
+            Collection.is_public.is_(True), Collection.identifier.in_(bindparam("bdc_roles", expanding=True))
+        )
+    else:
+        roles_filter = _add_roles_constraint(["*"] if roles == "*" else [])
+
+    where = [
+        Collection.id == Item.collection_id,
+        Collection.is_available.is_(True),
+        Item.is_available.is_(True),
+        roles_filter,
+    ]
+
+    if collections == "id":
+        where += [Item.collection_id.in_(bindparam("bdc_collections", expanding=True))]
+    elif collections == "identifier":
+        where += [Collection.identifier.in_(bindparam("bdc_collections", expanding=True))]
+
+    if bbox:
+        geometry = func.ST_MakeEnvelope(
+            bindparam("bdc_xmin"), bindparam("bdc_ymin"), bindparam("bdc_xmax"), bindparam("bdc_ymax"), 4326
+        )
+        if tiles:
+            where += [or_(Item.tile_id.in_(bindparam("bdc_tile_ids", expanding=True)), Item.tile_id.is_(None))]
+        where += [func.ST_Intersects(geometry, Item.footprint if use_footprint else Item.bbox)]
+
+    where += _datetime_filter(
+        bindparam("bdc_time_start") if start else None, bindparam("bdc_time_end") if end else None
+    )
+
+    columns = _search_columns(with_assets, simplify, precision, geometry_from_db)
+    query = Query(columns).outerjoin(Tile, Item.tile_id == Tile.id).filter(*where)
+    return SearchStatement(query.order_by(Item.start_date.desc(), Item.id))
+
+
+def _parse_bbox(bbox) -> List[float]:
+    """Parse the bounding box parameter ``west,south,east,north``. The request is aborted with ``400`` when invalid."""
+    try:
+        if isinstance(bbox, str):
+            bbox = bbox.split(",")
+
+        bbox = [float(x) for x in bbox]
+
+        if bbox[0] == bbox[2] or bbox[1] == bbox[3]:
+            raise InvalidBoundingBoxError("")
+    except (ValueError, IndexError, InvalidBoundingBoxError):
+        abort(400, f"{bbox} is not a valid bbox.")
+
+    return bbox
+
+
+def _datetime_range(value: str) -> Tuple[Optional[dt], Optional[dt]]:
+    """Parse the datetime parameter, a single date or a range (``/``) with open ends (``..``).
+
+    The request is aborted with ``400`` when invalid. See :func:`bdc_stac.cql2.parse_datetime`.
+
+    Example:
+        >>> _datetime_range("2021-01-01/..")
+        (datetime.datetime(2021, 1, 1, 0, 0, tzinfo=datetime.timezone.utc), None)
+
+    :return: The start and end of the range. ``None`` for open ends.
+    """
+    matches_open = ("..", "")
+    try:
+        if "/" not in value:
+            time_start = time_end = parse_datetime(value)
+            return time_start, time_end
+
+        time_start, time_end = value.split("/")
+        return (
+            None if time_start in matches_open else parse_datetime(time_start),
+            None if time_end in matches_open else parse_datetime(time_end),
+        )
+    except ValueError:
+        abort(400, f"{value} is not a valid datetime.")
+
+
+def _datetime_filter(time_start, time_end) -> list:
+    """Build the filter of items whose range ``[start_date, end_date]`` overlaps ``[time_start, time_end]``.
 
-    return result
+    The temporal filters are written as a single overlap predicate (AND), which allows PostgreSQL
+    to use an index on (start_date, end_date). See ``bdc-stac create-indexes``.
+    """
+    where = []
+    if time_end is not None:
+        where.append(Item.start_date <= time_end)
+    if time_start is not None:
+        where.append(Item.end_date >= time_start)
+    return where
 
 
-@lru_cache()
+@cached(_metadata_cache)
 def get_collection_eo(collection_id):
     """Get Collection Electro-Optical properties.
 
     .. note::
 
-        This method uses LRU Cache to improve response time.
+        This method uses the metadata cache to improve response time.
+        See ``BDC_STAC_METADATA_CACHE_TTL``.
 
     Args:
         collection_id (str): collection identifier
@@ -257,19 +581,36 @@ def get_collection_eo(collection_id):
     return {"eo:gsd": eo_gsd, "eo:bands": eo_bands}
 
 
-@lru_cache()
-def get_collection_crs(collection: Collection) -> str:
+@cached(_metadata_cache)
+def get_collection_bands_index(collection_id) -> Dict[str, List[dict]]:
+    """Retrieve the collection EO bands indexed by band name.
+
+    It is used to match the item assets and the ``eo:bands`` without
+    scanning all the collection bands for each asset.
+
+    :param collection_id: collection identifier
+    :return: Map of band name and the value of asset ``eo:bands``.
+    """
+    return {band["name"]: [band] for band in get_collection_eo(collection_id)["eo:bands"]}
+
+
+@cached(_metadata_cache)
+def get_collection_crs(collection_id: int) -> Optional[str]:
     """Retrieve the CRS for a given collection.
 
     By default, this method uses the grid reference system to retrieve collection crs.
     When no grid is set, tries to seek for property ``bdc:crs`` in Collection.properties.
 
-    :param collection: The BDC Collection object
-    :type collection: Collection
+    :param collection_id: The BDC Collection identifier (``Collection.id``)
+    :type collection_id: int
     :return: CRS for the collection
     :rtype: str
     """
+    collection = session.query(Collection).filter(Collection.id == collection_id).first()
+
     crs = None
+    if collection is None:
+        return crs
     if collection.grs is not None:
         crs = collection.grs.crs
     elif collection.properties is not None:
@@ -290,7 +631,7 @@ def format_timeline(timeline: Optional[List[Timeline]] = None):
     return [dt.fromisoformat(str(t.time_inst)).strftime("%Y-%m-%d") for t in timeline]
 
 
-@lru_cache()
+@cached(_metadata_cache)
 def get_collection_quicklook(collection_id):
     """Retrieve a list of bands used to create the quicklook for a given collection.
 
@@ -313,23 +654,264 @@ def get_collection_quicklook(collection_id):
     return quicklook_bands["quicklooks"] if quicklook_bands else None
 
 
-def get_collections(collection_id=None, roles=None, assets_kwargs=None):
+def get_collections(collection_id=None, roles=None, assets_kwargs=None, stamp=None):
     """Retrieve information of all collections or one if an id is given.
 
+    .. note::
+
+        The collection documents are cached by role visibility (see ``BDC_STAC_COLLECTIONS_CACHE_TTL``).
+        The STAC URL and the ``assets_kwargs`` are applied to the cached documents on each call.
+
     :param collection_id: collection identifier
     :type collection_id: str
+    :param roles: The user roles
+    :type roles: list
+    :param assets_kwargs: Query string appended to the collection links
+    :type assets_kwargs: str
+    :param stamp: The collections stamp, when already retrieved. See :func:`get_collections_stamp`.
+    :type stamp: tuple
     :return: list of collections
     :rtype: list
     """
+    if roles is None:
+        roles = []
+
+    if not _collections_cache.validate(stamp if stamp is not None else get_collections_stamp()):
+        # The catalog has changed: discard the collection metadata cached as well
+        reload_caches()
+
+    key = (collection_id, roles_key(roles))
+    documents = _collections_cache.get(key)
+    if documents is None:
+        documents = _build_collections(collection_id=collection_id, roles=roles)
+        _collections_cache.set(key, documents)
+
+    stac_url = resolve_stac_url()
+    return [_render_collection(document, stac_url, assets_kwargs or "") for document in documents]
+
+
+def get_collection_ids(identifiers: List[str]) -> Optional[List[int]]:
+    """Resolve the collection identifiers (``Name-Version``) to ``Collection.id`` using an in-memory index.
+
+    The index is kept in the collections cache, so it is discarded along with the collection documents.
+    It is loaded again when an identifier is not found, which covers the collections created in meantime.
+    Unknown identifiers are ignored and kept in the cache as well, so they do not load the index again
+    until the collections cache expires or is reloaded.
+
+    :return: The collection ids or ``None`` when the collections cache is disabled.
+    """
+    if not _collections_cache.enabled:
+        return None
+
+    index = _collections_cache.get(_COLLECTION_INDEX_KEY)
+    missing = {identifier for identifier in identifiers if index is None or identifier not in index}
+    misses = _collections_cache.get(_COLLECTION_MISSES_KEY) or frozenset()
+    if index is None or not missing <= misses:
+        index = dict(session.query(Collection.identifier, Collection.id).all())
+        misses = frozenset(identifier for identifier in misses | missing if identifier not in index)
+        if len(misses) > _COLLECTION_MISSES_MAX:
+            misses = frozenset(identifier for identifier in missing if identifier not in index)
+        _collections_cache.set(_COLLECTION_INDEX_KEY, index)
+        _collections_cache.set(_COLLECTION_MISSES_KEY, misses)
+
+    return [index[identifier] for identifier in identifiers if identifier in index]
+
+
+@cached(_metadata_cache)
+def get_collection_grid(collection_id: int) -> Optional[int]:
+    """Retrieve the grid reference system (``GridRefSys.id``) of a collection.
+
+    :param collection_id: The BDC Collection identifier (``Collection.id``)
+    :return: The grid identifier or ``None`` when the collection has no grid.
+    """
+    return session.query(Collection.grid_ref_sys_id).filter(Collection.id == collection_id).scalar()
+
+
+@cached(_metadata_cache)
+def get_grid_table(grid_id: int):
+    """Retrieve the geometry table of a grid reference system, with the columns ``tile`` and ``geom``.
+
+    :param grid_id: The grid identifier (``GridRefSys.id``)
+    :return: The SQLAlchemy table or ``None`` when the grid has no geometry table.
+    """
+    grid = session.query(GridRefSys).filter(GridRefSys.id == grid_id).first()
+    if grid is None:
+        return None
+    return grid.geom_table
+
+
+def get_grid_tiles(grid_id: int, geometry) -> Optional[List[int]]:
+    """Retrieve the tiles (``Tile.id``) of a grid which intersect the given geometry.
+
+    The geometry (EPSG:4326) is transformed to the grid SRID, so the intersection uses the
+    spatial index of the grid table. It is segmentized before, so the edges of large geometries
+    follow the projected curves.
+
+    :param grid_id: The grid identifier (``GridRefSys.id``)
+    :param geometry: The SQL expression of the search geometry.
+    :return: The tile identifiers or ``None`` when the grid has no geometry table.
+    """
+    table = get_grid_table(grid_id)
+    if table is None:
+        return None
+
+    srid = func.Find_SRID(table.schema or "public", table.name, "geom")
+    rows = (
+        session.query(Tile.id)
+        .join(table, table.c.tile == Tile.name)
+        .filter(
+            Tile.grid_ref_sys_id == grid_id,
+            func.ST_Intersects(table.c.geom, func.ST_Transform(func.ST_Segmentize(geometry, 0.1), srid)),
+        )
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def _create_tile_filter(collection_ids: Optional[List[int]], geometry) -> list:
+    """Restrict a spatial search to the items of the grid tiles which intersect the search geometry.
+
+    The tiles are resolved from the (small) grid tables, which turns the search into
+    a selective ``Item.tile_id IN (...)`` before the intersection of the item footprints.
+    It is only used when all the searched collections have a grid. The items without tile
+    (``Item.tile_id IS NULL``) are kept. See ``BDC_STAC_TILE_PREFILTER``.
+    """
+    tile_ids = _resolve_tile_ids(collection_ids, geometry)
+    if tile_ids is None:
+        return []
+
+    if not tile_ids:
+        return [Item.tile_id.is_(None)]
+    return [or_(Item.tile_id.in_(tile_ids), Item.tile_id.is_(None))]
+
+
+def _resolve_tile_ids(collection_ids: Optional[List[int]], geometry) -> Optional[List[int]]:
+    """Retrieve the grid tiles of the collections which intersect the search geometry.
+
+    :return: The tile identifiers or ``None`` when the search is not restricted by tiles.
+    """
+    if not BDC_STAC_USE_FOOTPRINT or not BDC_STAC_TILE_PREFILTER or not collection_ids:
+        return None
+
+    grids = {get_collection_grid(collection_id) for collection_id in collection_ids}
+    if None in grids:
+        return None
+
+    tile_ids = []
+    for grid_id in sorted(grids):
+        tiles = get_grid_tiles(grid_id, geometry)
+        if tiles is None:
+            return None
+        tile_ids.extend(tiles)
+
+    return tile_ids
+
+
+def invalidate_collections_cache():
+    """Discard all the collection documents cached by :func:`get_collections`."""
+    _collections_cache.validate(None)
+
+
+def get_collections_stamp():
+    """Retrieve a version stamp for the tables of the collection documents.
+
+    The stamp is composed by the latest ``updated`` and the number of rows of the collections,
+    bands, quicklook and timeline tables, which changes whenever one of their rows is created,
+    updated or removed.
+    """
+    tables = (Collection, Band, Quicklook, Timeline)
+    stamps = union_all(
+        *(
+            select([literal(index), func.max(model.updated), func.count()]).select_from(model.__table__)
+            for index, model in enumerate(tables)
+        )
+    )
+    rows = sorted(session.execute(stamps).fetchall())
+    return tuple(value for row in rows for value in tuple(row)[1:])
+
+
+def get_items_stamp(collections: Optional[List[str]] = None) -> tuple:
+    """Retrieve a version stamp for the items of the given collections.
+
+    The stamp is composed by the latest ``Item.updated`` and the number of items, which changes whenever
+    an item is created, updated or removed. It uses the index ``items_collection_updated`` when created
+    (see :mod:`bdc_stac.indexes`).
+
+    :param collections: The collection identifiers (``Name-Version``). Use ``None`` for all the collections.
+    """
+    query = session.query(func.max(Item.updated), func.count(Item.id))
+    if collections:
+        collection_ids = get_collection_ids(collections)
+        if collection_ids is None:
+            query = query.filter(Collection.id == Item.collection_id, Collection.identifier.in_(collections))
+        else:
+            query = query.filter(Item.collection_id.in_(collection_ids))
+    return tuple(query.one())
+
+
+def get_item_stamp(collection_id: str, item_id: str, roles=None):
+    """Retrieve a version stamp for an item, without loading the item.
+
+    The stamp is composed by ``Item.updated``, the ``Collection.updated`` of its collection and the
+    latest ``Band.updated`` and number of bands of the collection, which change the item document through
+    the collection metadata (e.g. ``eo:bands``). See :func:`item_stamp`.
+
+    :return: The stamp or ``None`` when the item is not found for the given roles.
+    """
+    row = (
+        session.query(Item.updated, *_item_stamp_columns())
+        .filter(
+            Collection.id == Item.collection_id,
+            Collection.identifier == collection_id,
+            Collection.is_available.is_(True),
+            Item.is_available.is_(True),
+            Item.name.like(item_id),
+            _add_roles_constraint(roles or []),
+        )
+        .first()
+    )
+    return None if row is None else tuple(row)
+
+
+def item_stamp(row) -> tuple:
+    """Retrieve the version stamp of an item row, loaded by :func:`get_collection_items` with ``item_id``.
+
+    It is the same stamp of :func:`get_item_stamp`, without an additional query.
+    """
+    return (row.updated, row.collection_updated, row.bands_updated, row.bands_count)
+
+
+def _item_stamp_columns() -> list:
+    """Build the columns of the item stamp from the collection and its bands. See :func:`get_item_stamp`."""
+    bands = Band.collection_id == Item.collection_id
+    return [
+        Collection.updated.label("collection_updated"),
+        select([func.max(Band.updated)]).where(bands).label("bands_updated"),
+        select([func.count(Band.id)]).where(bands).label("bands_count"),
+    ]
+
+
+def _render_collection(document, stac_url: str, qs: str) -> dict:
+    """Apply the request STAC URL and query string to a collection document built by :func:`_build_collections`."""
+    collection, links, extra_links = document
+    links = [{**link, "href": f"{stac_url}{link['href']}{qs}"} for link in links]
+    return {**collection, "links": [*links, *extra_links]}
+
+
+def _build_collections(collection_id=None, roles=None):
+    """Build the collection documents without the request dependent values.
+
+    Each document is a tuple ``(collection, links, extra_links)``, where ``links`` contains
+    the links to the STAC resources with ``href`` relative to the STAC URL
+    and ``extra_links`` contains the absolute links from the collection properties.
+    See :func:`_render_collection`.
+    """
     columns = [
         Collection,
         CompositeFunction.name.label("composite_function"),
         GridRefSys.name.label("grid_ref_sys"),
     ]
 
-    if roles is None:
-        roles = []
-
     where = [Collection.is_available.is_(True), _add_roles_constraint(roles)]
 
     if collection_id:
@@ -369,16 +951,16 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
 
         successor: Optional[Collection] = None
 
-        extra_links = []
+        version_links = []
         if r.Collection.version_successor is not None:
             successor: Collection = collection_map.get(r.Collection.version_successor)
             if successor:
-                extra_links.append(_collection_link(successor, rel="successor-version", qs=assets_kwargs))
+                version_links.append(_collection_link(successor, rel="successor-version"))
 
         if r.Collection.version_predecessor is not None:
             predecessor: Collection = collection_map.get(r.Collection.version_predecessor)
             if predecessor:
-                extra_links.append(_collection_link(predecessor, rel="predecessor-version", qs=assets_kwargs))
+                version_links.append(_collection_link(predecessor, rel="predecessor-version"))
 
         meta = r.Collection.metadata_
         deprecated = successor is not None or bool(meta and meta.get("deprecated", False))
@@ -396,7 +978,7 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             "providers": providers,
             "summaries": r.Collection.summaries,
             "item_assets": r.Collection.item_assets,
-            "properties": r.Collection.properties or {},
+            "properties": dict(r.Collection.properties or {}),
             "bdc:type": r.Collection.collection_type,
             "bdc:public": r.Collection.is_public,
         }
@@ -409,7 +991,7 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             collection["bdc:composite_function"] = r.composite_function
 
         collection["license"] = collection["properties"].pop("license", "")
-        extra_links.extend(collection["properties"].pop("links", []))
+        extra_links = collection["properties"].pop("links", [])
 
         bbox = to_shape(r.Collection.spatial_extent).bounds if r.Collection.spatial_extent else [None] * 4
 
@@ -438,7 +1020,7 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             collection["bdc:metadata"] = meta
 
         if r.Collection.collection_type == "cube":
-            proj4text = get_collection_crs(r.Collection)
+            proj4text = get_collection_crs(r.Collection.id)
 
             datacube = {
                 "x": dict(type="spatial", axis="x", extent=[bbox[0], bbox[2]], reference_system=proj4text),
@@ -453,36 +1035,35 @@ def get_collections(collection_id=None, roles=None, assets_kwargs=None):
             collection["bdc:temporal_composition"] = r.Collection.temporal_composition_schema
             collection["stac_extensions"].extend(get_stac_extensions("datacube"))
 
-        collection["links"] = [
+        links = [
             {
-                "href": f"{resolve_stac_url()}/collections/{r.Collection.identifier}{assets_kwargs}",
+                "href": f"/collections/{r.Collection.identifier}",
                 "rel": "self",
                 "type": "application/json",
                 "title": "Link to this document",
             },
             {
-                "href": f"{resolve_stac_url()}/collections/{r.Collection.identifier}/items{assets_kwargs}",
+                "href": f"/collections/{r.Collection.identifier}/items",
                 "rel": "items",
                 "type": "application/json",
                 "title": f"Items of the collection {r.Collection.identifier}",
             },
             {
-                "href": f"{resolve_stac_url()}/collections{assets_kwargs}",
+                "href": "/collections",
                 "rel": "parent",
                 "type": "application/json",
                 "title": "Link to catalog collections",
             },
             {
-                "href": f"{resolve_stac_url()}/{assets_kwargs}",
+                "href": "/",
                 "rel": "root",
                 "type": "application/json",
                 "title": "API landing page (root catalog)",
             },
-            # Add extra links like license etc.
-            *extra_links,
+            *version_links,
         ]
 
-        collections.append(collection)
+        collections.append((collection, links, extra_links))
 
     return collections
 
@@ -496,97 +1077,261 @@ def get_catalog(roles=None):
     if not roles:
         roles = []
 
-    q = session.query(
-        Collection.id,
-        func.concat(Collection.name, "-", Collection.version).label("name"),
-        Collection.title,
-    ).filter(Collection.is_available.is_(True), _add_roles_constraint(roles))
-    return q.all()
+    # The catalog is cached by role set, since the landing page is requested very often (e.g. health checks)
+    key = roles_key(roles)
+    catalog = _catalog_cache.get(key)
+    if catalog is None:
+        q = session.query(
+            Collection.id,
+            func.concat(Collection.name, "-", Collection.version).label("name"),
+            Collection.title,
+        ).filter(Collection.is_available.is_(True), _add_roles_constraint(roles))
+        catalog = q.all()
+        _catalog_cache.set(key, catalog)
 
+    return catalog
 
-def make_geojson(items, assets_kwargs="", exclude=None):
+
+def make_geojson(items, assets_kwargs="", exclude=None, processors=None):
     """Generate a list of STAC Items from a list of collection items.
 
     param items: collection items to be formated as GeoJSON Features
     type items: list
     param extension: The STAC extension for Item Context (sar/eo/label).
     type extension: str
+    param processors: The processors of the items, when already retrieved. See :func:`get_items_processors`.
+    type processors: dict
     return: GeoJSON Features.
     rtype: list
     """
     features = list()
     exclude = exclude or []
 
+    # Retrieve the processors of the whole page at once instead of one query per item.
+    items_processors = processors if processors is not None else get_items_processors([i.id for i in items])
+    stac_url = resolve_stac_url()
+
     for i in items:
-        geom = i.footprint or i.bbox
-        geom = shapely.geometry.mapping(to_shape(geom))
-        feature = {
-            "type": "Feature",
-            "id": i.item,
-            "collection": i.collection,
-            "stac_version": BDC_STAC_API_VERSION,
-            "stac_extensions": get_stac_extensions(i.category),
-            "geometry": geom,
-            "links": [
-                {
-                    "href": f"{resolve_stac_url()}/collections/{i.collection}/items/{i.item}{assets_kwargs}",
-                    "rel": "self",
-                },
-                {"href": f"{resolve_stac_url()}/collections/{i.collection}{assets_kwargs}", "rel": "parent"},
-                {"href": f"{resolve_stac_url()}/collections/{i.collection}{assets_kwargs}", "rel": "collection"},
-                {"href": f"{resolve_stac_url()}/", "rel": "root"},
-            ],
-        }
+        file_root = _resolve_item_file_root(i)()
+        feature = _make_feature(
+            i,
+            items_processors.get(i.id, {}),
+            stac_url=stac_url,
+            assets_kwargs=assets_kwargs,
+            asset_href=lambda href: urljoin(file_root, href),
+        )
 
-        # Processors
-        processors = get_item_processors(i.id)
-        if processors:
-            feature["stac_extensions"].extend(get_stac_extensions("processing"))
+        for key in exclude:
+            feature.pop(key, None)
 
-        _item_url_resolver = _resolve_item_file_root(i)
+        features.append(feature)
+    return features
 
-        bbox = list()
-        if i.bbox:
-            bbox = to_shape(i.bbox).bounds
-        feature["bbox"] = bbox
 
-        properties = {
-            "datetime": i.start.strftime(DATETIME_RFC339),
-            "start_datetime": i.start.strftime(DATETIME_RFC339),
-            "end_datetime": i.end.strftime(DATETIME_RFC339),
-            "created": i.created.strftime(DATETIME_RFC339),
-            "updated": i.updated.strftime(DATETIME_RFC339),
-        }
-        properties.update(i.item_meta or {})
-        properties.update(processors)
+def make_geojson_fragments(items, assets_kwargs="", processors=None) -> List[str]:
+    """Generate the serialized STAC Items (JSON strings) from a list of collection items.
+
+    The items are serialized once and kept in the ``items`` cache as JSON templates, where
+    the request dependent values (STAC URL, file root and query string) are placeholders.
+    Serving a cached item only replaces the placeholders, without building or serializing it again.
+    The cache is keyed by ``Item.id`` and ``Item.updated``, so an updated item is rendered again.
+
+    .. note::
 
-        bands = {}
-        if i.tile:
-            properties["bdc:tiles"] = [i.tile]
+        Items whose asset ``href`` are relative paths (``a/b.tif``) are not cached and
+        they are serialized with :func:`make_geojson`.
 
-        if i.category == "eo":
-            properties["eo:cloud_cover"] = i.cloud_cover
-            bands = get_collection_eo(i.collection_id)
+    :param items: collection items to be formatted as GeoJSON Features
+    :param assets_kwargs: The query string appended to the item links and asset href.
+    :param processors: The processors of the items, when already retrieved. See :func:`get_items_processors`.
+    :return: The GeoJSON Features serialized as JSON.
+    """
+    dumps = current_app.json.dumps
+    stac_url = resolve_stac_url()
+    values = {
+        _FRAGMENT_STAC_URL: _json_escape(stac_url),
+        _FRAGMENT_QUERY_STRING: _json_escape(assets_kwargs),
+        _FRAGMENT_FILE_ORIGIN: _json_escape(urljoin(resolve_base_file_root_url(), "/")[:-1]),
+    }
 
-        if i.assets:
-            for key, value in i.assets.items():
-                value["href"] = urljoin(_item_url_resolver(), value["href"] + assets_kwargs)
+    fragments = [_item_fragments_cache.get(_item_fragment_key(i)) for i in items]
+    missing = [i for i, fragment in zip(items, fragments) if fragment is None]
+    if not missing:
+        return [_render_fragment(fragment, values) for fragment in fragments]
+
+    items_processors = processors if processors is not None else get_items_processors([i.id for i in missing])
+    features = []
+    for i, fragment in zip(items, fragments):
+        if fragment is None:
+            processors = items_processors.get(i.id, {})
+            fragment = _build_item_fragment(i, processors, dumps)
+            if fragment is None:
+                file_root = _resolve_item_file_root(i)()
+                feature = _make_feature(
+                    i, processors, stac_url, assets_kwargs, asset_href=lambda href: urljoin(file_root, href)
+                )
+                features.append(dumps(feature))
+                continue
+
+            _item_fragments_cache.set(_item_fragment_key(i), fragment)
+
+        features.append(_render_fragment(fragment, values))
+    return features
 
-                if i.category == "eo":
-                    for band in bands["eo:bands"]:
-                        if band["name"] == key:
-                            value["eo:bands"] = [band]
-            feature["assets"] = i.assets
 
-        feature["properties"] = properties
-        if feature["properties"].get("storage:platform"):
-            feature["stac_extensions"].extend(get_stac_extensions("storage"))
+def item_fragments_enabled() -> bool:
+    """Check if the serialized items are cached. See ``BDC_STAC_ITEM_CACHE_SIZE``."""
+    return _item_fragments_cache.enabled
 
-        for key in exclude:
-            feature.pop(key, None)
 
-        features.append(feature)
-    return features
+_FRAGMENT_STAC_URL = "@@bdc-stac:stac-url@@"
+_FRAGMENT_QUERY_STRING = "@@bdc-stac:query-string@@"
+_FRAGMENT_FILE_ORIGIN = "@@bdc-stac:file-origin@@"
+_FRAGMENT_GEOMETRY = "@@bdc-stac:geometry@@"
+
+
+def _item_fragment_key(row):
+    """Build the cache key of an item row. The key depends on the columns retrieved and the geometry level."""
+    return row.id, row.updated, hasattr(row, "assets"), hasattr(row, "geometry"), getattr(row, "geometry_level", None)
+
+
+def _build_item_fragment(row, processors: dict, dumps) -> Optional[str]:
+    """Serialize an item row as a JSON template, replacing the request values with placeholders.
+
+    :return: The JSON template or ``None`` when the item assets can not be templated.
+    """
+    storage = _is_storage_item(row)
+    assets = getattr(row, "assets", None) or {}
+    if not storage and any(not _is_templatable_href(value["href"]) for value in assets.values()):
+        return None
+
+    def _asset_href(href):
+        if storage or urlsplit(href).scheme:
+            return href
+        return f"{_FRAGMENT_FILE_ORIGIN}{href}"
+
+    geometry = getattr(row, "geometry", None)
+    feature = _make_feature(
+        row,
+        processors,
+        stac_url=_FRAGMENT_STAC_URL,
+        assets_kwargs=_FRAGMENT_QUERY_STRING,
+        asset_href=_asset_href,
+        geometry=None if geometry is None else _FRAGMENT_GEOMETRY,
+    )
+    fragment = dumps(feature)
+    if geometry is not None:
+        # The geometry serialized by PostGIS is spliced verbatim
+        fragment = fragment.replace(f'"{_FRAGMENT_GEOMETRY}"', geometry, 1)
+    return fragment
+
+
+def _is_templatable_href(href: str) -> bool:
+    """Check if an asset href can be resolved without the file root path (absolute URL or path)."""
+    return bool(urlsplit(href).scheme) or (href.startswith("/") and not href.startswith("//"))
+
+
+def _render_fragment(fragment: str, values: Dict[str, str]) -> str:
+    """Replace the placeholders of an item template by the request values."""
+    for placeholder, value in values.items():
+        fragment = fragment.replace(placeholder, value)
+    return fragment
+
+
+def _json_escape(value: str) -> str:
+    """Escape a string to be placed inside a JSON string."""
+    return json.dumps(value)[1:-1]
+
+
+def _make_feature(row, processors: dict, stac_url: str, assets_kwargs: str, asset_href, geometry=None) -> dict:
+    """Build the GeoJSON Feature of an item row.
+
+    :param row: The item row retrieved by :func:`get_collection_items`.
+    :param processors: The processing extension properties of the item.
+    :param stac_url: The STAC URL prefix of the item links.
+    :param assets_kwargs: The query string appended to the item links and asset href.
+    :param asset_href: Function to resolve the asset href.
+    :param geometry: Value to use as feature geometry instead of the item geometry.
+    """
+    geom, bbox = _item_geometry(row, serialize=geometry is None)
+    feature = {
+        "type": "Feature",
+        "id": row.item,
+        "collection": row.collection,
+        "stac_version": BDC_STAC_API_VERSION,
+        "stac_extensions": get_stac_extensions(row.category),
+        "geometry": geom if geometry is None else geometry,
+        "links": [
+            {
+                "href": f"{stac_url}/collections/{row.collection}/items/{row.item}{assets_kwargs}",
+                "rel": "self",
+            },
+            {"href": f"{stac_url}/collections/{row.collection}{assets_kwargs}", "rel": "parent"},
+            {"href": f"{stac_url}/collections/{row.collection}{assets_kwargs}", "rel": "collection"},
+            {"href": f"{stac_url}/", "rel": "root"},
+        ],
+    }
+
+    # Processors
+    if processors:
+        feature["stac_extensions"].extend(get_stac_extensions("processing"))
+
+    feature["bbox"] = bbox
+
+    properties = {
+        "datetime": row.start.strftime(DATETIME_RFC339),
+        "start_datetime": row.start.strftime(DATETIME_RFC339),
+        "end_datetime": row.end.strftime(DATETIME_RFC339),
+        "created": row.created.strftime(DATETIME_RFC339),
+        "updated": row.updated.strftime(DATETIME_RFC339),
+    }
+    properties.update(row.item_meta or {})
+    properties.update(processors)
+
+    bands_index = {}
+    if row.tile:
+        properties["bdc:tiles"] = [row.tile]
+
+    if row.category == "eo":
+        properties["eo:cloud_cover"] = row.cloud_cover
+        bands_index = get_collection_bands_index(row.collection_id)
+
+    # The assets are not retrieved when excluded from response (fields=-assets)
+    assets = getattr(row, "assets", None)
+    if assets:
+        assets = {key: dict(value) for key, value in assets.items()}
+        for key, value in assets.items():
+            value["href"] = asset_href(value["href"] + assets_kwargs)
+
+            eo_bands = bands_index.get(key)
+            if eo_bands is not None:
+                value["eo:bands"] = eo_bands
+        feature["assets"] = assets
+
+    feature["properties"] = properties
+    if feature["properties"].get("storage:platform"):
+        feature["stac_extensions"].extend(get_stac_extensions("storage"))
+
+    return feature
+
+
+def _item_geometry(row, serialize=True):
+    """Retrieve the GeoJSON geometry and the bounding box of an item row.
+
+    When the row was retrieved with ``BDC_STAC_GEOMETRY_FROM_DB``, the geometry is
+    already serialized by PostGIS and the bounds are computed in database.
+    Use ``serialize=False`` to skip the geometry (``None``) and only retrieve the bounds.
+    """
+    geometry = getattr(row, "geometry", None)
+    if geometry is not None:
+        bbox = list(row.bbox_bounds) if row.bbox_bounds and row.bbox_bounds[0] is not None else []
+        return json.loads(geometry) if serialize else None, bbox
+
+    geom = shapely.geometry.mapping(to_shape(row.footprint or row.bbox))
+    bbox = list()
+    if row.bbox:
+        bbox = to_shape(row.bbox).bounds
+    return geom, bbox
 
 
 def get_item_processors(item_id: int) -> dict:
@@ -595,7 +1340,47 @@ def get_item_processors(item_id: int) -> dict:
     Note:
          Follows the STAC Extension `processing <https://github.com/stac-extensions/processing>`_.
     """
-    processors = ItemsProcessors.get_processors(item_id)
+    return _format_processors(ItemsProcessors.get_processors(item_id))
+
+
+def get_items_processors(item_ids: Iterable[int]) -> Dict[int, dict]:
+    """List the Processors used to compose the given Items in a single query.
+
+    This is the bulk version of :func:`get_item_processors`, which is used to
+    build a page of items without issuing one query per item.
+
+    :param item_ids: The item identifiers (``Item.id``)
+    :type item_ids: Iterable[int]
+    :return: Map of item id and the processing extension properties. Items without processors are omitted.
+    :rtype: Dict[int, dict]
+    """
+    item_ids = list(item_ids)
+    if not item_ids:
+        return {}
+
+    rows = (
+        session.query(ItemsProcessors.item_id, Processor)
+        .filter(ItemsProcessors.processor_id == Processor.id, ItemsProcessors.item_id.in_(item_ids))
+        .all()
+    )
+
+    return group_items_processors(rows)
+
+
+def group_items_processors(rows) -> Dict[int, dict]:
+    """Build the processing extension properties of each item from the rows ``(item_id, Processor)``.
+
+    :return: Map of item id and the processing extension properties. Items without processors are omitted.
+    """
+    processors_map = {}
+    for row in rows:
+        processors_map.setdefault(row.item_id, []).append(row.Processor)
+
+    return {item_id: _format_processors(processors) for item_id, processors in processors_map.items()}
+
+
+def _format_processors(processors: List[Processor]) -> dict:
+    """Format the given processors as STAC Extension `processing` properties."""
     proc_root = None
     processors_obj = {}
     for proc in processors:
@@ -628,47 +1413,64 @@ def create_query_filter(query):
 
     .. note::
 
-        Queryable properties must be mapped in these functions.
+        The typed properties are registered in :mod:`bdc_stac.queryables`.
+        The other properties are compared as text.
 
     .. tip::
 
-        You may face limitation when filtering for any non-indexed property.
+        Create the indexes of the registered properties with ``bdc-stac create-indexes``.
         See `PostgreSQL Indexes <https://www.postgresql.org/docs/current/indexes.html>`_
-        to improve any property you need.
-    """
-    mapping = {
-        "eq": "__eq__",
-        "neq": "__ne__",
-        "lt": "__lt__",
-        "lte": "__le__",
-        "gt": "__gt__",
-        "gte": "__ge__",
-        "startsWith": "startswith",
-        "endsWith": "endswith",
-        "contains": "contains",
-        "in": "in_",
-    }
-
-    bdc_properties = {
-        "bdc:tile": Tile.name,
-        "bdc:tiles": Tile.name,  # Legacy: for compatibility
-        "eo:cloud_cover": Item.cloud_cover,
-    }
+        to improve any other property you need.
 
+    :raises ValueError: When an operator or a value is not valid for the property.
+    """
     filters = []
 
-    for column, _filters in query.items():
+    for name, _filters in query.items():
+        queryable = get_queryable(name)
         for op, value in _filters.items():
-            if bdc_properties.get(column):
-                f = getattr(bdc_properties[column], mapping[op])(value)
-            # TODO: Remove the hard-code for comparison on JSON fields (Only text comparisons)
-            else:
-                f = getattr(Item.metadata_[column].astext, mapping[op])(value)
-            filters.append(f)
+            filters.append(queryable.compile(op, value))
 
     return filters
 
 
+def _geometry_options(simplify=None, precision=None) -> Tuple[float, Optional[int]]:
+    """Parse the geometry simplification parameters, using the server defaults when not given.
+
+    The request is aborted with ``400`` when the parameters are not valid.
+
+    :return: The simplification tolerance (``0`` to disable) and the number of decimal digits
+        (``None`` for the full precision).
+    """
+    try:
+        simplify = float(BDC_STAC_GEOMETRY_SIMPLIFY if simplify in (None, "") else simplify)
+        precision = int(BDC_STAC_GEOMETRY_PRECISION if precision in (None, "") else precision)
+    except (TypeError, ValueError):
+        abort(400, "Invalid geometry parameters. Use a number for simplify and an integer for precision.")
+
+    if not 0 <= simplify < 1 or not -1 <= precision <= 15:
+        abort(
+            400,
+            "Invalid geometry parameters. Use 0 <= simplify < 1 and -1 <= precision <= 15 (-1 for the full precision).",
+        )
+
+    return simplify, (precision if precision >= 0 else None)
+
+
+def _create_cql2_filter(expression, lang, crs, geometry) -> list:
+    """Compile the CQL2 filter of the STAC API Filter extension.
+
+    The request is aborted with ``400`` when the filter is not valid.
+    """
+    if crs is not None and crs != "http://www.opengis.net/def/crs/OGC/1.3/CRS84":
+        abort(400, f"Invalid filter-crs {crs}. Only http://www.opengis.net/def/crs/OGC/1.3/CRS84 is supported.")
+
+    try:
+        return compile_filter(parse_filter(expression, lang), geometry=geometry)
+    except ValueError as e:
+        abort(400, str(e))
+
+
 def parse_fields_parameter(fields: Optional[str] = None):
     """Parse the string parameter `fields` to include/exclude certain fields in response.
 
@@ -732,14 +1534,20 @@ def resolve_stac_url() -> str:
 def _resolve_item_file_root(ctx):
     _fn = resolve_base_file_root_url
 
+    if _is_storage_item(ctx):
+        # Return Empty string since the asset[href] must be absolute
+        # s3://<bucket>/.../file.tif
+        _fn = lambda: ""
+    return _fn
+
+
+def _is_storage_item(ctx) -> bool:
+    """Check if the item uses the storage extension, which means the asset href are absolute."""
     if ctx.item_meta is not None:
         for prop in ctx.item_meta.keys():
             if prop.startswith("storage:"):
-                # Return Empty string since the asset[href] must be absolute
-                # s3://<bucket>/.../file.tif
-                _fn = lambda: ""
-                break
-    return _fn
+                return True
+    return False
 
 
 def _add_roles_constraint(roles: List[str]):
@@ -766,11 +1574,22 @@ def _add_roles_constraint(roles: List[str]):
     return or_(Collection.is_public.is_(True), *where)
 
 
-def _collection_link(collection: Collection, rel: str, qs: str):
-    """Build STAC collection link for predecessor and successor."""
+def _collection_link(collection: Collection, rel: str):
+    """Build STAC collection link for predecessor and successor.
+
+    The link ``href`` is relative to the STAC URL. See :func:`_render_collection`.
+    """
     return {
-        "href": f"{resolve_stac_url()}/collections/{collection.identifier}{qs}",
+        "href": f"/collections/{collection.identifier}",
         "rel": rel,
         "type": "application/json",
         "title": collection.title,
     }
+
+
+def roles_key(roles: Optional[List[str]]) -> tuple:
+    """Build a hashable key for the collections visible by the given roles. See :func:`_add_roles_constraint`."""
+    roles = roles or []
+    if "*" in roles:
+        return ("*",)
+    return tuple(sorted(set(roles)))
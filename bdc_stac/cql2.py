@@ -0,0 +1,579 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Support of the STAC API Filter extension with `CQL2 <https://docs.ogc.org/DRAFTS/21-065.html>`_.
+
+The filters are given in CQL2-JSON or CQL2-text (``filter-lang``). The CQL2-text is
+parsed with :func:`parse_text` into the CQL2-JSON tree, which is compiled to
+SQLAlchemy expressions with :func:`compile_filter`.
+
+The supported operators are:
+
+- Logical: ``and``, ``or`` and ``not``.
+- Comparison: ``=``, ``<>``, ``<``, ``<=``, ``>``, ``>=``, ``like``, ``between``, ``in`` and ``isNull``.
+- Spatial: ``s_intersects``, ``s_within``, ``s_contains`` and ``s_disjoint``.
+- Temporal: ``t_intersects``, ``t_before`` and ``t_after``.
+
+The properties ``id``, ``collection``, ``datetime``, ``start_datetime``, ``end_datetime``,
+``created``, ``updated`` and ``geometry`` refer to the item columns. The other properties
+are resolved with the queryables of :mod:`bdc_stac.queryables`.
+
+The conjuncts of the filter (``and``) are ordered so the ones resolved by indexes come
+first, e.g. ``collection``, ``datetime``, ``geometry`` and the equality of typed properties.
+
+.. versionadded:: 1.1
+"""
+import json
+import math
+import re
+from datetime import datetime, timezone
+from typing import Any, List, Tuple
+
+import shapely.geometry
+import shapely.wkt
+from bdc_catalog.models import Collection, Item
+from sqlalchemy import and_, false, func, not_, or_, true
+
+from .queryables import OPERATORS, get_queryable
+
+FILTER_LANGS = ("cql2-json", "cql2-text")
+"""The supported values of the parameter ``filter-lang``."""
+
+CONFORMANCE_CLASSES = [
+    "http://www.opengis.net/spec/ogcapi-features-3/1.0/conf/filter",
+    "http://www.opengis.net/spec/ogcapi-features-3/1.0/conf/features-filter",
+    "http://www.opengis.net/spec/cql2/1.0/conf/cql2-text",
+    "http://www.opengis.net/spec/cql2/1.0/conf/cql2-json",
+    "http://www.opengis.net/spec/cql2/1.0/conf/basic-cql2",
+    "http://www.opengis.net/spec/cql2/1.0/conf/basic-spatial-operators",
+    "http://www.opengis.net/spec/cql2/1.0/conf/spatial-operators",
+    "http://www.opengis.net/spec/cql2/1.0/conf/temporal-operators",
+]
+"""The conformance classes of the Filter extension supported by BDC-STAC."""
+
+_COMPARISONS = {"=": "eq", "<>": "neq", "<": "lt", "<=": "lte", ">": "gt", ">=": "gte"}
+_REVERSED = {"=": "=", "<>": "<>", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_SPATIAL = {
+    "s_intersects": func.ST_Intersects,
+    "s_within": func.ST_Within,
+    "s_contains": func.ST_Contains,
+    "s_disjoint": func.ST_Disjoint,
+}
+_TEMPORAL = ("t_intersects", "t_before", "t_after")
+_DATETIME = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:[Tt ](\d{2}:\d{2}:\d{2})(?:\.(\d+))?([Zz]|[+-]\d{2}:\d{2})?)?$")
+_WKT_TYPES = (
+    "POINT",
+    "LINESTRING",
+    "POLYGON",
+    "MULTIPOINT",
+    "MULTILINESTRING",
+    "MULTIPOLYGON",
+    "GEOMETRYCOLLECTION",
+)
+_TOKEN = re.compile(
+    r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+    |(?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+    |(?P<quoted>"[^"]+")
+    |(?P<name>[A-Za-z_][A-Za-z0-9_:.]*)
+    |(?P<op><>|<=|>=|[=<>(),])
+    )""",
+    re.VERBOSE,
+)
+
+
+class CQL2Error(ValueError):
+    """Error raised for an invalid CQL2 filter."""
+
+
+def parse_filter(expression: Any, lang: str = None) -> dict:
+    """Parse a filter of the STAC API Filter extension into CQL2-JSON.
+
+    :param expression: The filter. A string is parsed as CQL2-text, unless ``lang`` is ``cql2-json``.
+    :param lang: The filter language (``filter-lang``). See :data:`FILTER_LANGS`.
+    :raises CQL2Error: When the filter is not valid.
+    """
+    if lang is not None and lang not in FILTER_LANGS:
+        raise CQL2Error(f"Invalid filter-lang {lang}. Use one of {', '.join(FILTER_LANGS)}.")
+
+    if isinstance(expression, str):
+        if lang == "cql2-json":
+            try:
+                return json.loads(expression)
+            except ValueError as e:
+                raise CQL2Error(f"Invalid CQL2-JSON filter: {e}")
+        return parse_text(expression)
+
+    if lang == "cql2-text" or not isinstance(expression, dict):
+        raise CQL2Error("Invalid filter: CQL2-text filters must be strings and CQL2-JSON filters must be objects.")
+
+    return expression
+
+
+def parse_text(text: str) -> dict:
+    """Parse a CQL2-text filter into CQL2-JSON.
+
+    Example:
+        >>> parse_text("collection = 'S2-16D-2' AND eo:cloud_cover <= 10")
+        {'op': 'and', 'args': [{'op': '=', 'args': [{'property': 'collection'}, 'S2-16D-2']}, \
+{'op': '<=', 'args': [{'property': 'eo:cloud_cover'}, 10]}]}
+
+    :raises CQL2Error: When the filter is not valid.
+    """
+    return _TextParser(text).parse()
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse a RFC 3339 date-time or full-date. The values without time zone are in UTC.
+
+    The temporal values are bound as :class:`datetime.datetime`, since some drivers (e.g. ``asyncpg``)
+    do not accept strings for timestamp parameters.
+
+    Example:
+        >>> parse_datetime("2021-01-01T10:30:00Z")
+        datetime.datetime(2021, 1, 1, 10, 30, tzinfo=datetime.timezone.utc)
+
+    :raises CQL2Error: When the value is not valid.
+    """
+    match = _DATETIME.match(str(value).strip())
+    if match is None:
+        raise CQL2Error(f"Invalid datetime {value}.")
+
+    # Python < 3.11 only parses 3 or 6 fractional digits: use microseconds
+    date, time, fraction, offset = match.groups()
+    if time is not None:
+        offset = "+00:00" if offset in ("Z", "z") else offset or ""
+        date = f"{date}T{time}.{(fraction or '').ljust(6, '0')[:6]}{offset}"
+    try:
+        parsed = datetime.fromisoformat(date)
+    except ValueError:
+        raise CQL2Error(f"Invalid datetime {value}.")
+
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def compile_filter(expression: dict, geometry=Item.bbox) -> List:
+    """Compile a CQL2-JSON filter into SQLAlchemy expressions for the item search.
+
+    :param expression: The CQL2-JSON filter.
+    :param geometry: The item column used by the spatial operators.
+    :return: The conjuncts of the filter, ordered to apply the ones resolved by indexes first.
+    :raises CQL2Error: When the filter is not valid.
+    """
+    compiled = _Compiler(geometry).compile(expression)
+    conjuncts = compiled if isinstance(compiled, list) else [compiled]
+
+    return [clause for clause, _ in sorted(_flatten(conjuncts), key=lambda conjunct: not conjunct[1])]
+
+
+def _flatten(conjuncts):
+    for clause in conjuncts:
+        if isinstance(clause, list):
+            yield from _flatten(clause)
+        else:
+            yield clause
+
+
+class _TextParser:
+    """Recursive descent parser of CQL2-text."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.position = 0
+
+    def _tokenize(self, text: str) -> List[Tuple[str, Any]]:
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise CQL2Error(f"Invalid CQL2-text filter at position {position}: {text[position:position + 20]}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            position = match.end()
+
+            if kind == "name" and value.upper() in _WKT_TYPES:
+                # Read the geometry literal as WKT, up to the closing parenthesis
+                end = self._closing(text, position)
+                try:
+                    geometry = shapely.wkt.loads(text[match.start(kind) : end])
+                except Exception as e:  # The WKT errors differ between the shapely versions
+                    raise CQL2Error(f"Invalid geometry {text[match.start(kind):end]}: {e}")
+                tokens.append(("literal", shapely.geometry.mapping(geometry)))
+                position = end
+            elif kind == "string":
+                tokens.append(("literal", value[1:-1].replace("''", "'")))
+            elif kind == "number":
+                tokens.append(("literal", float(value) if re.search(r"[.eE]", value) else int(value)))
+            elif kind == "quoted":
+                tokens.append(("name", value[1:-1]))
+            else:
+                tokens.append((kind, value))
+        return tokens
+
+    @staticmethod
+    def _closing(text: str, position: int) -> int:
+        depth = 0
+        for index in range(position, len(text)):
+            if text[index] == "(":
+                depth += 1
+            elif text[index] == ")":
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+        raise CQL2Error("Invalid CQL2-text filter: missing ')' in geometry.")
+
+    def parse(self) -> dict:
+        if not self.tokens:
+            raise CQL2Error("Invalid CQL2-text filter: empty filter.")
+
+        node = self._or()
+        if self.position < len(self.tokens):
+            raise CQL2Error(f"Invalid CQL2-text filter: unexpected {self.tokens[self.position][1]}.")
+        return node
+
+    def _peek(self, offset: int = 0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def _keyword(self, *keywords: str) -> bool:
+        kind, value = self._peek()
+        if kind == "name" and value.upper() in keywords:
+            self.position += 1
+            return True
+        return False
+
+    def _symbol(self, symbol: str) -> bool:
+        if self._peek() == ("op", symbol):
+            self.position += 1
+            return True
+        return False
+
+    def _expect(self, symbol: str):
+        if not self._symbol(symbol):
+            raise CQL2Error(f"Invalid CQL2-text filter: expected '{symbol}'.")
+
+    def _or(self) -> dict:
+        args = [self._and()]
+        while self._keyword("OR"):
+            args.append(self._and())
+        return args[0] if len(args) == 1 else dict(op="or", args=args)
+
+    def _and(self) -> dict:
+        args = [self._not()]
+        while self._keyword("AND"):
+            args.append(self._not())
+        return args[0] if len(args) == 1 else dict(op="and", args=args)
+
+    def _not(self) -> dict:
+        if self._keyword("NOT"):
+            return dict(op="not", args=[self._not()])
+        return self._predicate()
+
+    def _predicate(self) -> dict:
+        kind, value = self._peek()
+        if (kind, value) == ("op", "("):
+            self.position += 1
+            node = self._or()
+            self._expect(")")
+            return node
+
+        if kind == "name" and self._peek(1) == ("op", "(") and value.lower() in (*_SPATIAL, *_TEMPORAL):
+            self.position += 2
+            args = [self._scalar()]
+            self._expect(",")
+            args.append(self._scalar())
+            self._expect(")")
+            return dict(op=value.lower(), args=args)
+
+        left = self._scalar()
+        if isinstance(left, bool):
+            return left
+
+        negate = self._keyword("NOT")
+        if self._keyword("LIKE"):
+            node = dict(op="like", args=[left, self._scalar()])
+        elif self._keyword("BETWEEN"):
+            low = self._scalar()
+            if not self._keyword("AND"):
+                raise CQL2Error("Invalid CQL2-text filter: expected AND in BETWEEN.")
+            node = dict(op="between", args=[left, low, self._scalar()])
+        elif self._keyword("IN"):
+            self._expect("(")
+            values = [self._scalar()]
+            while self._symbol(","):
+                values.append(self._scalar())
+            self._expect(")")
+            node = dict(op="in", args=[left, values])
+        elif not negate and self._keyword("IS"):
+            negate = self._keyword("NOT")
+            if not self._keyword("NULL"):
+                raise CQL2Error("Invalid CQL2-text filter: expected NULL.")
+            node = dict(op="isNull", args=[left])
+        elif not negate and self._peek()[0] == "op" and self._peek()[1] in _COMPARISONS:
+            op = self._peek()[1]
+            self.position += 1
+            node = dict(op=op, args=[left, self._scalar()])
+        else:
+            raise CQL2Error(f"Invalid CQL2-text filter: expected an operator after {left}.")
+
+        return dict(op="not", args=[node]) if negate else node
+
+    def _scalar(self) -> Any:
+        kind, value = self._peek()
+        if kind is None:
+            raise CQL2Error("Invalid CQL2-text filter: unexpected end of filter.")
+        self.position += 1
+
+        if kind == "literal":
+            return value
+
+        if kind == "name":
+            keyword = value.upper()
+            if keyword in ("TRUE", "FALSE"):
+                return keyword == "TRUE"
+
+            if keyword in ("TIMESTAMP", "DATE", "INTERVAL", "BBOX") and self._symbol("("):
+                args = [self._scalar()]
+                while self._symbol(","):
+                    args.append(self._scalar())
+                self._expect(")")
+                if keyword == "INTERVAL":
+                    return dict(interval=args)
+                if keyword == "BBOX":
+                    return dict(bbox=args)
+                return {keyword.lower(): args[0]}
+
+            return dict(property=value)
+
+        raise CQL2Error(f"Invalid CQL2-text filter: unexpected {value}.")
+
+
+class _Compiler:
+    """Compile CQL2-JSON nodes into SQLAlchemy expressions.
+
+    Each node is compiled into a tuple ``(clause, indexed)``, where ``indexed`` flags
+    the clauses which may be resolved by an index.
+    """
+
+    def __init__(self, geometry):
+        self.columns = {
+            "id": Item.name,
+            "collection": Collection.identifier,
+            "datetime": Item.start_date,
+            "start_datetime": Item.start_date,
+            "end_datetime": Item.end_date,
+            "created": Item.created,
+            "updated": Item.updated,
+        }
+        self.geometry = geometry
+
+    def compile(self, node):
+        if isinstance(node, bool):
+            return (true() if node else false()), True
+
+        if not isinstance(node, dict) or "op" not in node or not isinstance(node.get("args"), list):
+            raise CQL2Error(f"Invalid CQL2 expression {node}.")
+
+        op, args = node["op"], node["args"]
+        if op in ("and", "or"):
+            if not args:
+                raise CQL2Error(f"Invalid CQL2 expression {node}: operator '{op}' requires arguments.")
+            compiled = [self.compile(arg) for arg in args]
+            if op == "and":
+                return compiled
+            return or_(*(self._clause(arg) for arg in compiled)), all(self._indexed(arg) for arg in compiled)
+
+        if op == "not":
+            self._arity(node, 1)
+            return not_(self._clause(self.compile(args[0]))), False
+
+        if op in _COMPARISONS:
+            self._arity(node, 2)
+            left, right = args
+            if not self._is_property(left) and self._is_property(right):
+                left, right, op = right, left, _REVERSED[op]
+            return self._compare(self._property(left), _COMPARISONS[op], self._value(right))
+
+        if op == "like":
+            self._arity(node, 2)
+            name = self._property(args[0])
+            if name in self.columns:
+                return self.columns[name].like(self._value(args[1])), name == "id"
+            queryable = get_queryable(name)
+            if queryable.type not in (None, "string"):
+                raise CQL2Error(f"Invalid operator like for {name} ({queryable.type}).")
+            return queryable.expression().like(self._value(args[1])), False
+
+        if op == "between":
+            self._arity(node, 3)
+            name = self._property(args[0])
+            low, indexed_low = self._compare(name, "gte", self._value(args[1]))
+            high, indexed_high = self._compare(name, "lte", self._value(args[2]))
+            return and_(low, high), indexed_low and indexed_high
+
+        if op == "in":
+            self._arity(node, 2)
+            if not isinstance(args[1], list):
+                raise CQL2Error(f"Invalid CQL2 expression {node}: operator 'in' requires a list.")
+            return self._compare(self._property(args[0]), "in", [self._value(value) for value in args[1]])
+
+        if op == "isNull":
+            self._arity(node, 1)
+            name = self._property(args[0])
+            if name in self.columns:
+                return self.columns[name].is_(None), False
+            queryable = get_queryable(name)
+            if not queryable.is_json:
+                return queryable.column.is_(None), False
+            return not_(Item.metadata_.has_key(name)), False
+
+        if op in _SPATIAL:
+            self._arity(node, 2)
+            left, right = args
+            if not self._is_property(left):
+                left, right = right, left
+                op = {"s_within": "s_contains", "s_contains": "s_within"}.get(op, op)
+            if self._property(left) != "geometry":
+                raise CQL2Error(f"Invalid CQL2 expression {node}: spatial operators require the property geometry.")
+            return _SPATIAL[op](self.geometry, self._geometry(right)), True
+
+        if op in _TEMPORAL:
+            self._arity(node, 2)
+            return self._temporal(op, *args), True
+
+        raise CQL2Error(f"Unsupported CQL2 operator {op}.")
+
+    @staticmethod
+    def _clause(compiled):
+        if isinstance(compiled, list):
+            return and_(*(clause for clause, _ in _flatten(compiled)))
+        return compiled[0]
+
+    @staticmethod
+    def _indexed(compiled) -> bool:
+        if isinstance(compiled, list):
+            return any(indexed for _, indexed in _flatten(compiled))
+        return compiled[1]
+
+    @staticmethod
+    def _arity(node: dict, count: int):
+        if len(node["args"]) != count:
+            raise CQL2Error(f"Invalid CQL2 expression {node}: operator '{node['op']}' requires {count} arguments.")
+
+    @staticmethod
+    def _is_property(node) -> bool:
+        return isinstance(node, dict) and "property" in node
+
+    def _property(self, node) -> str:
+        if not self._is_property(node):
+            raise CQL2Error(f"Invalid CQL2 expression: expected a property, got {node}.")
+        return node["property"]
+
+    @staticmethod
+    def _value(node) -> Any:
+        if isinstance(node, dict):
+            if "timestamp" in node:
+                return parse_datetime(node["timestamp"])
+            if "date" in node:
+                return parse_datetime(node["date"])
+            raise CQL2Error(f"Invalid CQL2 expression: unsupported value {node}.")
+        if isinstance(node, list):
+            raise CQL2Error(f"Invalid CQL2 expression: unexpected list {node}.")
+        return node
+
+    def _compare(self, name: str, op: str, value: Any):
+        if name in self.columns:
+            column = self.columns[name]
+            return getattr(column, OPERATORS[op])(value), True
+
+        if name == "geometry":
+            raise CQL2Error("Invalid CQL2 expression: use spatial operators with the property geometry.")
+
+        queryable = get_queryable(name)
+        clause = queryable.compile(op, value)
+        indexed = not queryable.is_json or (
+            queryable.type is not None and (op in ("eq", "in") or queryable.type in ("number", "integer"))
+        )
+        return clause, indexed
+
+    def _geometry(self, node):
+        if isinstance(node, dict) and "bbox" in node:
+            bbox = node["bbox"]
+            if not isinstance(bbox, list) or len(bbox) not in (4, 6) or not all(map(_is_number, bbox)):
+                raise CQL2Error(f"Invalid bbox {bbox}. Use a list of 4 or 6 numbers.")
+            if len(bbox) == 6:
+                bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+            return func.ST_MakeEnvelope(*bbox, 4326)
+
+        if not isinstance(node, dict) or "type" not in node:
+            raise CQL2Error(f"Invalid CQL2 expression: expected a geometry, got {node}.")
+
+        try:
+            shapely.geometry.shape(node)
+        except Exception as e:
+            raise CQL2Error(f"Invalid geometry {node}: {e}")
+        return func.ST_GeomFromGeoJSON(json.dumps(node))
+
+    def _temporal(self, op: str, left, right):
+        if not self._is_property(left):
+            left, right = right, left
+            op = {"t_before": "t_after", "t_after": "t_before"}.get(op, op)
+
+        name = self._property(left)
+        if name == "datetime":
+            start, end = Item.start_date, Item.end_date
+        elif name in self.columns and name not in ("id", "collection"):
+            start = end = self.columns[name]
+        else:
+            raise CQL2Error(f"Invalid CQL2 expression: {name} is not a temporal property.")
+
+        if isinstance(right, dict) and "interval" in right:
+            if len(right["interval"]) != 2:
+                raise CQL2Error(f"Invalid interval {right['interval']}.")
+            low, high = [None if value == ".." else _temporal_value(self._value(value)) for value in right["interval"]]
+        else:
+            low = high = _temporal_value(self._value(right))
+
+        if op == "t_before":
+            if low is None:
+                return false()
+            return end < low
+        if op == "t_after":
+            if high is None:
+                return false()
+            return start > high
+
+        # t_intersects: the property interval [start, end] overlaps [low, high]
+        clauses = []
+        if high is not None:
+            clauses.append(start <= high)
+        if low is not None:
+            clauses.append(end >= low)
+        return and_(*clauses) if clauses else true()
+
+
+def _is_number(value: Any) -> bool:
+    """Check if a JSON value is a finite number."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _temporal_value(value: Any) -> datetime:
+    """Parse the instants given as strings (e.g. in intervals) of the temporal operators."""
+    return parse_datetime(value) if isinstance(value, str) else value
@@ -0,0 +1,431 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Database engines and sessions used by BDC-STAC.
+
+The engines are created by :class:`STACSQLAlchemy`, an extension of :class:`flask_sqlalchemy.SQLAlchemy` which:
+
+- builds the engine options from ``SQLALCHEMY_ENGINE_OPTIONS`` (see :func:`engine_options`),
+  including the per-statement ``statement_timeout`` of the PostgreSQL connections;
+- allows distinct engine options for each bind of ``SQLALCHEMY_BINDS``, such as the search pool
+  (``BDC_STAC_SEARCH_POOL_SIZE``), which isolates the expensive item searches from the other endpoints;
+- measures the time waiting for a pool connection (checkout). See :func:`pool_stats` and :func:`checkout_wait`;
+- routes the reads of the sessions to the read replicas (``BDC_STAC_READ_REPLICAS``), selected by a
+  :class:`ReplicaRouter` for each session. The search pool has its own pool of each replica.
+
+.. versionadded:: 1.1
+"""
+import contextvars
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional
+
+import sqlalchemy.pool
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, _EngineConnector
+from sqlalchemy import create_engine, orm, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool, QueuePool
+
+SEARCH_BIND = "search"
+"""The bind key of the item search pool."""
+
+DEFAULT_POOL = "default"
+"""The name of the default pool in :func:`pool_stats`."""
+
+REPLICA_POLICIES = ("round-robin", "least-connections", "lag-aware")
+"""The supported values for ``BDC_STAC_READ_REPLICAS_POLICY``."""
+
+REPLICAS_EXTENSION = "bdc_stac_replicas"
+"""The key of the :class:`ReplicaRouter` in ``app.extensions``."""
+
+_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_use_lifo")
+
+_checkout_stats: Dict[str, dict] = {}
+_checkout_lock = threading.Lock()
+_pools: Dict[str, QueuePool] = {}
+_request_wait: contextvars.ContextVar = contextvars.ContextVar("bdc_stac_checkout_wait", default=None)
+
+
+def engine_options(options: dict, statement_timeout: int = 0) -> dict:
+    """Build the SQLAlchemy engine options from the configuration values.
+
+    The pool class may be given by name (e.g. ``NullPool``) and the options with ``None`` are discarded.
+    The options of the queue pool (e.g. ``pool_size``) are also discarded for the other pool classes.
+
+    Example:
+        >>> engine_options({"pool_size": 5, "poolclass": None}, statement_timeout=30000)
+        {'pool_size': 5, 'connect_args': {'options': '-c statement_timeout=30000'}}
+
+    :param options: The engine options. See ``SQLALCHEMY_ENGINE_OPTIONS``.
+    :param statement_timeout: The maximum time of each statement in milliseconds. Use ``0`` to disable.
+    :raises ValueError: When the pool class does not exist.
+    """
+    options = {key: value for key, value in options.items() if value is not None}
+
+    poolclass = options.get("poolclass")
+    if isinstance(poolclass, str):
+        options["poolclass"] = getattr(sqlalchemy.pool, poolclass, None)
+        if not isinstance(options["poolclass"], type) or not issubclass(options["poolclass"], sqlalchemy.pool.Pool):
+            raise ValueError(f"Invalid pool class {poolclass}.")
+
+    options = _pool_options(options)
+
+    if statement_timeout:
+        connect_args = dict(options.get("connect_args") or {})
+        connect_args["options"] = f"{connect_args.get('options', '')} -c statement_timeout={statement_timeout}".strip()
+        options["connect_args"] = connect_args
+
+    return options
+
+
+def _pool_options(options: dict) -> dict:
+    """Discard the options of the queue pool, which are not accepted by the other pool classes."""
+    if options.get("poolclass") is None or issubclass(options["poolclass"], QueuePool):
+        return options
+    return {key: value for key, value in options.items() if key not in _QUEUE_POOL_OPTIONS}
+
+
+class TimedQueuePool(QueuePool):
+    """Queue pool which measures the time waiting for a connection checkout.
+
+    The pool is identified by the engine option ``pool_logging_name``. See :func:`pool_stats`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Create the pool and register it for :func:`pool_stats`."""
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        _pools[self.pool_name] = self
+
+    @property
+    def pool_name(self) -> str:
+        """Retrieve the name of the pool."""
+        return getattr(self, "logging_name", None) or DEFAULT_POOL
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            _record_checkout(self.pool_name, time.perf_counter() - start)
+
+
+def _record_checkout(name: str, elapsed: float):
+    with _checkout_lock:
+        stats = _checkout_stats.setdefault(name, dict(checkouts=0, wait_total=0.0, wait_max=0.0))
+        stats["checkouts"] += 1
+        stats["wait_total"] += elapsed
+        stats["wait_max"] = max(stats["wait_max"], elapsed)
+
+    wait = _request_wait.get()
+    if wait is not None:
+        wait[0] += elapsed
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Retrieve the usage of the connection pools and the time waiting for connections, in seconds."""
+    with _checkout_lock:
+        stats = {name: dict(values) for name, values in _checkout_stats.items()}
+
+    for name, pool in _pools.items():
+        stats.setdefault(name, dict(checkouts=0, wait_total=0.0, wait_max=0.0)).update(
+            size=pool.size(), checkedout=pool.checkedout(), overflow=pool.overflow()
+        )
+    return stats
+
+
+def start_checkout_timer():
+    """Start measuring the time waiting for pool connections in the current context (request)."""
+    _request_wait.set([0.0])
+
+
+def checkout_wait() -> Optional[float]:
+    """Retrieve the time waiting for pool connections, in seconds, since :func:`start_checkout_timer`.
+
+    Only the connections retrieved in the current context are measured, e.g. the concurrent
+    count of matched items (``BDC_STAC_COUNT_WORKERS``) is not included.
+    """
+    wait = _request_wait.get()
+    return None if wait is None else wait[0]
+
+
+def replica_binds(uris: List[str], bind_key: Optional[str] = None) -> Dict[str, str]:
+    """Build the ``SQLALCHEMY_BINDS`` of the read replicas.
+
+    Example:
+        >>> replica_binds(["postgresql://replica1/bdc", "postgresql://replica2/bdc"])
+        {'replica-0': 'postgresql://replica1/bdc', 'replica-1': 'postgresql://replica2/bdc'}
+        >>> replica_binds(["postgresql://replica1/bdc"], bind_key="search")
+        {'search-replica-0': 'postgresql://replica1/bdc'}
+
+    :param uris: The database URIs of the read replicas.
+    :param bind_key: The bind key of a distinct pool of the replicas (e.g. :data:`SEARCH_BIND`), if any.
+    """
+    return {replica_bind(f"replica-{index}", bind_key): uri for index, uri in enumerate(uris)}
+
+
+def replica_bind(replica: str, bind_key: Optional[str] = None) -> str:
+    """Build the bind key of the pool ``bind_key`` of a read replica.
+
+    Example:
+        >>> replica_bind("replica-0", "search")
+        'search-replica-0'
+
+    :param replica: The bind key of the read replica. See :func:`replica_binds`.
+    :param bind_key: The bind key of the pool. Use ``None`` for the default pool of the replica.
+    """
+    return replica if bind_key is None else f"{bind_key}-{replica}"
+
+
+def probe_engine(url, connect_timeout: int = 0):
+    """Create an engine without pool to check the health of a database (see :func:`replica_lag`).
+
+    A database not reachable may block the connection for a long time. The PostgreSQL connections
+    of the probe engine give up after ``connect_timeout`` seconds. The asynchronous driver (``asyncpg``)
+    is replaced by the default driver of the database.
+
+    :param url: The database URL.
+    :param connect_timeout: The maximum time to connect, in seconds (libpq ``connect_timeout``). Use ``0`` to disable.
+    """
+    url = make_url(url)
+    if url.get_driver_name() == "asyncpg":
+        url = url.set(drivername=url.get_backend_name())
+    connect_args = {}
+    if connect_timeout and url.get_backend_name() == "postgresql":
+        connect_args["connect_timeout"] = connect_timeout
+    return create_engine(url, poolclass=NullPool, connect_args=connect_args)
+
+
+def replica_lag(engine) -> Optional[float]:
+    """Retrieve the replication lag of a database in seconds.
+
+    The lag is ``0`` for a primary database or a replica which replayed all the received changes.
+
+    :return: The lag or ``None`` when the database is not reachable.
+    """
+    try:
+        with engine.connect() as connection:
+            lag = connection.execute(_REPLICA_LAG).scalar()
+    except SQLAlchemyError:
+        return None
+
+    return float("inf") if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    """Select the read replica used by a session.
+
+    The policies are:
+
+    - ``round-robin``: the replicas in turn;
+    - ``least-connections``: the replica with less connections in use (checked out of its pool);
+    - ``lag-aware``: the replicas in turn, skipping the ones not reachable or with a replication lag greater
+      than ``max_lag``. The health of each replica is checked by this process (:func:`replica_lag`)
+      at most once every ``health_ttl`` seconds, with a connection of :func:`probe_engine`.
+    """
+
+    def __init__(
+        self,
+        binds: List[str],
+        policy: str = "round-robin",
+        max_lag: float = 30,
+        health_ttl: float = 5,
+        connect_timeout: int = 2,
+    ):
+        """Create the router.
+
+        :param binds: The bind keys of the read replicas. See :func:`replica_binds`.
+        :param policy: The routing policy. See :data:`REPLICA_POLICIES`.
+        :param max_lag: The maximum replication lag in seconds (``lag-aware``).
+        :param health_ttl: The number of seconds to keep the health of a replica (``lag-aware``).
+        :param connect_timeout: The maximum time in seconds to connect to a replica to check its health (``lag-aware``).
+        :raises ValueError: When the policy is not supported.
+        """
+        if policy not in REPLICA_POLICIES:
+            raise ValueError(f"Invalid replica policy {policy}. Use one of {', '.join(REPLICA_POLICIES)}.")
+
+        self.binds = list(binds)
+        self.policy = policy
+        self.max_lag = max_lag
+        self.health_ttl = health_ttl
+        self.connect_timeout = connect_timeout
+        self._counter = itertools.count()
+        self._health: Dict[str, tuple] = {}
+        self._probes: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def select(self, engines: dict) -> Optional[str]:
+        """Select the read replica.
+
+        :param engines: The engines of the replicas, by bind key (:attr:`binds`).
+        :return: The bind key of the replica or ``None`` when no replica is available, i.e. use the primary.
+        """
+        binds = [bind for bind in self.binds if bind in engines]
+        if self.policy == "lag-aware":
+            binds = [bind for bind in binds if self.is_healthy(bind, engines[bind])]
+
+        if not binds:
+            return None
+
+        # Rotate the replicas, which also breaks the ties of least-connections
+        start = next(self._counter) % len(binds)
+        binds = binds[start:] + binds[:start]
+        if self.policy == "least-connections":
+            return min(binds, key=lambda bind: _checkedout(engines[bind]))
+        return binds[0]
+
+    def is_healthy(self, bind: str, engine) -> bool:
+        """Check if the replica is reachable and its replication lag is acceptable, using the cached health."""
+        now = time.monotonic()
+        with self._lock:
+            expires, healthy = self._health.get(bind, (0, None))
+            if expires > now:
+                return healthy
+            if healthy is not None:
+                # Keep the last health for the other sessions while it is checked
+                self._health[bind] = (now + self.health_ttl, healthy)
+
+        lag = replica_lag(self._probe(bind, engine))
+        healthy = lag is not None and lag <= self.max_lag
+        with self._lock:
+            self._health[bind] = (time.monotonic() + self.health_ttl, healthy)
+        return healthy
+
+    def _probe(self, bind: str, engine):
+        """Retrieve the engine to check the health of a replica, created once with :func:`probe_engine`."""
+        with self._lock:
+            probe = self._probes.get(bind)
+            if probe is None:
+                probe = self._probes[bind] = probe_engine(engine.url, connect_timeout=self.connect_timeout)
+        return probe
+
+
+def _checkedout(engine) -> int:
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if checkedout is not None else 0
+
+
+class STACEngineConnector(_EngineConnector):
+    """Create the engine of a bind, applying its options from ``BDC_STAC_BINDS_ENGINE_OPTIONS``."""
+
+    def get_options(self, sa_url, echo):
+        """Build the engine options for the bind."""
+        sa_url, options = super(STACEngineConnector, self).get_options(sa_url, echo)
+        options.update(self._app.config.get("BDC_STAC_BINDS_ENGINE_OPTIONS", {}).get(self._bind, {}))
+
+        if options.get("poolclass") is None:
+            options["poolclass"] = TimedQueuePool
+        options.setdefault("pool_logging_name", self._bind or DEFAULT_POOL)
+        return sa_url, _pool_options(options)
+
+
+class RoutingSession(SignallingSession):
+    """Session which runs the statements on the engine of a given bind.
+
+    The bind key is given by the session option ``bind_key``. When the bind is not
+    configured in ``SQLALCHEMY_BINDS``, the session uses the default engine.
+
+    With the session option ``replicas``, the session runs the statements on a read replica
+    selected when the session is created (see :meth:`STACSQLAlchemy.select_replica`), so all the statements
+    of a request use the same replica. The bind key selects the pool of the replica, e.g. the search pool
+    has its own pool of each replica (``search-replica-N``).
+    """
+
+    def __init__(self, db, bind_key: Optional[str] = None, replicas: bool = False, **options):
+        """Create the session.
+
+        :param db: The :class:`STACSQLAlchemy` extension.
+        :param bind_key: The bind key of the session engine.
+        :param replicas: Run the statements on a read replica.
+        """
+        app = db.get_app()
+        bind = db.select_replica(app, bind_key=bind_key) if replicas else None
+        if bind is None and bind_key is not None and bind_key in (app.config.get("SQLALCHEMY_BINDS") or {}):
+            bind = bind_key
+
+        if bind is not None:
+            options["bind"] = db.get_engine(app, bind=bind)
+
+        super(RoutingSession, self).__init__(db, **options)
+
+
+class STACSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension with the engine options per bind and the session routing."""
+
+    def init_app(self, app):
+        """Initialize the extension, adding the binds and the router of the read replicas.
+
+        The replicas are given by the config ``BDC_STAC_READ_REPLICAS`` (list of database URIs) and routed with
+        ``BDC_STAC_READ_REPLICAS_POLICY``, ``BDC_STAC_REPLICA_MAX_LAG``, ``BDC_STAC_REPLICA_HEALTH_TTL`` and
+        ``BDC_STAC_REPLICA_CONNECT_TIMEOUT``. See :class:`ReplicaRouter`.
+
+        When the search pool (:data:`SEARCH_BIND`) is configured, each replica has a distinct search pool
+        (``search-replica-N``) with the engine options of the search pool.
+        """
+        uris = app.config.setdefault("BDC_STAC_READ_REPLICAS", [])
+        replicas = replica_binds(uris)
+        if replicas:
+            binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+            if SEARCH_BIND in binds:
+                options = app.config.setdefault("BDC_STAC_BINDS_ENGINE_OPTIONS", {})
+                for bind in replica_binds(uris, bind_key=SEARCH_BIND):
+                    options.setdefault(bind, options.get(SEARCH_BIND, {}))
+                binds.update(replica_binds(uris, bind_key=SEARCH_BIND))
+            app.config["SQLALCHEMY_BINDS"] = {**binds, **replicas}
+
+        app.extensions[REPLICAS_EXTENSION] = ReplicaRouter(
+            list(replicas),
+            policy=app.config.setdefault("BDC_STAC_READ_REPLICAS_POLICY", "round-robin"),
+            max_lag=app.config.setdefault("BDC_STAC_REPLICA_MAX_LAG", 30),
+            health_ttl=app.config.setdefault("BDC_STAC_REPLICA_HEALTH_TTL", 5),
+            connect_timeout=app.config.setdefault("BDC_STAC_REPLICA_CONNECT_TIMEOUT", 2),
+        )
+        super(STACSQLAlchemy, self).init_app(app)
+
+    def select_replica(self, app, bind_key: Optional[str] = None) -> Optional[str]:
+        """Select the read replica of a session.
+
+        :param bind_key: The bind key of the session pool. The replica pool of this bind is used when it exists
+            (see :func:`replica_bind`), otherwise the default pool of the replica.
+        :return: The bind key of the replica pool or ``None`` when there is no replica available.
+        """
+        router = app.extensions.get(REPLICAS_EXTENSION)
+        if router is None or not router.binds:
+            return None
+
+        binds = app.config.get("SQLALCHEMY_BINDS") or {}
+        pools = {}
+        for replica in router.binds:
+            bind = replica_bind(replica, bind_key)
+            pools[replica] = bind if bind in binds else replica
+
+        replica = router.select({replica: self.get_engine(app, bind=bind) for replica, bind in pools.items()})
+        return None if replica is None else pools[replica]
+
+    def create_session(self, options):
+        """Create the session factory using :class:`RoutingSession`."""
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def make_connector(self, app=None, bind=None):
+        """Create the engine connector for the bind."""
+        return STACEngineConnector(self, self.get_app(app), bind)
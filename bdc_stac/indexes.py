@@ -0,0 +1,96 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Database indexes which support the BDC-STAC queries.
+
+The BDC-Catalog schema is managed by BDC-Catalog migrations. The indexes
+defined here are optional and only improve the query plans of BDC-STAC.
+They are created with ``CREATE INDEX CONCURRENTLY IF NOT EXISTS``, which
+does not lock the table for writes. Use the command line::
+
+    bdc-stac create-indexes            # Create all the indexes
+    bdc-stac create-indexes --dry-run  # Show the SQL statements
+
+.. versionadded:: 1.1
+"""
+from typing import Dict, Iterable, List, Optional
+
+from bdc_catalog.models import Item
+from sqlalchemy import text
+
+from .queryables import QUERYABLES
+
+INDEXES: Dict[str, str] = {
+    "items_temporal": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bdc_stac_items_start_date_end_date "
+        "ON {items} (start_date, end_date)"
+    ),
+    "items_metadata": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bdc_stac_items_metadata "
+        f"ON {{items}} USING gin ({Item.metadata_.expression.name} jsonb_path_ops)"
+    ),
+    "items_collection_updated": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bdc_stac_items_collection_id_updated "
+        "ON {items} (collection_id, updated)"
+    ),
+}
+"""The index definitions by name.
+
+- ``items_temporal``: Index for the temporal filter of item searches
+  (``start_date <= :end AND end_date >= :start``), which is also used to sort items by ``start_date``.
+- ``items_metadata``: GIN index for the equality filters on item properties (``metadata @> :value``).
+- ``items_collection_updated``: Index for the version of the items of a collection (``max(updated)`` and ``count``),
+  which is part of the ``/search`` cache keys. See :func:`bdc_stac.controller.get_items_stamp`.
+- ``items_<property>``: Expression index for the range filters of each numeric queryable
+  (e.g. ``items_view_off_nadir``). See :mod:`bdc_stac.queryables`.
+"""
+
+for _queryable in QUERYABLES.values():
+    _statement = _queryable.index_statement("{items}")
+    if _statement is not None:
+        INDEXES[_queryable.index_name] = _statement
+
+
+def index_statements(names: Optional[Iterable[str]] = None) -> List[str]:
+    """Build the SQL statements to create the given indexes.
+
+    :param names: The index names. Defaults to all :data:`INDEXES`.
+    :raises KeyError: When an index name is unknown.
+    """
+    names = list(INDEXES) if not names else names
+    return [INDEXES[name].format(items=Item.__table__.fullname) for name in names]
+
+
+def create_indexes(engine, names: Optional[Iterable[str]] = None) -> List[str]:
+    """Create the given indexes, when missing.
+
+    The statements run in autocommit mode, since ``CREATE INDEX CONCURRENTLY``
+    can not run inside a transaction.
+
+    :param engine: The SQLAlchemy engine.
+    :param names: The index names. Defaults to all :data:`INDEXES`.
+    :return: The executed statements.
+    """
+    statements = index_statements(names)
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in statements:
+            connection.execute(text(statement))
+
+        # Collect the statistics used by the planner, which includes the expression indexes
+        connection.execute(text(f"ANALYZE {Item.__table__.fullname}"))
+    return statements
@@ -0,0 +1,132 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""JSON provider used to serialize the STAC responses.
+
+The provider uses `orjson <https://github.com/ijl/orjson>`_ when it is installed
+(``pip install bdc-stac[orjson]``) and falls back to the Python :mod:`json` module otherwise.
+See ``BDC_STAC_JSON_ENCODER``.
+
+Both encoders write the values that may come from ``Item.metadata_`` in the same way:
+
+- :class:`datetime.datetime` and :class:`datetime.date` as ISO 8601 (RFC 3339) strings.
+- :class:`decimal.Decimal` as JSON numbers.
+
+.. versionadded:: 1.1
+"""
+import datetime
+import decimal
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+JSON_ENCODERS = ("auto", "orjson", "stdlib")
+"""The supported values for ``BDC_STAC_JSON_ENCODER``."""
+
+
+def _default(o: Any) -> Any:
+    """Serialize the values not supported by the JSON encoders."""
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+
+    return DefaultJSONProvider.default(o)
+
+
+class STACJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider with a fast encoder path.
+
+    The ``orjson`` encoder is used for :meth:`dumps`, :meth:`loads` and :meth:`response`
+    when no custom argument of :func:`json.dumps` is given. Since ``orjson`` always writes
+    UTF-8, the attribute :attr:`ensure_ascii` only applies to the standard encoder.
+    Values not supported by ``orjson`` (e.g. integers larger than 64 bits) are written
+    with the standard encoder.
+    """
+
+    default = staticmethod(_default)
+
+    def __init__(self, app, encoder: str = "auto"):
+        """Create the JSON provider.
+
+        :param app: The Flask application.
+        :param encoder: The JSON encoder to use. See :data:`JSON_ENCODERS`.
+        :raises ValueError: When the encoder is not supported.
+        :raises RuntimeError: When ``orjson`` is required but not installed.
+        """
+        super(STACJSONProvider, self).__init__(app)
+
+        if encoder not in JSON_ENCODERS:
+            raise ValueError(f"Invalid JSON encoder {encoder}. Use one of {', '.join(JSON_ENCODERS)}.")
+
+        if encoder == "orjson" and orjson is None:
+            raise RuntimeError("The JSON encoder orjson is not installed. Use 'pip install bdc-stac[orjson]'.")
+
+        self.encoder = "orjson" if encoder != "stdlib" and orjson is not None else "stdlib"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as JSON to a string."""
+        data = self._fast_dumps(obj, **kwargs)
+        if data is not None:
+            return data.decode("utf-8")
+
+        return super(STACJSONProvider, self).dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        """Deserialize data as JSON from a string or bytes."""
+        if self.encoder == "orjson" and not kwargs:
+            return orjson.loads(s)
+
+        return super(STACJSONProvider, self).loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        """Serialize the given arguments as a JSON response, without decoding the ``orjson`` output."""
+        if self.encoder != "orjson":
+            return super(STACJSONProvider, self).response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        data = self._fast_dumps(obj, indent=indent)
+        if data is None:
+            return super(STACJSONProvider, self).response(*args, **kwargs)
+
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
+
+    def _fast_dumps(self, obj: Any, indent=None, separators=None, **kwargs: Any):
+        """Serialize data with ``orjson``.
+
+        :return: The serialized data or ``None`` when it must be serialized with the standard encoder.
+        """
+        if self.encoder != "orjson" or kwargs or indent not in (None, 2):
+            return None
+
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return None
@@ -0,0 +1,710 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Pagination utilities for STAC Item searches.
+
+Besides the classic ``page``/``limit`` navigation, items may be paginated with
+an opaque cursor (``token``) built from the sort key ``(Item.start_date DESC, Item.id)``
+of the last item returned. The cursor is resolved with a keyset (search-after)
+predicate, so the cost of any page is the same as the first one.
+
+The number of matched items may be computed with one of the :data:`COUNT_MODES`:
+
+- ``exact``: Run ``COUNT(*)`` over the whole filtered query.
+- ``estimated``: Use the row estimation from the PostgreSQL planner (``EXPLAIN``).
+- ``capped``: Count up to a threshold. When the threshold is reached, the threshold is returned.
+- ``none``: Skip the count.
+
+The count is skipped when the page is enough to know the total (see :meth:`ItemSearch.derived_total`).
+The token carries the count of the first page, so the next pages reuse it instead of counting again.
+Otherwise, it may run concurrently with the page query, on a distinct connection, using the thread pool
+from :func:`count_executor`. A concurrent count that is no longer needed is cancelled in the database
+(see :class:`CountQuery`).
+
+.. versionadded:: 1.1
+"""
+import base64
+import json
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bdc_catalog.models import Item
+from flask_sqlalchemy import Pagination
+from sqlalchemy import and_, bindparam, func, or_, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+COUNT_MODES = ("exact", "estimated", "capped", "none")
+"""The supported strategies to count the matched items."""
+
+Cursor = Tuple[datetime, int]
+"""Type alias for the decoded pagination token: ``(Item.start_date, Item.id)``."""
+
+Count = Tuple[int, str]
+"""Type alias for the count of matched items carried by the pagination token: ``(total, count_mode)``."""
+
+
+class ItemPagination(Pagination):
+    """Represent a page of STAC Items.
+
+    It extends :class:`flask_sqlalchemy.Pagination` to detect the next page
+    without relying on the total of matched items and to expose the
+    keyset cursor :attr:`next_token` for the next page.
+    """
+
+    def __init__(
+        self,
+        query,
+        page,
+        per_page,
+        total,
+        items,
+        has_next: bool,
+        cursor: Optional[Cursor] = None,
+        count_mode: str = "exact",
+    ):
+        """Build a new item page.
+
+        :param query: The unlimited query used to build the page.
+        :param page: The page number (1 indexed).
+        :param per_page: The page size.
+        :param total: The number of items matched by the query. ``None`` when not counted.
+        :param items: The items of the current page.
+        :param has_next: Flag to indicate that there are more items after this page.
+        :param cursor: The decoded token used to retrieve this page, if any.
+        :param count_mode: The kind of count stored in ``total``. See :data:`COUNT_MODES`.
+        """
+        super(ItemPagination, self).__init__(query, page, per_page, total, items)
+        self._has_next = has_next
+        self.cursor = cursor
+        self.count_mode = count_mode
+
+    is_streamed = False
+    """Flag to indicate that items are retrieved lazily. See :class:`ItemStream`."""
+
+    processors: Optional[Dict[int, dict]] = None
+    """The processors of the page items, when retrieved along with the page. See :func:`bdc_stac.controller.make_geojson`."""
+
+    @property
+    def returned(self) -> int:
+        """Retrieve the number of items in the page."""
+        return len(self.items)
+
+    @property
+    def pages(self):
+        """Retrieve the total number of pages. It is ``None`` when the items were not counted."""
+        if self.total is None:
+            return None
+        return super(ItemPagination, self).pages
+
+    @property
+    def has_next(self):
+        """Check if a next page exists."""
+        return self._has_next
+
+    @property
+    def has_prev(self):
+        """Check if a previous page exists. Keyset pages only navigate forward."""
+        return self.cursor is None and self.page > 1
+
+    @property
+    def next_token(self) -> Optional[str]:
+        """Retrieve the pagination token for the next page."""
+        if not self.has_next or not self.items:
+            return None
+
+        last = self.items[-1]
+        return encode_token(last.start, last.id, total=self.total, count_mode=self.count_mode)
+
+
+class ItemStream(ItemPagination):
+    """Represent a page of STAC Items read lazily from a server-side cursor.
+
+    The items are not kept in memory. They are only available while
+    consuming :meth:`iter_chunks`. After that, the properties :attr:`returned`,
+    :attr:`has_next` and :attr:`next_token` describe the page.
+    """
+
+    is_streamed = True
+
+    def __init__(self, query, page_query, page, per_page, total, cursor=None, count_mode="exact", chunk_size=100):
+        """Build a new item stream.
+
+        :param query: The unlimited query used to build the page.
+        :param page_query: The query of the page, limited to ``per_page + 1`` rows.
+        :param page: The page number (1 indexed).
+        :param per_page: The page size.
+        :param total: The number of items matched by the query. ``None`` when not counted.
+        :param cursor: The decoded token used to retrieve this page, if any.
+        :param count_mode: The kind of count stored in ``total``. See :data:`COUNT_MODES`.
+        :param chunk_size: The number of rows fetched from the server-side cursor at once.
+        """
+        super(ItemStream, self).__init__(
+            query, page, per_page, total, [], has_next=False, cursor=cursor, count_mode=count_mode
+        )
+        self.page_query = page_query
+        self.chunk_size = chunk_size
+        self._returned = 0
+        self._last = None
+
+    @property
+    def returned(self) -> int:
+        """Retrieve the number of items streamed so far."""
+        return self._returned
+
+    @property
+    def next_token(self) -> Optional[str]:
+        """Retrieve the pagination token for the next page. Only available after the stream is consumed."""
+        if not self.has_next or self._last is None:
+            return None
+
+        return encode_token(self._last.start, self._last.id, total=self.total, count_mode=self.count_mode)
+
+    def iter_chunks(self) -> Iterator[List]:
+        """Iterate over the page items in lists of at most ``chunk_size`` rows."""
+        chunk = []
+        for row in self.page_query.yield_per(self.chunk_size):
+            if self._returned == self.per_page:
+                self._has_next = True
+                break
+
+            chunk.append(row)
+            self._returned += 1
+            self._last = row
+
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def encode_token(
+    start_date: datetime, item_id: int, total: Optional[int] = None, count_mode: Optional[str] = None
+) -> str:
+    """Build an opaque pagination token from the item sort key.
+
+    The count of matched items of the first page may be carried by the token, so the next pages do not count again.
+
+    :param start_date: The ``Item.start_date`` of the last item in page.
+    :param item_id: The ``Item.id`` of the last item in page.
+    :param total: The number of matched items, if counted.
+    :param count_mode: The kind of count of ``total``. See :data:`COUNT_MODES`.
+    :return: The URL safe token.
+    """
+    values = [start_date.isoformat(), item_id]
+    if total is not None:
+        values.extend([total, count_mode])
+    value = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Cursor:
+    """Decode a pagination token generated by :func:`encode_token`.
+
+    :param token: The pagination token.
+    :raises ValueError: When the token is malformed.
+    :return: The sort key ``(Item.start_date, Item.id)``.
+    """
+    start_date, item_id = _token_values(token)[:2]
+    try:
+        return datetime.fromisoformat(start_date), int(item_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid pagination token {token}") from e
+
+
+def decode_token_count(token: str) -> Optional[Count]:
+    """Decode the count of matched items carried by a pagination token generated by :func:`encode_token`.
+
+    :param token: The pagination token.
+    :raises ValueError: When the token is malformed.
+    :return: The ``(total, count_mode)`` or ``None`` when the token has no count.
+    """
+    values = _token_values(token)
+    if len(values) == 2:
+        return None
+
+    total, count_mode = values[2:]
+    if not isinstance(total, int) or total < 0 or count_mode not in COUNT_MODES:
+        raise ValueError(f"Invalid pagination token {token}")
+    return total, count_mode
+
+
+def _token_values(token: str) -> list:
+    """Decode the JSON values of a pagination token."""
+    try:
+        padding = "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(token + padding))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid pagination token {token}") from e
+
+    if not isinstance(values, list) or len(values) not in (2, 4):
+        raise ValueError(f"Invalid pagination token {token}")
+    return values
+
+
+class ItemSearch:
+    """Represent the page of an item search, before running its queries.
+
+    It resolves the page query (offset or keyset) and the count statement, which may be
+    executed by any connection (e.g. :mod:`bdc_stac.asgi`). Use :meth:`make_page` to build
+    the page from the retrieved rows or :meth:`paginate` to run the queries with the query session.
+    """
+
+    def __init__(
+        self,
+        query,
+        page=1,
+        limit=10,
+        max_limit=None,
+        cursor: Optional[Cursor] = None,
+        count: str = "exact",
+        count_limit: Optional[int] = None,
+        statement: Optional["SearchStatement"] = None,
+        params: Optional[dict] = None,
+        counted: Optional[Count] = None,
+    ):
+        """Build a new item search.
+
+        :param query: The items query. It must be ordered by ``Item.start_date DESC, Item.id``.
+        :param page: The page number (1 indexed), defaults to 1.
+        :param limit: The page size, defaults to 10.
+        :param max_limit: The maximum page size allowed.
+        :param cursor: The decoded pagination token.
+        :param count: The strategy to count the matched items. See :data:`COUNT_MODES`.
+        :param count_limit: The threshold for ``capped`` count.
+        :param statement: The compiled statements of the query shape, used by :meth:`paginate`.
+            The ``query`` must be the :attr:`SearchStatement.query` with the search parameters (``Query.params``).
+        :param params: The search parameters of the ``statement``.
+        :param counted: The count of matched items of a previous page (see :func:`decode_token_count`).
+            It is reused instead of counting again, unless the count is disabled (``none``).
+        :raises ValueError: When the limit is negative.
+        """
+        page, limit = int(page), int(limit)
+        if limit < 0:
+            raise ValueError(f"Invalid limit {limit}")
+        if max_limit is not None:
+            limit = min(limit, max_limit)
+        if page < 1 or cursor is not None:
+            page = 1
+
+        page_query = query
+        if cursor is not None:
+            page_query = page_query.filter(_keyset_filter(*cursor))
+        else:
+            page_query = page_query.offset((page - 1) * limit)
+
+        self.query = query
+        self.page_query = page_query.limit(limit + 1)
+        self.offset = (page - 1) * limit
+        self.page = page
+        self.limit = limit
+        self.cursor = cursor
+        self.count = count
+        self.count_limit = count_limit
+        self.statement = statement
+        self.params = params or {}
+        self.counted = counted if count != "none" else None
+
+    def count_statement(self):
+        """Build the statement to count the matched items. It is ``None`` when the items are not counted."""
+        if self.counted is not None:
+            return None
+
+        return count_statement(self.query, mode=self.count, limit=self.count_limit)
+
+    def count_result(self, value: Optional[int]) -> Tuple[Optional[int], str]:
+        """Retrieve the number of matched items and the kind of count from the result of :meth:`count_statement`.
+
+        :param value: The result of :meth:`count_statement`, ``None`` when not counted.
+        :return: The previous count (:attr:`counted`), if any. Otherwise, the :func:`count_result` of ``value``.
+        """
+        if self.counted is not None:
+            return self.counted
+
+        return count_result(value, mode=self.count, limit=self.count_limit)
+
+    def make_page(self, rows: List, total: Optional[int], count_mode: str) -> ItemPagination:
+        """Build the page from the rows of :attr:`page_query` and the count of matched items.
+
+        :param rows: The rows retrieved with :attr:`page_query`, with one extra row when there is a next page.
+        :param total: The number of matched items. See :func:`count_result`.
+        :param count_mode: The kind of count of ``total``.
+        """
+        has_next = len(rows) > self.limit
+        items = rows[: self.limit]
+
+        return ItemPagination(
+            self.query,
+            self.page,
+            self.limit,
+            total,
+            items,
+            has_next=has_next,
+            cursor=self.cursor,
+            count_mode=count_mode,
+        )
+
+    def derived_total(self, rows: List) -> Optional[int]:
+        """Retrieve the number of matched items when it is known from the page rows, without counting.
+
+        It happens for the last page of an offset search (page shorter than the limit), including an empty first page.
+        The total is not derived for keyset pages (``token``) or when the count is disabled (``none``).
+
+        :param rows: The rows retrieved with :attr:`page_query`.
+        :return: The exact number of matched items or ``None`` when it must be counted.
+        """
+        if self.cursor is not None or self.count == "none" or len(rows) > self.limit:
+            return None
+
+        if not rows and self.page > 1:
+            return None
+
+        return self.offset + len(rows)
+
+    def paginate(
+        self, stream: bool = False, chunk_size: int = 100, executor: Optional[Executor] = None
+    ) -> ItemPagination:
+        """Run the page and the count queries with the query session.
+
+        When the ``executor`` is given, the count query runs in that executor, on a distinct
+        connection, while the page is retrieved. The count is cancelled when the total is
+        derived from the page (see :meth:`derived_total`) or the page query fails.
+
+        :param stream: Retrieve the items lazily using a server-side cursor. See :class:`ItemStream`.
+        :param chunk_size: The number of rows fetched at once when streaming.
+        :param executor: The executor to run the count query concurrently. See :func:`count_executor`.
+        """
+        if stream:
+            total, count = self.counted or count_items(self.query, mode=self.count, limit=self.count_limit)
+            return ItemStream(
+                self.query,
+                self.page_query,
+                self.page,
+                self.limit,
+                total,
+                cursor=self.cursor,
+                count_mode=count,
+                chunk_size=chunk_size,
+            )
+
+        engine = self.query.session.get_bind()
+        count_job = self._count_job(engine)
+        counting, future = None, None
+        if executor is not None and count_job is not None:
+            counting = CountQuery(*count_job)
+            future = executor.submit(counting)
+
+        try:
+            rows = self._page_rows(engine)
+        except Exception:
+            if counting is not None:
+                counting.cancel()
+            raise
+
+        total = self.derived_total(rows)
+        if total is not None:
+            if counting is not None:
+                counting.cancel()
+            return self.make_page(rows, total, "exact")
+
+        if future is not None:
+            value = future.result()
+        elif count_job is not None:
+            value = _scalar(*count_job)
+        else:
+            value = None
+
+        total, count = self.count_result(value)
+        return self.make_page(rows, total, count)
+
+    def _page_rows(self, engine) -> List:
+        if self.statement is None:
+            return self.page_query.all()
+
+        if self.cursor is not None:
+            name, params = "keyset", dict(bdc_cursor_start=self.cursor[0], bdc_cursor_id=self.cursor[1])
+        else:
+            name, params = "offset", dict(bdc_offset=self.offset)
+        params.update(self.params, bdc_limit=self.limit + 1)
+
+        with engine.connect() as connection:
+            return connection.execute(self.statement.compiled(name, engine.dialect), params).fetchall()
+
+    def _count_job(self, engine) -> Optional[Tuple]:
+        """Retrieve the arguments of :func:`_scalar` to count the matched items or ``None`` when not counted."""
+        if self.count == "none" or self.counted is not None:
+            return None
+
+        if self.statement is None:
+            return engine, self.count_statement(), None
+
+        name, params = self.count, dict(self.params)
+        if name == "capped":
+            if self.count_limit is None:
+                name = "exact"
+            else:
+                params["bdc_count_limit"] = self.count_limit + 1
+        return engine, self.statement.compiled(name, engine.dialect), params
+
+
+class SearchStatement:
+    """Represent the statements of an item search shape, compiled once and executed with the values of each search.
+
+    The items query must use bound parameters (:func:`sqlalchemy.sql.expression.bindparam`) for the search values,
+    given with ``Query.params`` for each search. It avoids the construction and the compilation of the page and count
+    statements of each request, which is relevant since the statements with geometry columns are not cached by
+    SQLAlchemy. See :class:`ItemSearch`.
+
+    .. note::
+
+        The compiled statements are executed by :meth:`ItemSearch.paginate`. The streamed pages
+        (:class:`ItemStream`) and :mod:`bdc_stac.asgi` execute the query with the search parameters.
+    """
+
+    def __init__(self, query):
+        """Build the statements of the search shape.
+
+        :param query: The items query, without session. It must be ordered by ``Item.start_date DESC, Item.id``.
+        """
+        self.query = query
+        self._compiled = {}
+
+    def compiled(self, name: str, dialect):
+        """Retrieve the compiled statement for the given dialect.
+
+        :param name: The statement name: ``offset`` or ``keyset`` for the page or the count mode.
+        """
+        key = (name, dialect.name, dialect.driver)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = self.statement(name).compile(dialect=dialect)
+        return compiled
+
+    def statement(self, name: str):
+        """Build the statement with the given name. See :meth:`compiled`."""
+        if name == "offset":
+            return self.query.offset(bindparam("bdc_offset")).limit(bindparam("bdc_limit")).statement
+
+        if name == "keyset":
+            keyset = _keyset_filter(bindparam("bdc_cursor_start"), bindparam("bdc_cursor_id"))
+            return self.query.filter(keyset).limit(bindparam("bdc_limit")).statement
+
+        if name == "capped":
+            query = self.query.order_by(None).limit(bindparam("bdc_count_limit"))
+            return select([func.count()]).select_from(query.subquery())
+
+        return count_statement(self.query, mode=name)
+
+
+def _keyset_filter(start_date, item_id):
+    """Build the keyset predicate of the items after the sort key ``(Item.start_date DESC, Item.id)``."""
+    return or_(Item.start_date < start_date, and_(Item.start_date == start_date, Item.id > item_id))
+
+
+def paginate_items(
+    query,
+    page=1,
+    limit=10,
+    max_limit=None,
+    cursor: Optional[Cursor] = None,
+    count: str = "exact",
+    count_limit: Optional[int] = None,
+    stream: bool = False,
+    chunk_size: int = 100,
+    executor: Optional[Executor] = None,
+) -> ItemPagination:
+    """Paginate a query of items sorted by ``Item.start_date DESC, Item.id``.
+
+    When the ``cursor`` is given, the page is resolved using keyset predicate
+    and ``page`` is ignored. Otherwise, it uses the page offset.
+
+    .. note::
+
+        The page is retrieved with one extra row in order to detect the next page.
+
+    :param query: The items query. It must be ordered by ``Item.start_date DESC, Item.id``.
+    :param page: The page number (1 indexed), defaults to 1.
+    :param limit: The page size, defaults to 10.
+    :param max_limit: The maximum page size allowed.
+    :param cursor: The decoded pagination token.
+    :param count: The strategy to count the matched items. See :data:`COUNT_MODES`.
+    :param count_limit: The threshold for ``capped`` count.
+    :param stream: Retrieve the items lazily using a server-side cursor. See :class:`ItemStream`.
+    :param chunk_size: The number of rows fetched at once when streaming.
+    :param executor: The executor to run the count query concurrently. See :func:`count_executor`.
+    """
+    search = ItemSearch(
+        query, page=page, limit=limit, max_limit=max_limit, cursor=cursor, count=count, count_limit=count_limit
+    )
+    return search.paginate(stream=stream, chunk_size=chunk_size, executor=executor)
+
+
+def count_items(query, mode: str = "exact", limit: Optional[int] = None) -> Tuple[Optional[int], str]:
+    """Count the items matched by the given query.
+
+    :param query: The items query.
+    :param mode: The count strategy. See :data:`COUNT_MODES`.
+    :param limit: The threshold for ``capped`` count.
+    :return: The number of matched items and the kind of count returned.
+        A ``capped`` count lower than the threshold is reported as ``exact``.
+    """
+    statement = count_statement(query, mode=mode, limit=limit)
+    if statement is None:
+        return None, mode
+
+    return count_result(query.session.execute(statement).scalar(), mode=mode, limit=limit)
+
+
+def count_statement(query, mode: str = "exact", limit: Optional[int] = None):
+    """Build the statement to count the items matched by the given query.
+
+    :param query: The items query.
+    :param mode: The count strategy. See :data:`COUNT_MODES`.
+    :param limit: The threshold for ``capped`` count.
+    :return: The count statement or ``None`` for ``none``. See :func:`count_result`.
+    """
+    query = query.order_by(None)
+
+    if mode == "none":
+        return None
+
+    if mode == "estimated":
+        return _Explain(query.statement)
+
+    if mode == "capped" and limit is not None:
+        query = query.limit(limit + 1)
+
+    return select([func.count()]).select_from(query.subquery())
+
+
+def count_result(value, mode: str = "exact", limit: Optional[int] = None) -> Tuple[Optional[int], str]:
+    """Build the count of matched items from the value retrieved with :func:`count_statement`.
+
+    :return: The number of matched items and the kind of count returned.
+    """
+    if mode == "none":
+        return None, mode
+
+    if mode == "estimated":
+        if isinstance(value, str):
+            value = json.loads(value)
+        return int(value[0]["Plan"]["Plan Rows"]), mode
+
+    if mode == "capped" and limit is not None and value > limit:
+        return limit, mode
+
+    return value, "exact"
+
+
+_count_executor: Optional[ThreadPoolExecutor] = None
+_count_executor_lock = threading.Lock()
+
+
+def count_executor(max_workers: int) -> Optional[Executor]:
+    """Retrieve the thread pool shared by the searches to run the count queries.
+
+    Each running count holds a connection of the database pool, apart from the page query.
+
+    :param max_workers: The number of threads, used when the pool is created.
+    :return: The thread pool or ``None`` when ``max_workers`` is ``0`` (sequential count).
+    """
+    global _count_executor
+
+    if max_workers <= 0:
+        return None
+
+    with _count_executor_lock:
+        if _count_executor is None:
+            _count_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bdc-stac-count")
+        return _count_executor
+
+
+class CountQuery:
+    """Count query which runs in another thread and may be cancelled while running.
+
+    The cancellation is sent to the database server with the DB-API ``cancel`` of the connection
+    (e.g. :meth:`psycopg2.extensions.connection.cancel`), so the connection is released instead of
+    waiting for the count to finish. The drivers without ``cancel`` only skip a count not yet started.
+    """
+
+    def __init__(self, engine, statement, params=None):
+        """Create the count query. See :func:`_scalar`."""
+        self.engine = engine
+        self.statement = statement
+        self.params = params
+        self.cancelled = False
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        """Run the count query. It returns ``None`` when cancelled before it starts."""
+        with self.engine.connect() as connection:
+            with self._lock:
+                if self.cancelled:
+                    return None
+                self._connection = connection.connection
+            try:
+                return connection.execute(self.statement, self.params or {}).scalar()
+            finally:
+                with self._lock:
+                    self._connection = None
+
+    def cancel(self):
+        """Cancel the count query: skip it when not started or cancel it in the database server when running."""
+        with self._lock:
+            self.cancelled = True
+            cancel = getattr(self._connection, "cancel", None) if self._connection is not None else None
+            if cancel is not None:
+                try:
+                    cancel()
+                except Exception:  # pragma: no cover
+                    pass
+
+
+def _scalar(engine, statement, params=None):
+    """Run a statement on a new connection of the engine and retrieve the first column of the first row."""
+    with engine.connect() as connection:
+        return connection.execute(statement, params or {}).scalar()
+
+
+def estimate_count(query) -> int:
+    """Estimate the number of rows of a query using the PostgreSQL planner.
+
+    It runs ``EXPLAIN (FORMAT JSON)`` for the given query and returns the planned rows.
+    Since the query is not executed, the estimation relies on table statistics
+    (``ANALYZE``) and may differ from the real number of rows.
+    """
+    plan = query.session.execute(_Explain(query.statement)).scalar()
+    return count_result(plan, mode="estimated")[0]
+
+
+class _Explain(Executable, ClauseElement):
+    """Represent an ``EXPLAIN`` statement for a given query."""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kwargs):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kwargs)}"
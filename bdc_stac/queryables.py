@@ -0,0 +1,310 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Typed queryable properties for item filters.
+
+Each queryable maps a STAC property to a database column or to a key of
+``Item.metadata_`` (JSONB) with a type. The filters are compiled to expressions
+which PostgreSQL can resolve with indexes:
+
+- Equality (``eq``, ``in``) on JSON properties uses the containment operator
+  ``metadata @> '{"<property>": <value>}'``, which is supported by a GIN index on ``Item.metadata_``.
+- Comparisons on numeric JSON properties cast the value (``CAST(metadata ->> '<property>' AS FLOAT)``),
+  so the values are compared as numbers and an expression index may be used. Only the JSON values of
+  the property type are cast (``jsonb_typeof``), the other values do not match.
+
+The properties not registered are compared as text (``metadata ->> '<property>'``).
+Register more properties with ``BDC_STAC_QUERYABLES`` and create the supporting
+indexes with ``bdc-stac create-indexes``.
+
+.. versionadded:: 1.1
+"""
+import re
+from typing import Any, Dict, Optional
+
+from bdc_catalog.models import Item, Tile
+from sqlalchemy import Boolean, Float, Integer, and_, case, cast, func, literal, literal_column, not_, or_
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .config import BDC_STAC_QUERYABLES
+
+OPERATORS = {
+    "eq": "__eq__",
+    "neq": "__ne__",
+    "lt": "__lt__",
+    "lte": "__le__",
+    "gt": "__gt__",
+    "gte": "__ge__",
+    "startsWith": "startswith",
+    "endsWith": "endswith",
+    "contains": "contains",
+    "in": "in_",
+}
+"""The operators of the STAC API ``query`` extension and the SQLAlchemy comparators."""
+
+TYPES = ("string", "number", "integer", "boolean", "array")
+"""The supported queryable types. The ``array`` type refers to arrays of strings (e.g. ``instruments``)."""
+
+_TEXT_OPERATORS = ("startsWith", "endsWith", "contains")
+_CASTS = {"number": Float, "integer": Integer, "boolean": Boolean}
+_JSON_TYPES = {"number": "number", "integer": "number", "boolean": "boolean"}
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "false"):
+        return str(value).lower() == "true"
+    raise ValueError(value)
+
+
+def _integer(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(value)
+    return int(number)
+
+
+_COERCE = {"string": str, "number": float, "integer": _integer, "boolean": _boolean, "array": str}
+
+
+class Queryable:
+    """Represent a property which may be used to filter items.
+
+    Example:
+        >>> from sqlalchemy.dialects import postgresql
+        >>> expression = Queryable("view:off_nadir", "number").compile("lte", 10)
+        >>> str(expression.compile(dialect=postgresql.dialect()))  # doctest: +ELLIPSIS
+        "CAST(CASE WHEN (jsonb_typeof(...metadata -> 'view:off_nadir') = 'number') THEN ... END AS FLOAT) <= %(param_1)s"
+    """
+
+    def __init__(self, name: str, type: Optional[str] = "string", column=None, description: Optional[str] = None):
+        """Create a queryable.
+
+        :param name: The STAC property name.
+        :param type: The property type. See :data:`TYPES`. Use ``None`` for untyped (text) comparison.
+        :param column: The database column of the property. Defaults to the key ``name`` of ``Item.metadata_``.
+        :param description: The property description.
+        """
+        if type is not None and type not in TYPES:
+            raise ValueError(f"Invalid queryable type {type} for {name}. Use one of {', '.join(TYPES)}.")
+
+        self.name = name
+        self.type = type
+        self.column = column
+        self.description = description
+
+    @property
+    def is_json(self) -> bool:
+        """Check if the property is stored in ``Item.metadata_``."""
+        return self.column is None
+
+    def expression(self):
+        """Retrieve the SQL expression of the property value, cast to the property type.
+
+        The values of other JSON types (e.g. a string in a numeric property) are ``NULL``, instead of failing the cast.
+        The ``integer`` properties must have integral values.
+        """
+        if not self.is_json:
+            return self.column
+
+        # The key is written as a literal (not a bind parameter), so the expression matches expression indexes
+        key = literal_column(_quote(self.name))
+        value = Item.metadata_.op("->>")(key)
+        if self.type in _CASTS:
+            json_type = func.jsonb_typeof(Item.metadata_.op("->")(key)) == literal_column(
+                _quote(_JSON_TYPES[self.type])
+            )
+            return cast(case([(json_type, value)]), _CASTS[self.type])
+        return value
+
+    def compile(self, op: str, value: Any):
+        """Compile a comparison of the property.
+
+        :param op: The operator. See :data:`OPERATORS`.
+        :param value: The value to compare.
+        :raises ValueError: When the operator or the value is not valid for the property.
+        """
+        if op not in OPERATORS:
+            raise ValueError(f"Invalid operator {op} for {self.name}. Use one of {', '.join(OPERATORS)}.")
+
+        if op == "in":
+            if not isinstance(value, (list, tuple)):
+                raise ValueError(f"Invalid value {value} for {self.name}: operator 'in' requires a list.")
+            values = [self.coerce(v) for v in value]
+        else:
+            values = [self.coerce(value)]
+
+        if not self.is_json:
+            return getattr(self.column, OPERATORS[op])(values if op == "in" else values[0])
+
+        if self.type is not None and op in ("eq", "in"):
+            return or_(*(self._contains(v) for v in values)) if len(values) > 1 else self._contains(values[0])
+
+        if self.type is not None and op == "neq":
+            return and_(Item.metadata_.has_key(self.name), not_(self._contains(values[0])))
+
+        if self.type == "array" or (self.type in _CASTS and op in _TEXT_OPERATORS):
+            raise ValueError(f"Invalid operator {op} for {self.name} ({self.type}).")
+
+        return getattr(self.expression(), OPERATORS[op])(values if op == "in" else values[0])
+
+    def coerce(self, value: Any) -> Any:
+        """Convert a value to the property type.
+
+        :raises ValueError: When the value can not be converted.
+        """
+        if self.type is None:
+            return value
+
+        try:
+            return _COERCE[self.type](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value {value} for {self.name}: expected {self.type}.")
+
+    def index_statement(self, table: str) -> Optional[str]:
+        """Build the statement of the expression index for range comparisons.
+
+        Only the numeric JSON properties have an expression index, since the equality is
+        resolved by the GIN index of ``Item.metadata_``.
+        """
+        if not self.is_json or self.type not in ("number", "integer"):
+            return None
+
+        sql_type = "double precision" if self.type == "number" else "integer"
+        column, key = Item.metadata_.expression.name, _quote(self.name)
+        value = f"CASE WHEN jsonb_typeof({column} -> {key}) = 'number' THEN {column} ->> {key} END"
+        return (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bdc_stac_{self.index_name} "
+            f"ON {table} ((CAST({value} AS {sql_type})))"
+        )
+
+    @property
+    def index_name(self) -> str:
+        """Retrieve the name of the property index in :data:`bdc_stac.indexes.INDEXES`."""
+        return f"items_{re.sub(r'[^a-z0-9]+', '_', self.name.lower())}"
+
+    def schema(self) -> dict:
+        """Describe the property as JSON Schema."""
+        schema = dict(title=self.name)
+        if self.type == "array":
+            schema.update(type="array", items=dict(type="string"))
+        elif self.type is not None:
+            schema["type"] = self.type
+        if self.description:
+            schema["description"] = self.description
+        return schema
+
+    def _contains(self, value):
+        if self.type == "array":
+            value = [value]
+        return Item.metadata_.op("@>")(literal({self.name: value}, JSONB))
+
+
+QUERYABLES: Dict[str, Queryable] = {}
+"""The registered queryables by property name. See :func:`register_queryable`."""
+
+
+def register_queryable(queryable: Queryable) -> Queryable:
+    """Register a queryable property, replacing any queryable with the same name."""
+    QUERYABLES[queryable.name] = queryable
+    return queryable
+
+
+def get_queryable(name: str) -> Queryable:
+    """Retrieve the queryable of a property.
+
+    The properties not registered are untyped properties of ``Item.metadata_``, compared as text.
+    """
+    queryable = QUERYABLES.get(name)
+    if queryable is None:
+        queryable = Queryable(name, type=None)
+    return queryable
+
+
+def queryables_schema(schema_id: str, title: str = "Queryables") -> dict:
+    """Build the JSON Schema of the queryable properties (``/queryables``).
+
+    It includes the core properties of the items, supported by the Filter extension
+    (see :mod:`bdc_stac.cql2`), and the registered :data:`QUERYABLES`.
+
+    :param schema_id: The schema identifier, i.e. the URL of the queryables endpoint.
+    :param title: The schema title.
+    """
+    properties = {
+        "id": dict(title="Item ID", type="string"),
+        "collection": dict(title="Collection ID", type="string"),
+        "datetime": dict(title="Acquisition date and time", type="string", format="date-time"),
+        "start_datetime": dict(title="Start date and time", type="string", format="date-time"),
+        "end_datetime": dict(title="End date and time", type="string", format="date-time"),
+        "created": dict(title="Creation date and time", type="string", format="date-time"),
+        "updated": dict(title="Update date and time", type="string", format="date-time"),
+        "geometry": {"title": "Item geometry", "$ref": "https://geojson.org/schema/Geometry.json"},
+    }
+    for name, queryable in QUERYABLES.items():
+        properties[name] = queryable.schema()
+
+    return {
+        "$schema": "https://json-schema.org/draft/2019-09/schema",
+        "$id": schema_id,
+        "type": "object",
+        "title": title,
+        "properties": properties,
+        "additionalProperties": True,
+    }
+
+
+def _quote(value: str) -> str:
+    """Quote a string as SQL literal."""
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def _register_defaults():
+    register_queryable(Queryable("bdc:tile", "string", column=Tile.name, description="The tile name."))
+    # Legacy: for compatibility
+    register_queryable(Queryable("bdc:tiles", "string", column=Tile.name, description="The tile name."))
+    register_queryable(Queryable("eo:cloud_cover", "number", column=Item.cloud_cover, description="Cloud cover (%)."))
+
+    for name, type_ in [
+        ("platform", "string"),
+        ("constellation", "string"),
+        ("instruments", "array"),
+        ("sat:orbit_state", "string"),
+        ("sat:relative_orbit", "integer"),
+        ("sat:absolute_orbit", "integer"),
+        ("view:off_nadir", "number"),
+        ("view:incidence_angle", "number"),
+        ("view:azimuth", "number"),
+        ("view:sun_azimuth", "number"),
+        ("view:sun_elevation", "number"),
+        ("sar:instrument_mode", "string"),
+        ("sar:product_type", "string"),
+        ("sar:polarizations", "array"),
+    ]:
+        register_queryable(Queryable(name, type_))
+
+    # Custom queryables from the configuration: "name=type,name=type"
+    for entry in filter(None, BDC_STAC_QUERYABLES.split(",")):
+        name, _, type_ = entry.strip().rpartition("=")
+        register_queryable(Queryable(name, type_))
+
+
+_register_defaults()
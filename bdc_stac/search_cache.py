@@ -0,0 +1,290 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Response cache for the STAC Item Search (``/search``).
+
+The serialized responses are cached by the normalized search parameters, the
+user roles and the request values used to render the response (``X-Stac-Url``,
+``X-Script-Name`` and the assets query string). The cache is disabled by default.
+See ``BDC_STAC_SEARCH_CACHE``.
+
+The cached values are kept in a :class:`CacheBackend`:
+
+- :class:`MemoryBackend`: in-process LRU cache (one cache per worker).
+- :class:`RedisBackend`: shared cache in a Redis compatible server (``pip install bdc-stac[redis]``).
+
+The cache keys include the version of the searched items (``version`` of :class:`SearchCache`, see
+:func:`bdc_stac.controller.get_items_stamp`), so the responses cached before creating, changing or
+removing the items of a collection are not reached anymore and they expire with the TTL.
+
+Each collection also has a generation counter, which is part of the cache keys.
+Use :meth:`SearchCache.invalidate` (or ``bdc-stac invalidate-search-cache``)
+to discard the cached responses of a collection explicitly.
+
+.. versionadded:: 1.1
+"""
+import abc
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from flask import current_app
+
+from .cache import TTLCache
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+KEY_PREFIX = "bdc-stac:search"
+
+_ANY_COLLECTION = "*"
+"""Generation counter of the searches without ``collections`` filter. It is increased on any invalidation."""
+
+_ALL = "__all__"
+"""Generation counter shared by all the searches. It is increased to invalidate the whole cache."""
+
+_LIST_PARAMETERS = ("collections", "ids")
+
+
+class CacheBackend(abc.ABC):
+    """Interface of the storage used by :class:`SearchCache`."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Retrieve the value of a key or ``None`` when missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: int):
+        """Store a value which expires after ``ttl`` seconds."""
+
+    @abc.abstractmethod
+    def counters(self, keys: List[str]) -> Optional[List[int]]:
+        """Retrieve the values of the given counters. Missing counters are ``0``.
+
+        :return: The counter values or ``None`` when the backend is not available.
+        """
+
+    @abc.abstractmethod
+    def incr(self, key: str) -> Optional[int]:
+        """Increase the value of a counter.
+
+        :return: The counter value or ``None`` when the backend is not available.
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """In-process cache backend, bounded by the number of entries."""
+
+    def __init__(self, maxsize: int = 256, ttl: int = 60):
+        """Create the backend.
+
+        :param maxsize: The maximum number of cached responses.
+        :param ttl: The maximum time-to-live of the cached responses.
+        """
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Retrieve the value of a key or ``None`` when missing or expired."""
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        """Store a value. The TTL of the in-process cache is fixed in the constructor."""
+        self._cache.set(key, value)
+
+    def counters(self, keys: List[str]) -> List[int]:
+        """Retrieve the values of the given counters. Missing counters are ``0``."""
+        return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key: str) -> int:
+        """Increase the value of a counter."""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend(CacheBackend):
+    """Cache backend which uses a Redis compatible server, shared by all the workers.
+
+    The server errors are logged and handled as cache misses, so the searches
+    still work when the server is not available.
+    """
+
+    def __init__(self, url: str):
+        """Create the backend.
+
+        :param url: The server URL, e.g. ``redis://localhost:6379/0``.
+        :raises RuntimeError: When the library ``redis`` is not installed.
+        """
+        if redis is None:
+            raise RuntimeError("The search cache backend requires redis. Use 'pip install bdc-stac[redis]'.")
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Retrieve the value of a key or ``None`` when missing or expired."""
+        try:
+            return self._client.get(key)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Could not read the search cache: {e}")
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        """Store a value which expires after ``ttl`` seconds."""
+        try:
+            self._client.set(key, value, ex=ttl)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Could not write the search cache: {e}")
+
+    def counters(self, keys: List[str]) -> Optional[List[int]]:
+        """Retrieve the values of the given counters. Missing counters are ``0``."""
+        try:
+            return [int(value or 0) for value in self._client.mget(keys)]
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Could not read the search cache: {e}")
+            return None
+
+    def incr(self, key: str) -> Optional[int]:
+        """Increase the value of a counter."""
+        try:
+            return self._client.incr(key)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Could not invalidate the search cache: {e}")
+            return None
+
+
+class SearchCache:
+    """Cache of serialized ``/search`` responses.
+
+    Example:
+        >>> cache = SearchCache(MemoryBackend(maxsize=16, ttl=60), ttl=60)
+        >>> key = cache.make_key({"collections": "S2-16D-2", "limit": "10"}, roles=("*",))
+        >>> cache.set(key, b'{"type":"FeatureCollection"}')
+        >>> cache.get(key)
+        b'{"type":"FeatureCollection"}'
+        >>> cache.invalidate(["S2-16D-2"])
+        >>> cache.get(cache.make_key({"collections": ["S2-16D-2"], "limit": 10}, roles=("*",))) is None
+        True
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int = 60, version: Optional[Callable] = None):
+        """Create the search cache.
+
+        :param backend: The storage of the cached responses.
+        :param ttl: The time-to-live of the cached responses in seconds.
+        :param version: Function which retrieves the version of the items of the given collections
+            (``None`` for all the collections). It is part of the cache keys.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.version = version
+
+    def make_key(self, parameters: dict, roles: Iterable[str], context: Iterable = ()) -> Optional[str]:
+        """Build the cache key of a search.
+
+        :param parameters: The search parameters.
+        :param roles: The normalized user roles.
+        :param context: The request values used to render the response.
+        :return: The cache key or ``None`` when the search must not be cached (invalid parameters).
+        """
+        parameters = normalize_parameters(parameters)
+        if parameters is None:
+            return None
+
+        collections = parameters.get("collections") or [_ANY_COLLECTION]
+        generations = self.backend.counters([self._counter_key(name) for name in (_ALL, *collections)])
+        if generations is None:
+            return None
+
+        version = self.version(parameters.get("collections")) if self.version is not None else None
+        value = json.dumps([parameters, list(roles), list(context), generations, version], sort_keys=True, default=str)
+        return f"{KEY_PREFIX}:{hashlib.blake2b(value.encode('utf-8'), digest_size=20).hexdigest()}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Retrieve a cached response."""
+        return self.backend.get(key)
+
+    def set(self, key: str, body: bytes):
+        """Store a response."""
+        self.backend.set(key, body, self.ttl)
+
+    def invalidate(self, collections: Optional[Iterable[str]] = None) -> bool:
+        """Invalidate the cached responses of the given collections or the whole cache when ``None``.
+
+        :return: ``False`` when the backend is not available, i.e. the responses may not be invalidated.
+        """
+        names = [_ALL] if collections is None else [*collections, _ANY_COLLECTION]
+        results = [self.backend.incr(self._counter_key(name)) for name in names]
+        return all(result is not None for result in results)
+
+    @staticmethod
+    def _counter_key(name: str) -> str:
+        return f"{KEY_PREFIX}:generation:{name}"
+
+
+def normalize_parameters(parameters: dict) -> Optional[dict]:
+    """Normalize the search parameters, so the equivalent searches share the same cache key.
+
+    The lists (``collections``, ``ids`` and ``bbox``) may be given as comma-separated strings,
+    numbers may be given as strings and the order of collections and ids does not matter.
+
+    :return: The normalized parameters or ``None`` when the parameters are invalid.
+    """
+    normalized = {}
+    try:
+        for name, value in parameters.items():
+            if value is None:
+                continue
+
+            if name in _LIST_PARAMETERS:
+                value = sorted(set(value.split(",") if isinstance(value, str) else value))
+            elif name == "bbox":
+                value = [float(v) for v in (value.split(",") if isinstance(value, str) else value)]
+            elif name in ("limit", "page"):
+                value = int(value)
+            normalized[name] = value
+    except (TypeError, ValueError):
+        return None
+
+    return normalized
+
+
+def create_search_cache(
+    url: Optional[str], maxsize: int = 256, ttl: int = 60, version: Optional[Callable] = None
+) -> Optional[SearchCache]:
+    """Create the search cache from the configuration. See ``BDC_STAC_SEARCH_CACHE``.
+
+    :param url: Use ``memory`` for the in-process backend or a Redis URL (``redis://``, ``rediss://`` or ``unix://``).
+    :param maxsize: The maximum number of responses in the in-process backend.
+    :param ttl: The time-to-live of the cached responses.
+    :param version: Function which retrieves the version of the searched items. See :class:`SearchCache`.
+    :return: The search cache or ``None`` when disabled.
+    """
+    if not url or ttl <= 0:
+        return None
+
+    if url == "memory":
+        return SearchCache(MemoryBackend(maxsize=maxsize, ttl=ttl), ttl=ttl, version=version)
+
+    if url.split("://")[0] in ("redis", "rediss", "unix"):
+        return SearchCache(RedisBackend(url), ttl=ttl, version=version)
+
+    raise ValueError(f"Invalid search cache {url}. Use 'memory' or a Redis URL.")
@@ -0,0 +1,74 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Utilities to stream GeoJSON FeatureCollection responses.
+
+The FeatureCollection document is written incrementally: the document header,
+each feature as soon as it is built and, at last, the members that depend on
+the whole page (``links`` and ``context``).
+
+.. versionadded:: 1.1
+"""
+from typing import Callable, Iterable, Iterator, List
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+"""Minimum size in bytes of each chunk written to the client."""
+
+
+def iter_feature_collection(
+    document: dict,
+    chunks: Iterable[List],
+    make_features: Callable[[List], List[str]],
+    finalize: Callable[[], dict],
+    dumps: Callable[[dict], str],
+) -> Iterator[str]:
+    """Serialize a FeatureCollection incrementally.
+
+    :param document: The FeatureCollection members written before ``features``.
+    :param chunks: The item rows grouped in chunks.
+    :param make_features: Function to build the serialized GeoJSON features of a chunk of rows.
+    :param finalize: Function called after all features were written. It returns
+        the FeatureCollection members written after ``features``.
+    :param dumps: Function to serialize a JSON object.
+    """
+    head = dumps(document)
+    yield f'{head[:-1]}{"," if document else ""}"features":['
+
+    separator = ""
+    for chunk in chunks:
+        for feature in make_features(chunk):
+            yield separator
+            yield feature
+            separator = ","
+
+    tail = dumps(finalize())
+    yield f']{"," + tail[1:] if len(tail) > 2 else "}"}'
+
+
+def buffered(parts: Iterable[str], size: int = DEFAULT_BUFFER_SIZE) -> Iterator[bytes]:
+    """Join small string parts into encoded chunks of at least ``size`` bytes."""
+    buffer, length = [], 0
+    for part in parts:
+        data = part.encode("utf-8")
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+
+    if buffer:
+        yield b"".join(buffer)
@@ -18,29 +18,65 @@
 """Routes for the BDC-STAC API."""
 
 
-import gzip
+from datetime import datetime
+from typing import Optional
 from urllib.parse import urlencode
 
 from bdc_auth_client.decorators import oauth2
-from flask import abort, current_app, request
+from flask import abort, current_app, request, stream_with_context
 from werkzeug.exceptions import HTTPException, InternalServerError
+from werkzeug.http import http_date, quote_etag
 
 from . import config
+from .cache import add_reload_hook, register_cache
+from .compression import available_encodings, compress_cached, compress_stream, negotiate_encoding
+from .conditional import encoded_etag, is_not_modified, last_modified, make_etag
 from .controller import (
     get_catalog,
     get_collection_items,
     get_collections,
+    get_collections_stamp,
+    get_item_stamp,
+    get_items_stamp,
+    item_fragments_enabled,
+    item_stamp,
     make_geojson,
+    make_geojson_fragments,
     parse_fields_parameter,
+    resolve_base_file_root_url,
     resolve_stac_url,
+    roles_key,
+    search_session,
     session,
 )
+from .cql2 import CONFORMANCE_CLASSES as CQL2_CONFORMANCE_CLASSES
+from .database import checkout_wait, start_checkout_timer
+from .queryables import queryables_schema
+from .search_cache import create_search_cache
+from .streaming import buffered, iter_feature_collection
+
+_encodings = available_encodings(
+    [encoding.strip() for encoding in config.BDC_STAC_COMPRESSION_ENCODINGS.split(",") if encoding.strip()]
+)
+_compressed_cache = register_cache(
+    "compressed", maxsize=config.BDC_STAC_COMPRESSION_CACHE_SIZE, ttl=config.BDC_STAC_COMPRESSION_CACHE_TTL
+)
+_search_cache = create_search_cache(
+    config.BDC_STAC_SEARCH_CACHE,
+    maxsize=config.BDC_STAC_SEARCH_CACHE_SIZE,
+    ttl=config.BDC_STAC_SEARCH_CACHE_TTL,
+    version=get_items_stamp,
+)
+if _search_cache is not None:
+    # Discard the cached searches when the collections change
+    add_reload_hook(_search_cache.invalidate)
 
 
 @current_app.teardown_appcontext
 def teardown_appcontext(exceptions=None):
     """Teardown appcontext."""
     session.remove()
+    search_session.remove()
 
 
 @current_app.before_request
@@ -48,6 +84,9 @@ def before_request():
     """Handle for before request processing."""
     request.assets_kwargs = ""
 
+    if config.BDC_STAC_SERVER_TIMING:
+        start_checkout_timer()
+
     if config.BDC_STAC_ASSETS_ARGS:
         assets_kwargs = {
             arg: request.args.get(arg)
@@ -67,22 +106,27 @@ def after_request(response):
     response.headers.add("Access-Control-Allow-Headers", "Content-Type")
     response.headers.add("Access-Control-Allow-Methods", "GET, POST")
 
-    accept_encoding = request.headers.get("Accept-Encoding", "")
+    wait = checkout_wait() if config.BDC_STAC_SERVER_TIMING else None
+    if wait is not None:
+        # Streamed responses only report the connections retrieved before the response starts
+        response.headers.add("Server-Timing", f"db-checkout;dur={wait * 1000:.2f}")
 
-    if (
-        response.status_code < 200
-        or response.status_code >= 300
-        or response.direct_passthrough
-        or len(response.get_data()) < 500
-        or "gzip" not in accept_encoding.lower()
-        or "Content-Encoding" in response.headers
-    ):
+    if response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough:
         return response
 
-    compressed_data = gzip.compress(response.get_data(), compresslevel=4)
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), _encodings)
+    if encoding is None or len(response.get_data()) < config.BDC_STAC_COMPRESSION_MIN_SIZE:
+        return response
 
-    response.set_data(compressed_data)
-    response.headers["Content-Encoding"] = "gzip"
+    response.set_data(compress_cached(response.get_data(), encoding, _compressed_cache))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(encoded_etag(etag, encoding))
     response.headers["Content-Length"] = len(response.get_data())
 
     return response
@@ -97,6 +141,7 @@ def conformance():
             "http://www.opengis.net/spec/wfs-1/3.0/req/oas30",
             "http://www.opengis.net/spec/wfs-1/3.0/req/html",
             "http://www.opengis.net/spec/wfs-1/3.0/req/geojson",
+            *CQL2_CONFORMANCE_CLASSES,
         ]
     }
 
@@ -138,6 +183,12 @@ def index(roles=None, **kwargs):
             "type": config.STAC_GEO_MEDIA_TYPE,
             "title": "STAC-Search endpoint",
         },
+        {
+            "href": f"{resolve_stac_url()}/queryables",
+            "rel": "http://www.opengis.net/def/rel/ogc/1.0/queryables",
+            "type": "application/schema+json",
+            "title": "Queryable properties of the filter",
+        },
     ]
 
     for collection in catalog:
@@ -167,6 +218,7 @@ def index(roles=None, **kwargs):
             "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/core",
             "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/oas30",
             "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/geojson",
+            *CQL2_CONFORMANCE_CLASSES,
         ],
     }
 
@@ -175,7 +227,12 @@ def index(roles=None, **kwargs):
 @oauth2(required=False)
 def root(roles=None, **kwargs):
     """Object with a list of Collections contained in the catalog and links."""
-    collections = get_collections(roles=roles, assets_kwargs=request.assets_kwargs)
+    stamp = get_collections_stamp()
+    not_modified, headers = _conditional("collections", stamp, roles)
+    if not_modified is not None:
+        return not_modified
+
+    collections = get_collections(roles=roles, assets_kwargs=request.assets_kwargs, stamp=stamp)
 
     links = [
         {
@@ -192,7 +249,7 @@ def root(roles=None, **kwargs):
         },
     ]
 
-    return {"collections": collections, "links": links}
+    return {"collections": collections, "links": links}, headers
 
 
 @current_app.route("/collections/<collection_id>", methods=["GET"])
@@ -203,12 +260,47 @@ def collections_id(collection_id, roles=None, **kwargs):
     :param collection_id: identifier (name) of a specific collection
     :param roles: The OAuth 2 user roles
     """
-    collection = get_collections(collection_id, roles=roles, assets_kwargs=request.assets_kwargs)
+    stamp = get_collections_stamp()
+    not_modified, headers = _conditional(f"collections/{collection_id}", stamp, roles)
+    if not_modified is not None:
+        return not_modified
+
+    collection = get_collections(collection_id, roles=roles, assets_kwargs=request.assets_kwargs, stamp=stamp)
 
     if not len(collection):
         abort(404, "Collection not found.")
 
-    return collection[0]
+    return collection[0], headers
+
+
+@current_app.route("/queryables", methods=["GET"])
+def queryables():
+    """Describe the queryable properties of the Filter extension, as JSON Schema."""
+    schema = queryables_schema(f"{resolve_stac_url()}/queryables", title=f"Queryables for {config.BDC_STAC_TITLE}")
+
+    return current_app.response_class(
+        current_app.json.dumps(schema), headers={"content-type": "application/schema+json"}
+    )
+
+
+@current_app.route("/collections/<collection_id>/queryables", methods=["GET"])
+@oauth2(required=False)
+def collection_queryables(collection_id, roles=None, **kwargs):
+    """Describe the queryable properties of the given collection, as JSON Schema.
+
+    :param collection_id: identifier (name) of a specific collection
+    :param roles: List of roles from context user
+    """
+    if not get_collections(collection_id, roles=roles, assets_kwargs=request.assets_kwargs):
+        abort(404, "Collection not found.")
+
+    schema = queryables_schema(
+        f"{resolve_stac_url()}/collections/{collection_id}/queryables", title=f"Queryables for {collection_id}"
+    )
+
+    return current_app.response_class(
+        current_app.json.dumps(schema), headers={"content-type": "application/schema+json"}
+    )
 
 
 @current_app.route("/collections/<collection_id>/items", methods=["GET"])
@@ -219,45 +311,57 @@ def collection_items(collection_id, roles=None, **kwargs):
     :param collection_id: identifier (name) of a specific collection
     :param roles: List of roles from context user
     """
+    options = _collection_items_options()
+    items = get_collection_items(collection_id=collection_id, roles=roles, **options)
+
+    return _collection_items_response(collection_id, items)
+
+
+def _collection_items_options() -> dict:
+    """Build the parameters of :func:`get_collection_items` for the collection items of the current request."""
     _, exclude = parse_fields_parameter(request.args.get("fields"))
     options = request.args.to_dict()
     options["exclude"] = exclude
+    options["stream"] = config.BDC_STAC_STREAM_ITEMS
+    return options
 
-    items = get_collection_items(collection_id=collection_id, roles=roles, **options)
-
-    features = make_geojson(items.items, assets_kwargs=request.assets_kwargs)
 
+def _collection_items_response(collection_id: str, items):
+    """Build the FeatureCollection response of the collection items."""
     extensions = ["checksum", "context"]
 
     item_collection = {
         "stac_version": config.BDC_STAC_API_VERSION,
         "stac_extensions": extensions,
         "type": "FeatureCollection",
-        "links": [],
-        "context": {"matched": items.total, "returned": len(items.items), "limit": items.per_page},
-        "features": features,
     }
 
-    args = request.args.copy()
-
-    if items.has_next:
-        args["page"] = items.next_num
-        item_collection["links"].append(
-            {
-                "href": f"{resolve_stac_url()}/collections/{collection_id}/items{f'?{urlencode(args)}' if len(args) > 0 else ''}",
-                "rel": "next",
-            }
-        )
-    if items.has_prev:
-        args["page"] = items.prev_num
-        item_collection["links"].append(
-            {
-                "href": f"{resolve_stac_url()}/collections/{collection_id}/items{f'?{urlencode(args)}' if len(args) > 0 else ''}",
-                "rel": "prev",
-            }
-        )
-
-    return item_collection, {"content-type": config.STAC_GEO_MEDIA_TYPE}
+    def _links():
+        links = []
+        args = request.args.copy()
+
+        next_token = items.next_token
+        if next_token is not None:
+            args.pop("page", None)
+            args["token"] = next_token
+            links.append(
+                {
+                    "href": f"{resolve_stac_url()}/collections/{collection_id}/items{f'?{urlencode(args)}' if len(args) > 0 else ''}",
+                    "rel": "next",
+                }
+            )
+        if items.has_prev:
+            args.pop("token", None)
+            args["page"] = items.prev_num
+            links.append(
+                {
+                    "href": f"{resolve_stac_url()}/collections/{collection_id}/items{f'?{urlencode(args)}' if len(args) > 0 else ''}",
+                    "rel": "prev",
+                }
+            )
+        return links
+
+    return _feature_collection(item_collection, items, _links, limit=items.per_page)
 
 
 @current_app.route("/collections/<collection_id>/items/<item_id>", methods=["GET"])
@@ -269,14 +373,42 @@ def items_id(collection_id, item_id, roles=None, **kwargs):
     :param item_id: identifier (name) of a specific item
     :param roles: List of roles from context user
     """
-    item = get_collection_items(collection_id=collection_id, roles=roles, item_id=item_id)
-
-    if not item.total:
+    # The geometry parameters change the item representation
+    geometry_args = {arg: request.args[arg] for arg in ("simplify", "precision") if arg in request.args}
+    resource = f"collections/{collection_id}/items/{item_id}"
+    if geometry_args:
+        resource = f"{resource}?{urlencode(geometry_args)}"
+
+    # Check the client cache with the item stamp before loading and building the item
+    conditional = bool(request.if_none_match) or request.if_modified_since is not None
+    if conditional:
+        stamp = get_item_stamp(collection_id, item_id, roles=roles)
+        if stamp is None:
+            abort(404, f"Invalid item id '{item_id}' for collection '{collection_id}'")
+
+        not_modified, headers = _conditional(resource, stamp, roles)
+        if not_modified is not None:
+            return not_modified
+
+    item = get_collection_items(
+        collection_id=collection_id, roles=roles, item_id=item_id, count="none", **geometry_args
+    )
+
+    if not item.items:
         abort(404, f"Invalid item id '{item_id}' for collection '{collection_id}'")
 
+    if not conditional:
+        # The item row includes its stamp
+        _, headers = _conditional(resource, item_stamp(item.items[0]), roles)
+    headers["content-type"] = config.STAC_GEO_MEDIA_TYPE
+
+    if item_fragments_enabled():
+        feature = make_geojson_fragments(item.items, assets_kwargs=request.assets_kwargs)[0]
+        return current_app.response_class(feature, headers=headers)
+
     item = make_geojson(item.items, assets_kwargs=request.assets_kwargs)[0]
 
-    return item, {"content-type": config.STAC_GEO_MEDIA_TYPE}
+    return item, headers
 
 
 @current_app.route("/search", methods=["POST"])
@@ -288,90 +420,250 @@ def stac_search_post(roles=None, **kwargs):
 
     args = request.args.to_dict()
     _, exclude = parse_fields_parameter(args.get("fields"))
-    options = request.json
+    options = dict(request.json)
     for key in ["limit", "page"]:
         if args.get(key):
             args[key] = int(args[key])
 
     options.update(args)
+    # The body of the pagination links, without the internal options of the search
+    body = dict(options)
+
+    cache_key = _search_cache_key(options, roles)
+    cached = _get_cached_search(cache_key)
+    if cached is not None:
+        return cached
+
     options["exclude"] = exclude
+    options["stream"] = config.BDC_STAC_STREAM_ITEMS
     items = get_collection_items(**options, roles=roles)
-    features = make_geojson(items.items, exclude=exclude, assets_kwargs=request.assets_kwargs)
 
-    response = {
-        "type": "FeatureCollection",
-        "links": [],
-        "context": {
-            "matched": items.total,
-            "returned": len(items.items),
-        },
-        "features": features,
-    }
-    if items.has_next:
-        next_links = dict(href=f"{resolve_stac_url()}/search{request.assets_kwargs}", rel="next")
+    response = {"type": "FeatureCollection"}
 
-        next_links["body"] = request.json.copy()
-        next_links["body"]["page"] = items.next_num
-        next_links["method"] = "POST"
-        next_links["merge"] = True
-        response["links"].append(next_links)
+    def _links():
+        links = []
+        next_token = items.next_token
+        if next_token is not None:
+            next_links = dict(href=f"{resolve_stac_url()}/search{request.assets_kwargs}", rel="next")
 
-    if items.has_prev:
-        prev_links = dict(href=f"{resolve_stac_url()}/search{request.assets_kwargs}", rel="prev")
+            next_links["body"] = dict(body)
+            next_links["body"].pop("page", None)
+            next_links["body"]["token"] = next_token
+            next_links["method"] = "POST"
+            next_links["merge"] = True
+            links.append(next_links)
 
-        prev_links["body"] = request.json.copy()
-        prev_links["body"]["page"] = items.prev_num
-        prev_links["method"] = "POST"
-        prev_links["merge"] = True
-        response["links"].append(prev_links)
+        if items.has_prev:
+            prev_links = dict(href=f"{resolve_stac_url()}/search{request.assets_kwargs}", rel="prev")
 
-    return response, {"content-type": config.STAC_GEO_MEDIA_TYPE}
+            prev_links["body"] = dict(body)
+            prev_links["body"].pop("token", None)
+            prev_links["body"]["page"] = items.prev_num
+            prev_links["method"] = "POST"
+            prev_links["merge"] = True
+            links.append(prev_links)
+        return links
+
+    return _set_cached_search(cache_key, _feature_collection(response, items, _links, exclude=exclude))
 
 
 @current_app.route("/search", methods=["GET"])
 @oauth2(required=False, throw_exception=False)
 def stac_search_get(roles=None, **kwargs):
     """Search STAC items with simple filtering."""
+    options, cache_key = _search_get_options(roles)
+    cached = _get_cached_search(cache_key)
+    if cached is not None:
+        return cached
+
+    items = get_collection_items(**options, roles=roles)
+
+    return _search_get_response(items, options["exclude"], cache_key)
+
+
+def _search_get_options(roles=None):
+    """Build the parameters of :func:`get_collection_items` for the search of the current request (``GET``).
+
+    :return: The search parameters and the search cache key.
+    """
     _, exclude = parse_fields_parameter(request.args.get("fields"))
     options = request.args.to_dict()
+
+    cache_key = _search_cache_key(options, roles)
+
     options["exclude"] = exclude
-    items = get_collection_items(**request.args, roles=roles)
+    options["stream"] = config.BDC_STAC_STREAM_ITEMS
+    return options, cache_key
 
-    features = make_geojson(items.items, exclude=exclude, assets_kwargs=request.assets_kwargs)
 
-    response = {
-        "type": "FeatureCollection",
-        "links": [],
-        "context": {
-            "matched": items.total,
-            "returned": len(items.items),
-        },
-        "features": features,
-    }
+def _search_get_response(items, exclude, cache_key: Optional[str]):
+    """Build the FeatureCollection response of a search (``GET``) and store it in the search cache."""
+    response = {"type": "FeatureCollection"}
 
-    args = request.args.copy()
+    def _links():
+        links = []
+        args = request.args.copy()
 
-    if items.has_next:
-        args["page"] = items.next_num
+        next_token = items.next_token
+        if next_token is not None:
+            args.pop("page", None)
+            args["token"] = next_token
 
-        response["links"].append(
-            {
-                "href": f"{resolve_stac_url()}/search{f'?{urlencode(args)}' if len(args) > 0 else ''}",
-                "rel": "next",
-            }
-        )
+            links.append(
+                {
+                    "href": f"{resolve_stac_url()}/search{f'?{urlencode(args)}' if len(args) > 0 else ''}",
+                    "rel": "next",
+                }
+            )
 
-    if items.has_prev:
-        args["page"] = items.prev_num
+        if items.has_prev:
+            args.pop("token", None)
+            args["page"] = items.prev_num
 
-        response["links"].append(
-            {
-                "href": f"{resolve_stac_url()}/search{f'?{urlencode(args)}' if len(args) > 0 else ''}",
-                "rel": "prev",
-            }
-        )
+            links.append(
+                {
+                    "href": f"{resolve_stac_url()}/search{f'?{urlencode(args)}' if len(args) > 0 else ''}",
+                    "rel": "prev",
+                }
+            )
+        return links
+
+    return _set_cached_search(cache_key, _feature_collection(response, items, _links, exclude=exclude))
+
+
+def _feature_collection(document: dict, items, make_links, exclude=None, **kwargs):
+    """Build the FeatureCollection response for a page of items.
+
+    When the items are streamed, the features are serialized as soon as they are read
+    and the members ``links`` and ``context`` are written after them.
+
+    :param document: The FeatureCollection members, except ``links``, ``context`` and ``features``.
+    :param items: The page of items.
+    :param make_links: Function to build the navigation links. It is called after the items are consumed.
+    :param exclude: The feature properties to exclude.
+    :param kwargs: Extra members for the ``context``.
+    """
+    headers = {"content-type": config.STAC_GEO_MEDIA_TYPE}
+
+    if items.is_streamed:
+        return _stream_feature_collection(document, items, make_links, exclude, headers, **kwargs)
+
+    if not exclude and item_fragments_enabled():
+        # Splice the serialized items into the document instead of serializing them again
+        features = make_geojson_fragments(items.items, assets_kwargs=request.assets_kwargs, processors=items.processors)
+        document["links"] = make_links()
+        document["context"] = _make_context(items, **kwargs)
+        parts = iter_feature_collection(document, [features], lambda chunk: chunk, dict, current_app.json.dumps)
+        return current_app.response_class("".join(parts), headers=headers)
 
-    return response, {"content-type": config.STAC_GEO_MEDIA_TYPE}
+    features = make_geojson(
+        items.items, exclude=exclude, assets_kwargs=request.assets_kwargs, processors=items.processors
+    )
+    document["links"] = make_links()
+    document["context"] = _make_context(items, **kwargs)
+    document["features"] = features
+
+    return document, headers
+
+
+def _stream_feature_collection(document: dict, items, make_links, exclude, headers, **kwargs):
+    assets_kwargs = request.assets_kwargs
+    use_fragments = not exclude and item_fragments_enabled()
+    dumps = current_app.json.dumps
+
+    def _make_features(chunk):
+        if use_fragments:
+            return make_geojson_fragments(chunk, assets_kwargs=assets_kwargs)
+        return [dumps(feature) for feature in make_geojson(chunk, exclude=exclude, assets_kwargs=assets_kwargs)]
+
+    def _finalize():
+        return {"links": make_links(), "context": _make_context(items, **kwargs)}
+
+    parts = iter_feature_collection(document, items.iter_chunks(), _make_features, _finalize, dumps)
+    body = buffered(parts)
+
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), _encodings)
+    if encoding is not None:
+        body = compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return current_app.response_class(stream_with_context(body), headers=headers)
+
+
+def _search_cache_key(parameters: dict, roles=None) -> Optional[str]:
+    """Build the search cache key for the current request. It is ``None`` when the cache is disabled."""
+    if _search_cache is None:
+        return None
+
+    context = (request.method, resolve_stac_url(), resolve_base_file_root_url(), request.assets_kwargs)
+    return _search_cache.make_key(parameters, roles=roles_key(roles), context=context)
+
+
+def _get_cached_search(key: Optional[str]):
+    """Retrieve the cached response of a search."""
+    if key is None:
+        return None
+
+    body = _search_cache.get(key)
+    if body is None:
+        return None
+
+    return current_app.response_class(body, headers={"content-type": config.STAC_GEO_MEDIA_TYPE})
+
+
+def _set_cached_search(key: Optional[str], rv):
+    """Store the response of a search in cache. Streamed responses are not cached."""
+    if key is None:
+        return rv
+
+    response = current_app.make_response(rv)
+    if response.status_code == 200 and not response.is_streamed:
+        _search_cache.set(key, response.get_data())
+    return response
+
+
+def _conditional(resource: str, stamp: tuple, roles=None):
+    """Build the validators (``ETag`` and ``Last-Modified``) of a resource for the current request.
+
+    :param resource: The resource path.
+    :param stamp: The version stamp of the resource rows. See :mod:`bdc_stac.conditional`.
+    :param roles: The user roles.
+    :return: The ``304 Not Modified`` response when the client representation is fresh (or ``None``)
+        and the validator headers.
+    """
+    etag = make_etag(
+        resource,
+        stamp,
+        roles_key(roles),
+        resolve_stac_url(),
+        resolve_base_file_root_url(),
+        request.assets_kwargs,
+        config.BDC_STAC_API_VERSION,
+    )
+    modified = last_modified(*(value for value in stamp if isinstance(value, datetime)))
+
+    headers = {"ETag": quote_etag(etag)}
+    if modified is not None:
+        headers["Last-Modified"] = http_date(modified)
+
+    if is_not_modified(request, etag, modified):
+        return current_app.response_class(status=304, headers=headers), headers
+    return None, headers
+
+
+def _make_context(items, **kwargs) -> dict:
+    """Build the STAC API ``context`` for a page of items.
+
+    The number of matched items is omitted when the count was skipped and
+    ``bdc:count`` describes which kind of count was returned.
+    """
+    context = {}
+    if items.total is not None:
+        context["matched"] = items.total
+    context["returned"] = items.returned
+    context.update(kwargs)
+    context["bdc:count"] = items.count_mode
+    return context
 
 
 @current_app.errorhandler(Exception)
@@ -0,0 +1,97 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Benchmark the item processors lookup used by ``make_geojson``.
+
+Compare the legacy strategy (one query per item) with the bulk lookup
+(one query per page), reporting the number of SQL statements and the
+elapsed time for each page size::
+
+    python -m benchmarks.bench_item_processors --collection S2-16D-2 --sizes 10,100,1000
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+
+from bdc_stac import create_app
+from bdc_stac.controller import db, get_collection_items, get_item_processors, get_items_processors
+
+
+class QueryCounter:
+    """Count the SQL statements issued by an engine."""
+
+    def __init__(self, engine):
+        """Attach the counter to the given engine."""
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        """Start counting."""
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *args):
+        """Stop counting."""
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def _legacy(item_ids):
+    return {item_id: get_item_processors(item_id) for item_id in item_ids}
+
+
+def run(collection, sizes, repeat):
+    """Run the benchmark for each page size."""
+    app = create_app()
+
+    with app.test_request_context():
+        engine = db.get_engine()
+
+        print(f"{'page size':>10} {'strategy':>10} {'queries':>8} {'time (ms)':>10}")
+        for size in sizes:
+            page = get_collection_items(collection_id=collection, limit=size)
+            item_ids = [item.id for item in page.items]
+
+            for name, strategy in (("per-item", _legacy), ("bulk", get_items_processors)):
+                elapsed = []
+                with QueryCounter(engine) as counter:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        strategy(item_ids)
+                        elapsed.append(time.perf_counter() - start)
+
+                queries = counter.count // repeat
+                print(f"{len(item_ids):>10} {name:>10} {queries:>8} {min(elapsed) * 1000:>10.2f}")
+
+
+def main():
+    """Parse command line arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection", default=None, help="Collection identifier (name-version)")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated list of page sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per page size")
+    args = parser.parse_args()
+
+    run(args.collection, [int(size) for size in args.sizes.split(",")], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
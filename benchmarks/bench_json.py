@@ -0,0 +1,122 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Compare the JSON encoders of ``STACJSONProvider`` on pages of STAC Items.
+
+The pages are synthetic FeatureCollections shaped like the ``/search`` responses,
+including ``datetime`` and ``Decimal`` values as the ones from ``Item.metadata_``::
+
+    python -m benchmarks.bench_json --items 1000 --bands 13
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+
+from bdc_stac.json_provider import STACJSONProvider, orjson
+
+
+def make_page(items, bands):
+    """Build a synthetic FeatureCollection."""
+    start = datetime(2021, 1, 1)
+    features = []
+    for index in range(items):
+        date = start + timedelta(days=index)
+        item_id = f"S2-16D_V2_020020_{date:%Y%m%d}"
+        assets = {
+            f"B{band:02d}": {
+                "href": f"https://data.example.com/s2/{item_id}/B{band:02d}.tif",
+                "type": "image/tiff; application=geotiff",
+                "roles": ["data"],
+                "eo:bands": [dict(name=f"B{band:02d}", common_name=f"band{band}", min=0.0, max=10000.0, nodata=0.0)],
+            }
+            for band in range(bands)
+        }
+        features.append(
+            {
+                "type": "Feature",
+                "id": item_id,
+                "collection": "S2-16D-2",
+                "stac_version": "1.0.0",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[-46.0, -13.0], [-45.0, -13.0], [-45.0, -12.0], [-46.0, -12.0], [-46.0, -13.0]]],
+                },
+                "bbox": [-46.0, -13.0, -45.0, -12.0],
+                "properties": {
+                    "datetime": date,
+                    "start_datetime": date,
+                    "end_datetime": date + timedelta(days=15),
+                    "eo:cloud_cover": Decimal("12.5"),
+                    "bdc:tiles": ["020020"],
+                    "instruments": ["MSI"],
+                },
+                "links": [
+                    {"href": f"https://stac.example.com/collections/S2-16D-2/items/{item_id}", "rel": "self"},
+                    {"href": "https://stac.example.com/collections/S2-16D-2", "rel": "parent"},
+                ],
+                "assets": assets,
+            }
+        )
+
+    return {"type": "FeatureCollection", "features": features, "context": {"returned": items}}
+
+
+def _best(fn, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed) * 1000
+
+
+def run(items, bands, repeat):
+    """Run the benchmark."""
+    page = make_page(items, bands)
+    encoders = ["stdlib"] + (["orjson"] if orjson is not None else [])
+    if orjson is None:
+        print("orjson is not installed, use 'pip install bdc-stac[orjson]'")
+
+    for encoder in encoders:
+        app = Flask(__name__)
+        app.json = STACJSONProvider(app, encoder=encoder)
+        app.json.compact = True
+        app.json.sort_keys = False
+
+        with app.app_context():
+            size = len(app.json.dumps(page))
+            dumps = _best(lambda: app.json.dumps(page), repeat)
+            response = _best(lambda: app.json.response(page), repeat)
+        print(f"{encoder} ({items} items, {size / 1024:.0f} KiB): dumps {dumps:.2f} ms, response {response:.2f} ms")
+
+
+def main():
+    """Parse command line arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000, help="Number of items per page")
+    parser.add_argument("--bands", type=int, default=13, help="Number of bands (and band assets) per item")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs")
+    args = parser.parse_args()
+
+    run(args.items, args.bands, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
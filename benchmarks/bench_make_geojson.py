@@ -0,0 +1,151 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Micro-benchmark of the feature construction in ``make_geojson``.
+
+The item rows are synthetic and the database lookups (processors and EO bands)
+are replaced by in-memory values, so it only measures the Python work per page::
+
+    python -m benchmarks.bench_make_geojson --items 1000 --bands 13
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from unittest import mock
+
+import shapely.geometry
+from geoalchemy2.shape import from_shape
+
+from bdc_stac import create_app
+from bdc_stac.cache import TTLCache
+from bdc_stac.controller import make_geojson, make_geojson_fragments
+
+ItemRow = namedtuple(
+    "ItemRow",
+    "collection collection_type category item_meta item id collection_id start end created updated "
+    "cloud_cover footprint bbox tile assets",
+)
+
+
+def make_bands(count):
+    """Build synthetic EO bands."""
+    return [
+        dict(name=f"B{index:02d}", common_name=f"band{index}", min=0.0, max=10000.0, nodata=0.0, scale=0.0001)
+        for index in range(count)
+    ]
+
+
+def make_rows(count, bands):
+    """Build synthetic item rows, like the ones retrieved by ``get_collection_items``."""
+    geom = from_shape(shapely.geometry.box(-46.0, -13.0, -45.0, -12.0), srid=4326)
+    start = datetime(2021, 1, 1)
+    rows = []
+    for index in range(count):
+        date = start + timedelta(days=index)
+        assets = {band["name"]: {"href": f"/s2/{index}/{band['name']}.tif", "type": "image/tiff"} for band in bands}
+        assets["thumbnail"] = {"href": f"/s2/{index}/thumbnail.png", "type": "image/png"}
+        rows.append(
+            ItemRow(
+                collection="S2-16D-2",
+                collection_type="cube",
+                category="eo",
+                item_meta={"instruments": ["MSI"]},
+                item=f"S2-16D_V2_020020_{date:%Y%m%d}",
+                id=index,
+                collection_id=-1,
+                start=date,
+                end=date + timedelta(days=15),
+                created=date,
+                updated=date,
+                cloud_cover=10.0,
+                footprint=geom,
+                bbox=geom,
+                tile="020020",
+                assets=assets,
+            )
+        )
+    return rows
+
+
+def legacy_match(assets, bands):
+    """Match assets and bands scanning all the bands for each asset (nested loop)."""
+    for key, value in assets.items():
+        for band in bands:
+            if band["name"] == key:
+                value["eo:bands"] = [band]
+
+
+def indexed_match(assets, bands_index):
+    """Match assets and bands using the band name index."""
+    for key, value in assets.items():
+        eo_bands = bands_index.get(key)
+        if eo_bands is not None:
+            value["eo:bands"] = eo_bands
+
+
+def _best(fn, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed) * 1000
+
+
+def run(items, bands, repeat):
+    """Run the benchmark."""
+    eo_bands = make_bands(bands)
+    bands_index = {band["name"]: [band] for band in eo_bands}
+    pages = [make_rows(items, eo_bands) for _ in range(repeat)]
+
+    match = [row.assets for row in pages[0]]
+    legacy = _best(lambda: [legacy_match(assets, eo_bands) for assets in match], repeat)
+    indexed = _best(lambda: [indexed_match(assets, bands_index) for assets in match], repeat)
+    print(f"band matching ({items} items, {bands} bands): nested {legacy:.2f} ms, indexed {indexed:.2f} ms")
+
+    app = create_app()
+    with app.test_request_context(), mock.patch(
+        "bdc_stac.controller.get_items_processors", return_value={}
+    ), mock.patch("bdc_stac.controller.get_collection_eo", return_value={"eo:gsd": 10.0, "eo:bands": eo_bands}):
+        page = iter(pages)
+        elapsed = _best(lambda: make_geojson(next(page)), repeat)
+        print(f"make_geojson ({items} items): {elapsed:.2f} ms ({elapsed * 1000 / items:.1f} us per feature)")
+
+        dumps = app.json.dumps
+        elapsed = _best(lambda: [dumps(feature) for feature in make_geojson(pages[0])], repeat)
+        print(f"make_geojson + dumps ({items} items): {elapsed:.2f} ms")
+
+        with mock.patch("bdc_stac.controller._item_fragments_cache", TTLCache(maxsize=items, ttl=3600)):
+            make_geojson_fragments(pages[0])
+            elapsed = _best(lambda: make_geojson_fragments(pages[0]), repeat)
+            print(f"make_geojson_fragments, cached ({items} items): {elapsed:.2f} ms")
+
+
+def main():
+    """Parse command line arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000, help="Number of items per page")
+    parser.add_argument("--bands", type=int, default=13, help="Number of bands (and band assets) per item")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs")
+    args = parser.parse_args()
+
+    run(args.items, args.bands, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
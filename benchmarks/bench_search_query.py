@@ -0,0 +1,106 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+"""Micro-benchmark of the per-request construction of the item search query in ``get_collection_items``.
+
+It compares the search query built for each request with the cached search statement
+(``BDC_STAC_STATEMENT_CACHE_SIZE``) for a common search (collections, bbox, datetime and limit).
+The database lookups (collection identifiers and grid tiles) are replaced by in-memory values,
+so it only measures the Python work before the queries are sent::
+
+    python -m benchmarks.bench_search_query --repeat 2000
+
+The ``compile`` times include the compilation of the page and count statements before the execution:
+by the engine (using the SQLAlchemy compiled statement cache, which skips the statements with geometry
+columns) for the query built per request, and by :class:`bdc_stac.pagination.SearchStatement` for the
+cached statement.
+"""
+import argparse
+import time
+from unittest import mock
+
+from sqlalchemy import util
+from sqlalchemy.dialects import postgresql
+
+from bdc_stac import controller, create_app
+
+SEARCH = dict(
+    collections="S2-16D-2,LC8_30_16D_STK-1",
+    bbox="-46.0,-13.0,-45.0,-12.0",
+    datetime="2021-01-01/2021-06-30",
+    limit=10,
+)
+
+
+def compile_cached(statement, dialect, cache):
+    """Compile a statement using the compiled statement cache, like the engine does before the execution."""
+    if not hasattr(statement, "_compile_w_cache"):  # SQLAlchemy 1.3
+        return statement.compile(dialect=dialect)
+
+    return statement._compile_w_cache(dialect, compiled_cache=cache, column_keys=[])[0]
+
+
+def _per_request(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def run(repeat):
+    """Run the benchmark."""
+    dialect = postgresql.dialect()
+    compiled_cache = util.LRUCache(500)
+
+    def build():
+        return controller.get_collection_items(**SEARCH, prepare=True)
+
+    def build_and_compile():
+        search = build()
+        if search.statement is not None:
+            search.statement.compiled("offset", dialect)
+            search.statement.compiled(search.count, dialect)
+            return
+
+        compile_cached(search.page_query.statement, dialect, compiled_cache)
+        compile_cached(search.count_statement(), dialect, compiled_cache)
+
+    app = create_app()
+    with app.test_request_context(), mock.patch.object(
+        controller, "get_collection_ids", return_value=[1, 2]
+    ), mock.patch.object(controller, "_resolve_tile_ids", return_value=[10, 11, 12, 13]):
+        results = {}
+        for name, size in (("per request", 0), ("cached statement", 128)):
+            with mock.patch.object(controller._statements_cache, "maxsize", size):
+                build_and_compile()  # warm up
+                results[name] = (_per_request(build, repeat), _per_request(build_and_compile, repeat))
+
+    for name, (build_time, compile_time) in results.items():
+        print(f"{name:>16}: build {build_time:8.1f} us, build + compile {compile_time:8.1f} us per request")
+
+
+def main():
+    """Parse command line arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000, help="Number of searches")
+    args = parser.parse_args()
+
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
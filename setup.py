@@ -46,7 +46,11 @@ tests_require = [
 ]
 
 extras_require = {
+    "async": ["asgiref>=3.2", "asyncpg>=0.25", "SQLAlchemy[asyncio]>=1.4,<1.5"],
+    "compression": ["Brotli>=1.0", "zstandard>=0.15"],
     "docs": docs_require,
+    "orjson": ["orjson>=3.6"],
+    "redis": ["redis>=4.0"],
     "tests": tests_require,
 }
 
@@ -91,7 +95,9 @@ setup(
     zip_safe=False,
     include_package_data=True,
     platforms="any",
-    entry_points={},
+    entry_points={
+        "console_scripts": ["bdc-stac = bdc_stac.cli:cli"],
+    },
     extras_require=extras_require,
     install_requires=install_requires,
     setup_requires=setup_requires,
@@ -20,6 +20,7 @@ import json
 import os
 from unittest import mock
 
+import pytest
 from packaging import version
 
 os.environ["FILE_ROOT"] = "https://brazildatacube.dpi.inpe.br"
@@ -37,6 +38,16 @@ class TestBDCStac:
         parsed = version.parse(data["stac_version"])
         assert parsed.base_version == "1.0.0"
 
+    def test_landing_page_catalog_cache(self, client):
+        from bdc_stac.cache import TTLCache
+
+        with mock.patch("bdc_stac.controller._catalog_cache", TTLCache(maxsize=10, ttl=60)):
+            expected = client.get("/").json
+
+            with mock.patch("bdc_stac.controller.session") as session:
+                assert client.get("/").json == expected
+                assert not session.query.called
+
     def test_conformance(self, client):
         response = client.get("/conformance")
 
@@ -68,6 +79,22 @@ class TestBDCStac:
         eo_uri = config.get_stac_extensions("eo")[0]
         assert eo_uri in data["stac_extensions"]
 
+    def test_collections_cache_stac_url(self, client):
+        from bdc_stac.controller import invalidate_collections_cache
+
+        invalidate_collections_cache()
+        headers = {"X-Stac-Url": "https://stac.example.com"}
+        first = client.get("/collections/S2-16D-2", headers=headers).json
+        second = client.get("/collections/S2-16D-2?access_token=secret").json
+
+        self_links = [link["href"] for link in first["links"] if link["rel"] == "self"]
+        assert self_links == ["https://stac.example.com/collections/S2-16D-2"]
+        self_links = [link["href"] for link in second["links"] if link["rel"] == "self"]
+        assert self_links == [f"{config.BDC_STAC_BASE_URL}/collections/S2-16D-2?access_token=secret"]
+
+        first.pop("links"), second.pop("links")
+        assert first == second
+
     def test_collection_successor_predecessor(self, client):
         def _assert_collection_versioning(collection_name, kind):
             collection = self._get_collection(collection_name, client)
@@ -98,6 +125,30 @@ class TestBDCStac:
         assert len(feature["assets"]) > 0
         assert (data["context"]["matched"]) > 0
 
+    def test_collection_items_eo_bands(self, client):
+        collection = self._get_collection("S2-16D-2", client)
+        band_names = {band["name"] for band in collection["properties"].get("eo:bands", [])}
+
+        data = client.get("/collections/S2-16D-2/items?limit=5").json
+        for feature in data["features"]:
+            for key, asset in feature["assets"].items():
+                if key in band_names:
+                    assert [band["name"] for band in asset["eo:bands"]] == [key]
+                else:
+                    assert "eo:bands" not in asset
+
+    def test_collection_items_geometry_from_db(self, client):
+        expected = client.get("/collections/S2-16D-2/items?limit=5").json
+
+        with mock.patch("bdc_stac.controller.BDC_STAC_GEOMETRY_FROM_DB", True):
+            data = client.get("/collections/S2-16D-2/items?limit=5").json
+
+        for feature, expected_feature in zip(data["features"], expected["features"]):
+            assert feature["id"] == expected_feature["id"]
+            assert feature["geometry"]["type"] == expected_feature["geometry"]["type"]
+            assert len(feature["geometry"]["coordinates"][0]) == len(expected_feature["geometry"]["coordinates"][0])
+            assert [round(v, 6) for v in feature["bbox"]] == [round(v, 6) for v in expected_feature["bbox"]]
+
     def test_collection_items_id(self, client):
         item_id = "S2-16D_V2_020020_20210525"
         response = client.get(f"/collections/S2-16D-2/items/{item_id}")
@@ -108,11 +159,186 @@ class TestBDCStac:
 
         assert data["id"] == item_id
 
+    def test_conditional_requests(self, client):
+        item_url = "/collections/S2-16D-2/items/S2-16D_V2_020020_20210525"
+        for url in ["/collections", "/collections/S2-16D-2", item_url]:
+            response = client.get(url)
+            assert response.status_code == 200
+            etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+            response = client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert not response.data and response.headers["ETag"] == etag
+
+            response = client.get(url, headers={"If-Modified-Since": last_modified})
+            assert response.status_code == 304
+
+            response = client.get(url, headers={"If-None-Match": '"outdated"', "If-Modified-Since": last_modified})
+            assert response.status_code == 200
+
+            # The validators depend on the rendered URLs
+            response = client.get(url, headers={"If-None-Match": etag, "X-Stac-Url": "https://stac.example.com"})
+            assert response.status_code == 200
+
+        response = client.get(item_url, headers={"Accept-Encoding": "gzip"})
+        assert response.content_encoding == "gzip" and response.headers["ETag"].endswith('-gzip"')
+        response = client.get(item_url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+
+    def test_conditional_requests_bands(self, client):
+        from datetime import timedelta
+
+        from bdc_catalog.models import Band, Collection, db
+
+        urls = ["/collections", "/collections/S2-16D-2", "/collections/S2-16D-2/items/S2-16D_V2_020020_20210525"]
+        etags = [client.get(url).headers["ETag"] for url in urls]
+
+        # The collection documents and the items change with the bands
+        with client.application.app_context():
+            band = Band.query().join(Collection, Collection.id == Band.collection_id)
+            band = band.filter(Collection.identifier == "S2-16D-2").first()
+            band.updated = band.updated + timedelta(seconds=1)
+            db.session.commit()
+
+        for url, etag in zip(urls, etags):
+            assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
     def test_collection_items_id_error(self, client):
         response = client.get("/collections/S2-16D-2/items/wrong_item")
 
         assert response.status_code == 404
 
+    def test_make_geojson_processors_bulk(self, client):
+        from sqlalchemy import event
+
+        from bdc_stac.controller import db, get_collection_items, make_geojson
+
+        def _count_queries(items):
+            statements = []
+
+            def _on_execute(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            engine = db.get_engine()
+            event.listen(engine, "before_cursor_execute", _on_execute)
+            try:
+                make_geojson(items)
+            finally:
+                event.remove(engine, "before_cursor_execute", _on_execute)
+            return [statement for statement in statements if "items_processors" in statement]
+
+        with client.application.test_request_context():
+            small = get_collection_items(collection_id="S2-16D-2", limit=2).items
+            large = get_collection_items(collection_id="S2-16D-2", limit=20).items
+
+            assert len(_count_queries(small)) == 1
+            assert len(_count_queries(large)) == 1
+
+    def test_search_collection_identifier_index(self, client):
+        from sqlalchemy import event
+
+        from bdc_stac.controller import db, get_collection_ids, get_collection_items
+
+        statements = []
+
+        def _on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with client.application.test_request_context():
+            expected = get_collection_items(collections="S2-16D-2", limit=5).items
+            collection_id = get_collection_ids(["S2-16D-2"])[0]
+            assert get_collection_ids(["S2-16D-2", "unknown"]) == [collection_id]
+
+            engine = db.get_engine()
+            event.listen(engine, "before_cursor_execute", _on_execute)
+            try:
+                items = get_collection_items(collections="S2-16D-2", limit=5).items
+                # The unknown identifiers are cached too
+                assert get_collection_ids(["unknown"]) == []
+            finally:
+                event.remove(engine, "before_cursor_execute", _on_execute)
+
+        assert [i.id for i in items] == [i.id for i in expected]
+        assert not [statement for statement in statements if "items" not in statement]
+
+    def test_search_datetime_overlap(self, client):
+        from datetime import datetime, timezone
+
+        from bdc_stac.controller import get_collection_items
+
+        def _search(interval):
+            with client.application.test_request_context():
+                items = get_collection_items(collections="S2-16D-2", datetime=interval, limit=1000).items
+            return [(item.start, item.end) for item in items]
+
+        def _utc(value):
+            return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+        items = _search("2021-05-01T00:00:00Z/2021-06-30T00:00:00Z")
+        assert items
+        lower, upper = datetime(2021, 5, 1, tzinfo=timezone.utc), datetime(2021, 6, 30, tzinfo=timezone.utc)
+        for start, end in items:
+            assert _utc(start) <= upper and _utc(end) >= lower
+
+        assert set(items) <= set(_search("../2021-06-30T00:00:00Z"))
+        assert set(items) <= set(_search("2021-05-01T00:00:00Z/.."))
+
+    def test_search_datetime_index_plan(self, client):
+        """Check that the temporal index exists and can serve the datetime predicate.
+
+        The sequential scans are disabled, so it does not prove that the planner chooses the index by cost.
+        """
+        from sqlalchemy import text
+
+        from bdc_stac.controller import db, get_collection_items
+        from bdc_stac.indexes import create_indexes
+        from bdc_stac.pagination import _Explain
+
+        with client.application.test_request_context():
+            create_indexes(db.engine, ["items_temporal"])
+            query = get_collection_items(datetime="2021-05-01/2021-06-30", limit=10, count="none").query
+
+            with db.engine.connect() as connection:
+                transaction = connection.begin()
+                # The fixtures are small: disable sequential scans to check that the predicate can use the index
+                connection.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = connection.execute(_Explain(query.statement)).scalar()
+                transaction.rollback()
+
+        assert "idx_bdc_stac_items_start_date_end_date" in json.dumps(plan)
+
+    def test_search_tile_prefilter(self, client):
+        from bdc_stac.controller import _create_tile_filter, get_collection_items, get_grid_tiles
+
+        def _search(bbox):
+            with client.application.test_request_context():
+                result = get_collection_items(collections="S2-16D-2", bbox=bbox, limit=1000)
+            return result, [item.id for item in result.items]
+
+        bbox = "-56.2,-14.0,-55.8,-13.8"
+        _, expected = _search(bbox)
+        with mock.patch("bdc_stac.controller.BDC_STAC_USE_FOOTPRINT", True):
+            result, items = _search(bbox)
+            assert items and sorted(items) == sorted(expected)
+            assert "tile_id IN" in str(result.query.statement)
+
+            # No tile of the grid intersects the bbox
+            tiles = []
+
+            def _get_grid_tiles(*args):
+                tiles.append(get_grid_tiles(*args))
+                return tiles[-1]
+
+            with mock.patch("bdc_stac.controller.get_grid_tiles", side_effect=_get_grid_tiles):
+                _, items = _search("-40.0,-5.0,-39.0,-4.0")
+            assert tiles == [[]] and items == []
+
+            # The items without tile are kept
+            with mock.patch("bdc_stac.controller._resolve_tile_ids", return_value=[]):
+                assert str(_create_tile_filter([1], None)[0]).endswith("tile_id IS NULL")
+            with mock.patch("bdc_stac.controller._resolve_tile_ids", return_value=[1]):
+                assert "tile_id IS NULL" in str(_create_tile_filter([1], None)[0])
+
     def test_stac_search(self, client):
         response = client.get("/search")
 
@@ -205,12 +431,163 @@ class TestBDCStac:
         response = client.post("/search", content_type="application/json", json=parameters, headers=headers)
         assert response.status_code == 200
         assert response.content_encoding == "gzip"
+        assert "Accept-Encoding" in response.vary
 
         decompressed = gzip.decompress(response.data)
         data = json.loads(decompressed)
         assert data.get("type") == "FeatureCollection"
         assert data.get("features")
 
+    def test_compression_negotiation(self, client):
+        brotli = pytest.importorskip("brotli")
+
+        parameters = {"collections": ["S2-16D-2"]}
+        headers = {"Accept-Encoding": "gzip;q=0.8, br"}
+        response = client.post("/search", content_type="application/json", json=parameters, headers=headers)
+        assert response.content_encoding == "br"
+        assert json.loads(brotli.decompress(response.data)).get("features")
+
+        response = client.post("/search", content_type="application/json", json=parameters, headers=headers)
+        assert response.content_encoding == "br"
+
+        response = client.get("/collections", headers={"Accept-Encoding": "identity"})
+        assert response.content_encoding is None
+
+    def test_search_streaming(self, client):
+        parameters = {"collections": "S2-16D-2", "limit": 15}
+        expected = client.get("/search", query_string=parameters).json
+
+        with mock.patch.object(config, "BDC_STAC_STREAM_ITEMS", True), mock.patch(
+            "bdc_stac.controller.BDC_STAC_STREAM_CHUNK_SIZE", 4
+        ):
+            response = client.get("/search", query_string=parameters)
+            assert response.is_streamed
+            data = json.loads(response.data)
+            assert data["features"] == expected["features"]
+            assert data["context"] == expected["context"]
+            assert data["links"] == expected["links"]
+
+            response = client.get("/search", query_string=parameters, headers={"Accept-Encoding": "gzip"})
+            assert response.content_encoding == "gzip"
+            assert json.loads(gzip.decompress(response.data))["features"] == expected["features"]
+
+            response = client.post("/search", content_type="application/json", json={**parameters, "limit": 1000})
+            data = json.loads(response.data)
+            assert data["context"]["returned"] == len(data["features"]) == data["context"]["matched"]
+            assert not [link for link in data["links"] if link["rel"] == "next"]
+
+    def test_search_item_fragments(self, client):
+        from bdc_stac.cache import TTLCache
+
+        parameters = {"collections": "S2-16D-2", "limit": 5}
+        headers = {"X-Stac-Url": "https://stac.example.com/v1", "X-Script-Name": "https://data.example.com/bdc"}
+        expected = client.get("/search", query_string=parameters, headers=headers).json
+        item_id = expected["features"][0]["id"]
+        expected_item = client.get(f"/collections/S2-16D-2/items/{item_id}").json
+
+        cache = TTLCache(maxsize=100, ttl=60)
+        with mock.patch("bdc_stac.controller._item_fragments_cache", cache):
+            for _ in range(2):
+                data = client.get("/search", query_string=parameters, headers=headers).json
+                assert data == expected
+
+            assert cache.hits == 5
+            assert client.get(f"/collections/S2-16D-2/items/{item_id}").json == expected_item
+
+            # Excluded fields are not served from cache
+            data = client.get("/search", query_string={**parameters, "fields": "-assets"}).json
+            assert all("assets" not in feature for feature in data["features"])
+
+    def test_search_geometry_simplify(self, client):
+        from bdc_stac.cache import TTLCache
+
+        def _coordinates(feature):
+            return [point for ring in feature["geometry"]["coordinates"] for point in ring]
+
+        parameters = {"collections": "S2-16D-2", "limit": 5}
+        expected = client.get("/search", query_string=parameters).json["features"]
+
+        cache = TTLCache(maxsize=100, ttl=60)
+        with mock.patch("bdc_stac.controller._item_fragments_cache", cache):
+            for _ in range(2):
+                data = client.get("/search", query_string={**parameters, "simplify": 0.01, "precision": 3}).json
+                for feature, full in zip(data["features"], expected):
+                    coordinates = _coordinates(feature)
+                    assert len(coordinates) <= len(_coordinates(full))
+                    assert all(round(value, 3) == value for point in coordinates for value in point)
+
+            # The full geometry is not served from the cached simplified items
+            data = client.get("/search", query_string=parameters).json
+            assert [f["geometry"] for f in data["features"]] == [f["geometry"] for f in expected]
+
+        item_id = expected[0]["id"]
+        response = client.get(f"/collections/S2-16D-2/items/{item_id}", query_string={"precision": 2})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != client.get(f"/collections/S2-16D-2/items/{item_id}").headers["ETag"]
+
+        assert client.get("/search", query_string={**parameters, "simplify": "-1"}).status_code == 400
+        assert client.get("/search", query_string={**parameters, "precision": "high"}).status_code == 400
+        assert client.get("/search", query_string={**parameters, "precision": "-1"}).status_code == 200
+        response = client.get("/search", query_string={**parameters, "precision": "16"})
+        assert response.status_code == 400 and "-1 <= precision <= 15" in response.get_data(as_text=True)
+
+    def test_search_cache(self, client):
+        from bdc_stac.search_cache import create_search_cache
+
+        parameters = {"collections": "S2-16D-2", "limit": 5}
+        with mock.patch("bdc_stac.views._search_cache", create_search_cache("memory")):
+            expected = client.get("/search", query_string=parameters).json
+
+            with mock.patch("bdc_stac.views.get_collection_items") as get_collection_items:
+                response = client.get("/search", query_string={**parameters, "collections": "S2-16D-2,S2-16D-2"})
+                assert response.json == expected
+                assert response.content_type == config.STAC_GEO_MEDIA_TYPE
+                assert not get_collection_items.called
+
+            # The POST links differ from GET
+            data = client.post("/search", content_type="application/json", json=parameters).json
+            assert data["features"] == expected["features"] and data["links"] != expected["links"]
+
+    def test_search_cache_items_changed(self, client):
+        from datetime import timedelta
+
+        from bdc_catalog.models import Item, db
+        from sqlalchemy import inspect
+
+        from bdc_stac.controller import get_items_stamp
+        from bdc_stac.search_cache import create_search_cache
+
+        parameters = {"collections": "S2-16D-2", "limit": 5}
+        with mock.patch("bdc_stac.views._search_cache", create_search_cache("memory", version=get_items_stamp)):
+            expected = client.get("/search", query_string=parameters).json
+
+            with client.application.app_context():
+                source = Item.query().filter(Item.name == expected["features"][0]["id"]).first()
+                values = {
+                    attribute.key: getattr(source, attribute.key)
+                    for attribute in inspect(Item).column_attrs
+                    if attribute.key not in ("id", "created", "updated")
+                }
+                item = Item(**values)
+                item.name = f"{source.name}_NEW"
+                item.start_date, item.end_date = source.start_date + timedelta(days=1), source.end_date + timedelta(
+                    days=1
+                )
+                db.session.add(item)
+                db.session.commit()
+
+            try:
+                data = client.get("/search", query_string=parameters).json
+                assert data["features"][0]["id"] == item.name
+                assert data["context"]["matched"] == expected["context"]["matched"] + 1
+            finally:
+                with client.application.app_context():
+                    db.session.query(Item).filter(Item.name == item.name).delete()
+                    db.session.commit()
+
+            # The removed item is not returned anymore
+            assert client.get("/search", query_string=parameters).json == expected
+
     def test_item_search_fields(self, client):
         parameters = {
             "collections": ["S2-16D-2"],
@@ -226,6 +603,55 @@ class TestBDCStac:
         for feature in features:
             assert "properties" not in feature
 
+    def test_search_query_typed(self, client):
+        parameters = {"collections": ["S2-16D-2"], "query": {"eo:cloud_cover": {"lte": 50}}}
+        response = client.post("/search", content_type="application/json", json=parameters)
+        assert response.status_code == 200
+        for feature in response.json["features"]:
+            assert feature["properties"]["eo:cloud_cover"] <= 50
+
+        parameters["query"] = {"eo:cloud_cover": {"like": 50}}
+        response = client.post("/search", content_type="application/json", json=parameters)
+        assert response.status_code == 400
+
+        parameters["query"] = {"view:off_nadir": {"lte": "nadir"}}
+        response = client.post("/search", content_type="application/json", json=parameters)
+        assert response.status_code == 400
+
+    def test_search_filter_cql2(self, client):
+        from bdc_stac.cql2 import parse_text
+
+        text = (
+            "collection = 'S2-16D-2' AND eo:cloud_cover <= 50 AND T_INTERSECTS(datetime, INTERVAL('2021-01-01', '..'))"
+        )
+        response = client.get("/search", query_string={"filter": text, "filter-lang": "cql2-text"})
+        assert response.status_code == 200
+        features = response.json["features"]
+        assert features
+        for feature in features:
+            assert feature["collection"] == "S2-16D-2" and feature["properties"]["eo:cloud_cover"] <= 50
+
+        parameters = {"filter-lang": "cql2-json", "filter": parse_text(text)}
+        response = client.post("/search", content_type="application/json", json=parameters)
+        assert response.status_code == 200
+        assert [f["id"] for f in response.json["features"]] == [f["id"] for f in features]
+
+        response = client.get("/search", query_string={"filter": "eo:cloud_cover <"})
+        assert response.status_code == 400
+
+    def test_queryables(self, client):
+        response = client.get("/queryables")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/schema+json"
+        properties = response.json["properties"]
+        assert "eo:cloud_cover" in properties and "geometry" in properties
+
+        response = client.get("/collections/S2-16D-2/queryables")
+        assert response.status_code == 200
+        assert response.json["$id"].endswith("/collections/S2-16D-2/queryables")
+
+        assert client.get("/collections/unknown/queryables").status_code == 404
+
     def test_search_pagination_get(self, client):
         parameters = {"collections": ["S2-16D-2"], "page": 2}
         response = client.get("/search", content_type="application/json", query_string=parameters)
@@ -234,10 +660,118 @@ class TestBDCStac:
         assert data["context"]["returned"] > 0
         for link in data["links"]:
             if link["rel"] == "next":
-                assert "page=3" in link["href"]
+                assert "token=" in link["href"] and "page=" not in link["href"]
             elif link["rel"] == "prev":
                 assert "page=1" in link["href"]
 
+    def test_search_pagination_token(self, client):
+        parameters = {"collections": ["S2-16D-2"], "limit": 2}
+        first = client.get("/search", query_string=parameters).json
+        third = client.get("/search", query_string={**parameters, "page": 3}).json
+
+        next_link = [link for link in first["links"] if link["rel"] == "next"][0]
+        second = client.get(next_link["href"]).json
+        assert second["context"]["returned"] == 2
+        assert not {f["id"] for f in first["features"]} & {f["id"] for f in second["features"]}
+
+        next_link = [link for link in second["links"] if link["rel"] == "next"][0]
+        assert [f["id"] for f in client.get(next_link["href"]).json["features"]] == [f["id"] for f in third["features"]]
+
+        response = client.post("/search", content_type="application/json", json=parameters)
+        next_link = [link for link in response.json["links"] if link["rel"] == "next"][0]
+        assert "page" not in next_link["body"] and next_link["body"]["token"]
+        assert next_link["body"] == {**parameters, "token": next_link["body"]["token"]}
+        response = client.post("/search", content_type="application/json", json=next_link["body"])
+        assert [f["id"] for f in response.json["features"]] == [f["id"] for f in second["features"]]
+
+    def test_search_pagination_token_count(self, client):
+        parameters = {"collections": "S2-16D-2", "limit": 1}
+        first = client.get("/search", query_string=parameters).json
+        next_link = [link for link in first["links"] if link["rel"] == "next"][0]
+
+        # The keyset pages reuse the count of the first page
+        with mock.patch("bdc_stac.pagination._scalar") as scalar, mock.patch(
+            "bdc_stac.pagination.CountQuery"
+        ) as counting:
+            second = client.get(next_link["href"]).json
+            scalar.assert_not_called()
+            counting.assert_not_called()
+        assert second["context"]["matched"] == first["context"]["matched"]
+        assert second["context"]["bdc:count"] == first["context"]["bdc:count"]
+
+    def test_search_limit(self, client):
+        response = client.get("/search", query_string={"collections": "S2-16D-2", "limit": 0})
+        assert response.status_code == 200
+        assert response.json["context"]["returned"] == 0
+        assert not [link for link in response.json["links"] if link["rel"] == "next"]
+
+        for limit in (-1, "invalid"):
+            response = client.get("/search", query_string={"collections": "S2-16D-2", "limit": limit})
+            assert response.status_code == 400
+
+    def test_search_count_modes(self, client):
+        parameters = {"collections": "S2-16D-2", "limit": 1}
+        exact = client.get("/search", query_string=parameters).json["context"]
+        assert exact["bdc:count"] == "exact" and exact["matched"] > 1
+
+        context = client.get("/search", query_string={**parameters, "count": "none"}).json["context"]
+        assert context["bdc:count"] == "none" and "matched" not in context and context["returned"] == 1
+
+        context = client.get("/search", query_string={**parameters, "count": "estimated"}).json["context"]
+        assert context["bdc:count"] == "estimated" and context["matched"] >= 0
+
+        with mock.patch("bdc_stac.controller.BDC_STAC_COUNT_LIMIT", 1):
+            context = client.get("/search", query_string={**parameters, "count": "capped"}).json["context"]
+            assert context["bdc:count"] == "capped" and context["matched"] == 1
+
+        response = client.get("/search", query_string={**parameters, "count": "invalid"})
+        assert response.status_code == 400
+
+    def test_search_count_derived(self, client):
+        parameters = {"collections": "S2-16D-2", "limit": 1}
+        matched = client.get("/search", query_string=parameters).json["context"]["matched"]
+
+        with mock.patch("bdc_stac.controller.BDC_STAC_COUNT_WORKERS", 0):
+            sequential = client.get("/search", query_string=parameters).json["context"]
+            assert sequential["matched"] == matched
+
+        # The last page is enough to know the total, even for estimated count
+        parameters = {**parameters, "limit": matched + 1, "count": "estimated"}
+        context = client.get("/search", query_string=parameters).json["context"]
+        assert context["bdc:count"] == "exact" and context["matched"] == context["returned"] == matched
+
+        context = client.get("/search", query_string={**parameters, "page": 2}).json["context"]
+        assert context["bdc:count"] == "estimated" and context["returned"] == 0
+
+    def test_search_statement_cache(self, client):
+        parameters = {"collections": "S2-16D-2", "datetime": "2017-01-01/..", "limit": 1}
+        pages = []
+        for page in (1, 2):
+            expected = client.get("/search", query_string={**parameters, "page": page}).json
+            with mock.patch("bdc_stac.controller._statements_cache.maxsize", 0):
+                response = client.get("/search", query_string={**parameters, "page": page}).json
+            assert response["features"] == expected["features"]
+            assert response["context"] == expected["context"]
+            pages.append(expected)
+
+        # The keyset pages use the same cached statement
+        next_link = [link for link in pages[0]["links"] if link["rel"] == "next"][0]
+        response = client.get(next_link["href"]).json
+        assert [feature["id"] for feature in response["features"]] == [pages[1]["features"][0]["id"]]
+
+    def test_server_timing(self, client):
+        with mock.patch("bdc_stac.config.BDC_STAC_SERVER_TIMING", 1):
+            response = client.get("/search", query_string={"collections": "S2-16D-2", "limit": 1})
+            assert response.status_code == 200
+            assert response.headers["Server-Timing"].startswith("db-checkout;dur=")
+
+        response = client.get("/search", query_string={"collections": "S2-16D-2", "limit": 1})
+        assert "Server-Timing" not in response.headers
+
+    def test_search_pagination_invalid_token(self, client):
+        response = client.get("/search", query_string={"token": "invalid"})
+        assert response.status_code == 400
+
     def _get_collection(self, name, client):
         response = client.get(f"/collections/{name}")
         assert response.status_code == 200
@@ -0,0 +1,80 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+import pytest
+
+from bdc_stac.cache import TTLCache, add_reload_hook, cache_stats, cached, register_cache, reload_caches
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCache:
+    def test_ttl_lru_eviction(self):
+        clock = _Clock()
+        cache = TTLCache(maxsize=2, ttl=10, timer=clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert "a" in cache and "c" in cache and "b" not in cache
+
+        clock.now = 10
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_disabled_cache(self):
+        cache = TTLCache(maxsize=10, ttl=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+    def test_validate_stamp(self):
+        cache = TTLCache()
+        assert not cache.validate(("2023-01-01", 2))
+        cache.set("a", 1)
+        assert cache.validate(("2023-01-01", 2))
+        assert cache.get("a") == 1
+        assert not cache.validate(("2023-01-02", 2))
+        assert cache.get("a") is None
+
+    def test_cached_primitive_keys(self):
+        calls = []
+        cache = register_cache("test-metadata", maxsize=10, ttl=60)
+
+        @cached(cache)
+        def _load(collection_id):
+            calls.append(collection_id)
+            return {"id": collection_id}
+
+        assert _load(1) == _load(1) == {"id": 1}
+        assert calls == [1]
+        assert cache_stats()["test-metadata"]["hits"] == 1
+
+        with pytest.raises(TypeError):
+            _load(object())
+
+        hooks = []
+        add_reload_hook(lambda: hooks.append(True))
+        reload_caches()
+        assert _load(1) == {"id": 1}
+        assert calls == [1, 1] and hooks
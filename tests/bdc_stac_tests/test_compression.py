@@ -0,0 +1,74 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+import gzip
+
+import pytest
+
+from bdc_stac.cache import TTLCache
+from bdc_stac.compression import (
+    ENCODINGS,
+    available_encodings,
+    compress,
+    compress_cached,
+    compress_stream,
+    compression_level,
+    negotiate_encoding,
+)
+
+PAYLOAD = b'{"type":"FeatureCollection","features":[' + b",".join([b'{"type":"Feature","id":"S2"}'] * 1000) + b"]}"
+
+
+def _decompress(data, encoding):
+    if encoding == "br":
+        return pytest.importorskip("brotli").decompress(data)
+    if encoding == "zstd":
+        return pytest.importorskip("zstandard").ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+class TestCompression:
+    def test_negotiate_encoding(self):
+        assert negotiate_encoding("gzip, deflate, br, zstd", ENCODINGS) == "br"
+        assert negotiate_encoding("gzip, deflate, br, zstd", ["zstd", "gzip"]) == "zstd"
+        assert negotiate_encoding("br;q=0.5, gzip", ENCODINGS) == "gzip"
+        assert negotiate_encoding("*", ["gzip"]) == "gzip"
+        assert negotiate_encoding("*, gzip;q=0", ["gzip"]) is None
+        assert negotiate_encoding("deflate", ENCODINGS) is None
+        assert negotiate_encoding("", ENCODINGS) is None
+
+    def test_compression_level(self):
+        assert compression_level("gzip", 1024) > compression_level("gzip", 10 * 1024 * 1024)
+        assert compression_level("gzip") == compression_level("gzip", 10 * 1024 * 1024)
+
+    @pytest.mark.parametrize("encoding", ENCODINGS)
+    def test_compress(self, encoding):
+        if encoding not in available_encodings():
+            pytest.skip(f"{encoding} is not installed")
+
+        assert _decompress(compress(PAYLOAD, encoding), encoding) == PAYLOAD
+
+        chunks = [PAYLOAD[offset : offset + 1000] for offset in range(0, len(PAYLOAD), 1000)]
+        assert _decompress(b"".join(compress_stream(chunks, encoding)), encoding) == PAYLOAD
+
+    def test_compress_cached(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        data = compress_cached(PAYLOAD, "gzip", cache)
+
+        assert compress_cached(PAYLOAD, "gzip", cache) is data
+        assert cache.hits == 1
+        assert gzip.decompress(data) == PAYLOAD
@@ -0,0 +1,151 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from bdc_stac.cql2 import CQL2Error, compile_filter, parse_datetime, parse_filter, parse_text
+
+
+def _sql(clauses):
+    return [str(clause.compile(dialect=postgresql.dialect())) for clause in clauses]
+
+
+class TestCQL2:
+    def test_parse_text(self):
+        assert parse_text("eo:cloud_cover BETWEEN 0 AND 10.5 OR NOT id LIKE 'S2%'") == {
+            "op": "or",
+            "args": [
+                {"op": "between", "args": [{"property": "eo:cloud_cover"}, 0, 10.5]},
+                {"op": "not", "args": [{"op": "like", "args": [{"property": "id"}, "S2%"]}]},
+            ],
+        }
+        assert parse_text("platform IN ('sentinel-2a', 'sentinel-2b')") == {
+            "op": "in",
+            "args": [{"property": "platform"}, ["sentinel-2a", "sentinel-2b"]],
+        }
+        assert parse_text('"bdc:tile" IS NOT NULL') == {
+            "op": "not",
+            "args": [{"op": "isNull", "args": [{"property": "bdc:tile"}]}],
+        }
+
+    def test_parse_text_spatial_temporal(self):
+        expression = parse_text(
+            "S_INTERSECTS(geometry, POLYGON((-46 -13, -45 -13, -45 -12, -46 -13))) "
+            "AND T_INTERSECTS(datetime, INTERVAL('2021-01-01T00:00:00Z', '..'))"
+        )
+        spatial, temporal = expression["args"]
+        assert spatial["op"] == "s_intersects" and spatial["args"][1]["type"] == "Polygon"
+        assert temporal["args"][1] == {"interval": ["2021-01-01T00:00:00Z", ".."]}
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            "eo:cloud_cover <",
+            "eo:cloud_cover ~ 10",
+            "(id = 'S2'",
+            "S_INTERSECTS(geometry, POINT(0 0)",
+            "id = 'S2' id",
+        ],
+    )
+    def test_parse_text_invalid(self, text):
+        with pytest.raises(CQL2Error):
+            parse_text(text)
+
+    def test_parse_filter(self):
+        expression = {"op": "=", "args": [{"property": "id"}, "S2"]}
+        assert parse_filter(expression) == expression
+        assert parse_filter('{"op": "=", "args": [{"property": "id"}, "S2"]}', "cql2-json") == expression
+        assert parse_filter("id = 'S2'", "cql2-text") == expression
+
+        with pytest.raises(CQL2Error):
+            parse_filter(expression, "cql2-text")
+        with pytest.raises(CQL2Error):
+            parse_filter("id = 'S2'", "ecql")
+
+    def test_compile_indexed_first(self):
+        expression = parse_text(
+            "platform LIKE 'sentinel%' AND eo:cloud_cover < 10 AND collection = 'S2-16D-2' "
+            "AND S_INTERSECTS(geometry, BBOX(-46, -13, -45, -12)) AND T_INTERSECTS(datetime, DATE('2021-01-01'))"
+        )
+        sql = _sql(compile_filter(expression))
+        assert len(sql) == 5
+        assert "LIKE" in sql[-1]
+        assert any("ST_Intersects" in clause and "ST_MakeEnvelope" in clause for clause in sql[:-1])
+        assert any("start_date <= " in clause and "end_date >= " in clause for clause in sql[:-1])
+
+    def test_compile_queryables(self):
+        sql = _sql(compile_filter(parse_text("platform = 'sentinel-2a' AND 10 > view:off_nadir")))
+        assert "metadata @> " in sql[0]
+        assert "AS FLOAT) < " in sql[1]
+
+    def test_compile_temporal(self):
+        (before,) = _sql(compile_filter(parse_text("T_BEFORE(datetime, TIMESTAMP('2021-01-01T00:00:00Z'))")))
+        assert "end_date < " in before
+        (after,) = _sql(compile_filter(parse_text("T_AFTER(updated, INTERVAL('..', '2021-01-01'))")))
+        assert "updated > " in after
+
+    @pytest.mark.parametrize(
+        "value,expected",
+        [
+            ("2021-01-01", datetime(2021, 1, 1, tzinfo=timezone.utc)),
+            ("2021-01-01T10:30:00", datetime(2021, 1, 1, 10, 30, tzinfo=timezone.utc)),
+            ("2021-01-01T10:30:00.1Z", datetime(2021, 1, 1, 10, 30, 0, 100000, tzinfo=timezone.utc)),
+            ("2021-01-01T10:30:00.12Z", datetime(2021, 1, 1, 10, 30, 0, 120000, tzinfo=timezone.utc)),
+            ("2021-01-01T10:30:00.123456789Z", datetime(2021, 1, 1, 10, 30, 0, 123456, tzinfo=timezone.utc)),
+            ("2021-01-01t10:30:00z", datetime(2021, 1, 1, 10, 30, tzinfo=timezone.utc)),
+            (
+                "2021-01-01T10:30:00.5-03:00",
+                datetime(2021, 1, 1, 10, 30, 0, 500000, tzinfo=timezone(-timedelta(hours=3))),
+            ),
+        ],
+    )
+    def test_parse_datetime(self, value, expected):
+        assert parse_datetime(value) == expected
+
+    @pytest.mark.parametrize("value", ["2021-13-01", "2021-01-01T10:30", "2021-01-01T10:30:00.Z", "yesterday"])
+    def test_parse_datetime_invalid(self, value):
+        with pytest.raises(CQL2Error):
+            parse_datetime(value)
+
+    def test_compile_spatial_literal_first(self):
+        (within,) = _sql(compile_filter(parse_text("S_WITHIN(BBOX(-46, -13, -45, -12), geometry)")))
+        assert within.startswith("ST_Contains(") and within.index("bdc.items.") < within.index("ST_MakeEnvelope")
+        (contains,) = _sql(compile_filter(parse_text("S_CONTAINS(BBOX(-46, -13, -45, -12), geometry)")))
+        assert contains.startswith("ST_Within(")
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            {"op": "s_intersects", "args": [{"property": "id"}, {"type": "Point", "coordinates": [0, 0]}]},
+            {"op": "t_intersects", "args": [{"property": "collection"}, {"date": "2021-01-01"}]},
+            {"op": "like", "args": [{"property": "view:off_nadir"}, "1%"]},
+            {"op": "=", "args": [{"property": "id"}]},
+            {"op": "unknown", "args": []},
+            {"op": "in", "args": [{"property": "id"}, "S2"]},
+            {"op": "s_intersects", "args": [{"property": "geometry"}, {"bbox": ["a", 1, 2, 3]}]},
+            {"op": "s_intersects", "args": [{"property": "geometry"}, {"bbox": "-46,-13,-45,-12"}]},
+            {"op": "s_intersects", "args": [{"property": "geometry"}, {"bbox": 10}]},
+            {"op": "s_intersects", "args": [{"property": "geometry"}, {"bbox": [-46, -13, -45]}]},
+        ],
+    )
+    def test_compile_invalid(self, expression):
+        with pytest.raises(ValueError):
+            compile_filter(expression)
@@ -0,0 +1,125 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+from unittest import mock
+
+import pytest
+from flask import Flask
+from sqlalchemy.pool import NullPool
+
+from bdc_stac.database import (
+    SEARCH_BIND,
+    ReplicaRouter,
+    STACSQLAlchemy,
+    TimedQueuePool,
+    engine_options,
+    probe_engine,
+    replica_binds,
+)
+
+
+def _engines(*checkedout):
+    return {
+        f"replica-{index}": mock.Mock(**{"url": "sqlite://", "pool.checkedout.return_value": value})
+        for index, value in enumerate(checkedout)
+    }
+
+
+class TestDatabase:
+    def test_engine_options(self):
+        options = engine_options({"pool_size": 5, "poolclass": None, "pool_pre_ping": True})
+        assert options == {"pool_size": 5, "pool_pre_ping": True}
+
+        options = engine_options({"poolclass": "NullPool", "pool_size": 5, "max_overflow": 10, "pool_timeout": 30})
+        assert options == {"poolclass": NullPool}
+
+        with pytest.raises(ValueError):
+            engine_options({"poolclass": "Unknown"})
+
+    def test_engine_options_statement_timeout(self):
+        options = engine_options({"connect_args": {"options": "-c search_path=bdc"}}, statement_timeout=30000)
+        assert options["connect_args"] == {"options": "-c search_path=bdc -c statement_timeout=30000"}
+
+        assert "connect_args" not in engine_options({}, statement_timeout=0)
+
+    def test_replica_binds(self):
+        assert replica_binds([]) == {}
+        assert list(replica_binds(["postgresql://a/bdc", "postgresql://b/bdc"])) == ["replica-0", "replica-1"]
+        assert list(replica_binds(["postgresql://a/bdc"], bind_key=SEARCH_BIND)) == ["search-replica-0"]
+
+    def test_replica_search_pools(self, tmp_path):
+        uri = f"sqlite:///{tmp_path / 'primary.db'}"
+        app = Flask(__name__)
+        app.config.update(
+            SQLALCHEMY_DATABASE_URI=uri,
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            SQLALCHEMY_ENGINE_OPTIONS={"poolclass": TimedQueuePool},
+            SQLALCHEMY_BINDS={SEARCH_BIND: uri},
+            BDC_STAC_BINDS_ENGINE_OPTIONS={SEARCH_BIND: {"pool_size": 3}},
+            BDC_STAC_READ_REPLICAS=[f"sqlite:///{tmp_path / f'replica{index}.db'}" for index in range(2)],
+        )
+        db = STACSQLAlchemy()
+        db.init_app(app)
+        assert app.config["BDC_STAC_BINDS_ENGINE_OPTIONS"]["search-replica-1"] == {"pool_size": 3}
+
+        # The searches do not share the replica pools of the other endpoints
+        session = db.create_scoped_session({"replicas": True})
+        search_session = db.create_scoped_session({"bind_key": SEARCH_BIND, "replicas": True})
+        with app.app_context():
+            for _ in range(2):
+                assert session().get_bind().pool.pool_name in ("replica-0", "replica-1")
+                pool = search_session().get_bind().pool
+                assert pool.pool_name in ("search-replica-0", "search-replica-1") and pool.size() == 3
+                session.remove()
+                search_session.remove()
+
+    def test_probe_engine(self):
+        assert isinstance(probe_engine("sqlite://", connect_timeout=2).pool, NullPool)
+
+        with mock.patch("bdc_stac.database.create_engine") as create_engine:
+            probe_engine("postgresql://replica/bdc", connect_timeout=2)
+            assert create_engine.call_args[1] == {"poolclass": NullPool, "connect_args": {"connect_timeout": 2}}
+
+    def test_replica_round_robin(self):
+        engines = _engines(0, 0, 0)
+        router = ReplicaRouter(list(engines))
+        assert [router.select(engines) for _ in range(4)] == ["replica-0", "replica-1", "replica-2", "replica-0"]
+        assert ReplicaRouter([]).select({}) is None
+
+        with pytest.raises(ValueError):
+            ReplicaRouter(list(engines), policy="random")
+
+    def test_replica_least_connections(self):
+        engines = _engines(3, 1, 2)
+        router = ReplicaRouter(list(engines), policy="least-connections")
+        assert {router.select(engines) for _ in range(3)} == {"replica-1"}
+
+        engines = _engines(1, 1)
+        assert {router.select(engines) for _ in range(2)} == {"replica-0", "replica-1"}
+
+    def test_replica_lag_aware(self):
+        engines = _engines(0, 0, 0)
+        router = ReplicaRouter(list(engines), policy="lag-aware", max_lag=10, health_ttl=60)
+        with mock.patch("bdc_stac.database.replica_lag", side_effect=[0.5, 30.0, None]) as replica_lag:
+            assert {router.select(engines) for _ in range(4)} == {"replica-0"}
+            assert replica_lag.call_count == 3
+            # The health is checked without the pool of the replica
+            assert isinstance(replica_lag.call_args[0][0].pool, NullPool)
+
+        router = ReplicaRouter(list(engines), policy="lag-aware", max_lag=10, health_ttl=0)
+        with mock.patch("bdc_stac.database.replica_lag", return_value=None):
+            assert router.select(engines) is None
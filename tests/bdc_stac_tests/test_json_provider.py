@@ -0,0 +1,90 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from bdc_stac.json_provider import STACJSONProvider
+
+VALUE = {
+    "id": "S2-16D_V2_020020_20210525",
+    "properties": {
+        "datetime": datetime.datetime(2021, 5, 25, 13, 30, tzinfo=datetime.timezone.utc),
+        "date": datetime.date(2021, 5, 25),
+        "eo:cloud_cover": Decimal("12.5"),
+        "platform": "sentinel-2a",
+    },
+    "bbox": [-46.0, -13.0, -45.0, -12.0],
+}
+
+EXPECTED = {
+    "id": "S2-16D_V2_020020_20210525",
+    "properties": {
+        "datetime": "2021-05-25T13:30:00+00:00",
+        "date": "2021-05-25",
+        "eo:cloud_cover": 12.5,
+        "platform": "sentinel-2a",
+    },
+    "bbox": [-46.0, -13.0, -45.0, -12.0],
+}
+
+
+def _make_app(encoder):
+    app = Flask(__name__)
+    app.json = STACJSONProvider(app, encoder=encoder)
+    app.json.compact = True
+    app.json.sort_keys = False
+    return app
+
+
+class TestJSONProvider:
+    def test_stdlib_encoder(self):
+        app = _make_app("stdlib")
+        provider = app.json
+
+        assert provider.encoder == "stdlib"
+        assert json.loads(provider.dumps(VALUE)) == EXPECTED
+
+    def test_orjson_encoder(self):
+        pytest.importorskip("orjson")
+        app, stdlib_app = _make_app("orjson"), _make_app("stdlib")
+        provider = app.json
+
+        assert provider.encoder == "orjson"
+        assert json.loads(provider.dumps(VALUE)) == EXPECTED
+        assert provider.dumps(VALUE) == stdlib_app.json.dumps(VALUE, separators=(",", ":"))
+        assert provider.loads(provider.dumps(VALUE)) == EXPECTED
+
+        # Values not supported by orjson are written with the standard encoder
+        assert provider.dumps({"value": 2**70}) == json.dumps({"value": 2**70})
+
+    def test_response(self):
+        for encoder in ("auto", "stdlib"):
+            app = _make_app(encoder)
+            with app.app_context():
+                response = app.json.response(VALUE)
+
+            assert response.mimetype == "application/json"
+            assert json.loads(response.get_data()) == EXPECTED
+
+    def test_invalid_encoder(self):
+        with pytest.raises(ValueError):
+            _make_app("ujson")
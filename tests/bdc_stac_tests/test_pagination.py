@@ -0,0 +1,138 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from bdc_catalog.models import Item
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query
+
+from bdc_stac.pagination import (
+    CountQuery,
+    ItemSearch,
+    SearchStatement,
+    count_executor,
+    count_result,
+    decode_token,
+    decode_token_count,
+    encode_token,
+)
+
+
+def _search(**kwargs):
+    return ItemSearch(Query(Item).order_by(Item.start_date.desc(), Item.id), **kwargs)
+
+
+class TestPagination:
+    def test_derived_total(self):
+        search = _search(page=1, limit=10)
+        assert search.derived_total([]) == 0
+        assert search.derived_total(list(range(5))) == 5
+        assert search.derived_total(list(range(11))) is None
+
+        search = _search(page=3, limit=10)
+        assert search.derived_total(list(range(4))) == 24
+        assert search.derived_total([]) is None
+
+    def test_derived_total_skipped(self):
+        assert _search(limit=10, count="none").derived_total([]) is None
+        assert _search(limit=10, cursor=(datetime(2021, 1, 1), 1)).derived_total(list(range(5))) is None
+
+    def test_token(self):
+        start = datetime(2021, 1, 1, 10, 30)
+        token = encode_token(start, 42)
+        assert decode_token(token) == (start, 42)
+        assert decode_token_count(token) is None
+
+        token = encode_token(start, 42, total=100, count_mode="estimated")
+        assert decode_token(token) == (start, 42)
+        assert decode_token_count(token) == (100, "estimated")
+
+        with pytest.raises(ValueError):
+            decode_token("invalid")
+        with pytest.raises(ValueError):
+            decode_token_count(encode_token(start, 42, total=100, count_mode="invalid"))
+
+    def test_counted(self):
+        cursor = (datetime(2021, 1, 1), 1)
+        search = _search(limit=10, cursor=cursor, counted=(100, "exact"))
+        assert search.count_statement() is None
+        assert search.count_result(None) == (100, "exact")
+
+        page = search.make_page([SimpleNamespace(start=datetime(2021, 1, 1), id=2)] * 11, *search.count_result(None))
+        assert decode_token_count(page.next_token) == (100, "exact")
+
+        search = _search(limit=10, cursor=cursor, count="none", counted=(100, "exact"))
+        assert search.count_result(None) == (None, "none")
+        assert search.make_page([], None, "none").next_token is None
+
+    def test_limit(self):
+        assert _search(limit=20, max_limit=10).limit == 10
+        with pytest.raises(ValueError):
+            _search(limit=-1)
+
+        # An empty page has no next token, even when there are more items
+        page = _search(limit=0).make_page([SimpleNamespace(start=datetime(2021, 1, 1), id=1)], 1, "exact")
+        assert page.has_next and page.next_token is None
+
+    def test_count_result(self):
+        assert count_result(None, mode="none") == (None, "none")
+        assert count_result(5, mode="capped", limit=10) == (5, "exact")
+        assert count_result(11, mode="capped", limit=10) == (10, "capped")
+        assert count_result('[{"Plan": {"Plan Rows": 42}}]', mode="estimated") == (42, "estimated")
+
+    def test_count_executor(self):
+        assert count_executor(0) is None
+
+        executor = count_executor(2)
+        assert executor is count_executor(2)
+        assert executor.submit(sum, [1, 2]).result() == 3
+
+    def test_count_query_cancel(self):
+        engine = mock.MagicMock()
+        connection = engine.connect.return_value.__enter__.return_value
+        counting = CountQuery(engine, "SELECT count(*) FROM bdc.items")
+
+        def _execute(*args):
+            counting.cancel()
+            return mock.Mock(**{"scalar.return_value": 1})
+
+        connection.execute.side_effect = _execute
+        assert counting() == 1
+        connection.connection.cancel.assert_called_once()
+
+        counting = CountQuery(engine, "SELECT count(*) FROM bdc.items")
+        counting.cancel()
+        assert counting() is None
+
+    def test_search_statement(self):
+        query = Query(Item).filter(Item.collection_id == bindparam("bdc_collection"))
+        statement = SearchStatement(query.order_by(Item.start_date.desc(), Item.id))
+        dialect = postgresql.dialect()
+
+        compiled = statement.compiled("offset", dialect)
+        assert compiled is statement.compiled("offset", dialect)
+        assert {"bdc_collection", "bdc_offset", "bdc_limit"} <= set(compiled.params)
+
+        compiled = statement.compiled("keyset", dialect)
+        assert {"bdc_cursor_start", "bdc_cursor_id", "bdc_limit"} <= set(compiled.params)
+        assert "bdc_count_limit" in statement.compiled("capped", dialect).params
+        assert "count" in str(statement.compiled("exact", dialect)).lower()
@@ -0,0 +1,99 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from bdc_stac.indexes import INDEXES, index_statements
+from bdc_stac.queryables import QUERYABLES, Queryable, get_queryable
+
+
+def _compile(expression):
+    compiled = expression.compile(dialect=postgresql.dialect())
+    return str(compiled), list(compiled.params.values())
+
+
+class TestQueryables:
+    def test_equality_containment(self):
+        sql, params = _compile(get_queryable("platform").compile("eq", "sentinel-2a"))
+        assert "metadata @> " in sql and params == [{"platform": "sentinel-2a"}]
+
+        sql, params = _compile(get_queryable("sat:relative_orbit").compile("in", ["10", 11]))
+        assert " OR " in sql and params == [{"sat:relative_orbit": 10}, {"sat:relative_orbit": 11}]
+
+        sql, params = _compile(get_queryable("instruments").compile("eq", "MSI"))
+        assert params == [{"instruments": ["MSI"]}]
+
+        sql, params = _compile(get_queryable("platform").compile("neq", "sentinel-2a"))
+        assert "metadata ? " in sql and "NOT " in sql
+
+    def test_numeric_cast(self):
+        sql, params = _compile(get_queryable("view:off_nadir").compile("gte", "5"))
+        assert "CAST(CASE WHEN (jsonb_typeof(" in sql and "metadata ->> 'view:off_nadir' END AS FLOAT) >= " in sql
+        assert params == [5.0]
+
+        sql, params = _compile(get_queryable("sat:relative_orbit").compile("gte", 10.0))
+        assert "= 'number') THEN " in sql and "AS INTEGER) >= " in sql and params == [10]
+
+    def test_column_properties(self):
+        sql, params = _compile(get_queryable("eo:cloud_cover").compile("lte", 50))
+        assert "cloud_cover <= " in sql and params == [50.0]
+
+        sql, params = _compile(get_queryable("bdc:tile").compile("eq", "020020"))
+        assert "name = " in sql and params == ["020020"]
+
+    def test_untyped_properties(self):
+        queryable = get_queryable("custom:property")
+        assert queryable.type is None and "custom:property" not in QUERYABLES
+        sql, _ = _compile(queryable.compile("startsWith", "S2"))
+        assert "->> 'custom:property'" in sql and "LIKE" in sql
+
+    @pytest.mark.parametrize(
+        "name,op,value",
+        [
+            ("eo:cloud_cover", "like", 10),
+            ("view:off_nadir", "lte", "nadir"),
+            ("view:off_nadir", "startsWith", "1"),
+            ("instruments", "lt", "MSI"),
+            ("platform", "in", "sentinel-2a"),
+            ("sat:relative_orbit", "eq", 10.9),
+            ("sat:relative_orbit", "in", [10, "10.5"]),
+            ("sat:relative_orbit", "eq", True),
+        ],
+    )
+    def test_invalid_filter(self, name, op, value):
+        with pytest.raises(ValueError):
+            get_queryable(name).compile(op, value)
+
+    def test_invalid_type(self):
+        with pytest.raises(ValueError):
+            Queryable("view:off_nadir", "float")
+
+    def test_index_statements(self):
+        assert "items_metadata" in INDEXES and "items_view_off_nadir" in INDEXES
+        assert get_queryable("platform").index_statement("items") is None
+
+        statement = index_statements(["items_view_off_nadir"])[0]
+        assert "idx_bdc_stac_items_view_off_nadir" in statement
+        assert (
+            "((CAST(CASE WHEN jsonb_typeof(metadata -> 'view:off_nadir') = 'number' "
+            "THEN metadata ->> 'view:off_nadir' END AS double precision)))"
+        ) in statement
+
+    def test_schema(self):
+        assert get_queryable("instruments").schema()["items"] == dict(type="string")
+        assert get_queryable("view:off_nadir").schema()["type"] == "number"
@@ -0,0 +1,104 @@
+#
+# This file is part of BDC-STAC.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+from unittest import mock
+
+import pytest
+from flask import Flask
+
+from bdc_stac.search_cache import (
+    CacheBackend,
+    MemoryBackend,
+    RedisBackend,
+    SearchCache,
+    create_search_cache,
+    normalize_parameters,
+)
+
+
+def _make_cache():
+    return SearchCache(MemoryBackend(maxsize=16, ttl=60), ttl=60)
+
+
+class TestSearchCache:
+    def test_normalize_parameters(self):
+        expected = {"collections": ["LC8-16D-1", "S2-16D-2"], "bbox": [-46.0, -13.0, -45.0, -12.0], "limit": 10}
+
+        assert normalize_parameters(
+            {"collections": "S2-16D-2,LC8-16D-1", "bbox": "-46,-13,-45,-12", "limit": "10"}
+        ) == (expected)
+        assert normalize_parameters({**expected, "collections": ["S2-16D-2", "LC8-16D-1"], "page": None}) == expected
+        assert normalize_parameters({"bbox": "-46,a,-45,-12"}) is None
+
+    def test_key(self):
+        cache = _make_cache()
+        key = cache.make_key({"collections": "S2-16D-2,LC8-16D-1", "limit": "10"}, roles=("*",))
+
+        assert key == cache.make_key({"collections": ["LC8-16D-1", "S2-16D-2"], "limit": 10}, roles=("*",))
+        assert key != cache.make_key({"collections": ["LC8-16D-1", "S2-16D-2"], "limit": 10}, roles=())
+        assert key != cache.make_key({"collections": ["LC8-16D-1", "S2-16D-2"], "limit": 10}, ("*",), ("POST",))
+
+    def test_invalidate(self):
+        cache = _make_cache()
+        s2 = cache.make_key({"collections": "S2-16D-2"}, roles=())
+        lc8 = cache.make_key({"collections": "LC8-16D-1"}, roles=())
+        any_collection = cache.make_key({"bbox": "-46,-13,-45,-12"}, roles=())
+        for key in (s2, lc8, any_collection):
+            cache.set(key, b"{}")
+
+        cache.invalidate(["S2-16D-2"])
+        assert cache.make_key({"collections": "S2-16D-2"}, roles=()) != s2
+        assert cache.make_key({"collections": "LC8-16D-1"}, roles=()) == lc8
+        assert cache.make_key({"bbox": "-46,-13,-45,-12"}, roles=()) != any_collection
+
+        assert cache.invalidate()
+        assert cache.make_key({"collections": "LC8-16D-1"}, roles=()) != lc8
+
+    def test_version(self):
+        version = mock.Mock(return_value=("2021-01-01T00:00:00", 10))
+        cache = SearchCache(MemoryBackend(maxsize=16, ttl=60), ttl=60, version=version)
+        key = cache.make_key({"collections": "S2-16D-2,LC8-16D-1"}, roles=())
+        version.assert_called_with(["LC8-16D-1", "S2-16D-2"])
+
+        # The items of the collections changed
+        version.return_value = ("2021-01-01T00:00:00", 11)
+        assert cache.make_key({"collections": "S2-16D-2,LC8-16D-1"}, roles=()) != key
+
+        cache.make_key({"bbox": "-46,-13,-45,-12"}, roles=())
+        version.assert_called_with(None)
+
+    def test_backend_interface(self):
+        with pytest.raises(TypeError):
+            CacheBackend()
+
+    def test_redis_errors(self):
+        redis = pytest.importorskip("redis")
+
+        backend = RedisBackend("redis://localhost:6379/0")
+        backend._client = mock.Mock(
+            **{f"{name}.side_effect": redis.ConnectionError for name in ("get", "mget", "incr")}
+        )
+        cache = SearchCache(backend, ttl=60)
+        with Flask(__name__).app_context():
+            assert backend.get("key") is None
+            assert cache.make_key({"collections": "S2-16D-2"}, roles=()) is None
+            assert not cache.invalidate(["S2-16D-2"])
+
+    def test_create_search_cache(self):
+        assert create_search_cache("") is None
+        assert create_search_cache("memory", ttl=0) is None
+        assert isinstance(create_search_cache("memory").backend, MemoryBackend)